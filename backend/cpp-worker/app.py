@@ -1,6 +1,8 @@
 """FastAPI C++ trace worker (mirrors the Python worker's contract).
 
 POST /trace  {code, max_steps?, stdin?}  ->  normalized Trace envelope
+GET  /metrics  ->  Prometheus text format: latency by outcome, compile / gdb
+                   phase durations, steps and bytes per trace, in-flight, RSS
 
 Pipeline per request:
     1. write user code to a temp prog.cpp
@@ -31,10 +33,14 @@ import time
 from pathlib import Path
 
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
+# backend/, for the metrics module shared with the Python worker.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from analyze_cpp import analyze_source  # noqa: E402
+from worker import metrics as metrics_mod  # noqa: E402
 
 app = FastAPI(title="DSA Visualizer C++ Worker", version="0.1")
 
@@ -45,6 +51,22 @@ GDB = shutil.which("gdb") or "gdb"
 COMPILE_TIMEOUT = 20
 DEFAULT_MAX_SECONDS = 8.0
 
+METRICS = metrics_mod.Registry()
+REQUEST_SECONDS = METRICS.histogram(
+    "cpp_trace_request_duration_seconds",
+    "C++ trace request latency by outcome (ok, user_error, unsafe, truncated, "
+    "timeout, internal)", ("outcome",))
+PHASE_SECONDS = METRICS.histogram(
+    "cpp_trace_phase_duration_seconds", "Time spent compiling (g++) and tracing (gdb)",
+    ("phase",), (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60))
+STEPS = METRICS.histogram("cpp_trace_steps", "Recorded steps per trace", (),
+                          metrics_mod.STEP_BUCKETS)
+RESPONSE_BYTES = METRICS.histogram("cpp_trace_response_bytes", "Response body size", (),
+                                   metrics_mod.BYTE_BUCKETS)
+IN_FLIGHT = METRICS.gauge("cpp_trace_in_flight_requests", "C++ trace requests being served")
+METRICS.gauge("process_resident_memory_bytes", "RSS of the worker process",
+              fn=metrics_mod.process_rss_bytes)
+
 
 def _find_printers():
     """Locate libstdc++'s gdb pretty-printer python package (share/gcc-*/python)
@@ -100,7 +122,8 @@ class TraceRequest(BaseModel):
     stdin: str = Field("", description="Fed to the program's stdin")
 
 
-def _envelope(error=None, analysis=None, steps=None, output="", truncated=False):
+def _envelope(error=None, analysis=None, steps=None, output="", truncated=False,
+              timed_out=False):
     return {
         "meta": {
             "language": "cpp",
@@ -108,6 +131,7 @@ def _envelope(error=None, analysis=None, steps=None, output="", truncated=False)
             "output": output,
             "error": error,
             "truncated": truncated,
+            "timed_out": timed_out,
             "num_steps": len(steps or []),
         },
         "steps": steps or [],
@@ -119,20 +143,41 @@ def health():
     return {"ok": True, "service": "cpp-worker", "g++": GPP, "gdb": GDB}
 
 
+@app.get("/metrics")
+def metrics():
+    return Response(content=METRICS.render(), media_type=metrics_mod.CONTENT_TYPE)
+
+
 @app.post("/trace")
 def trace(req: TraceRequest):
+    t0 = time.perf_counter()
+    IN_FLIGHT.inc()
+    outcome = "internal"
+    try:
+        env, outcome = _trace(req)
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, outcome=outcome)
+    body = json.dumps(env).encode("utf-8")
+    STEPS.observe(env["meta"].get("num_steps") or 0)
+    RESPONSE_BYTES.observe(len(body))
+    return Response(content=body, media_type="application/json")
+
+
+def _trace(req):
+    """``(envelope, outcome)`` for one request (outcome labels the metrics)."""
     code = req.code
     if not code.strip():
-        return _envelope(error="No code provided.")
+        return _envelope(error="No code provided."), "user_error"
     analysis = analyze_source(code)
 
     bad = _unsafe(code)
     if bad:
-        return _envelope(error=bad, analysis=analysis)
+        return _envelope(error=bad, analysis=analysis), "unsafe"
 
     if not shutil.which(GPP) and not os.path.exists(GPP):
         return _envelope(error="g++ not found on PATH. Install MSYS2/MinGW g++.",
-                         analysis=analysis)
+                         analysis=analysis), "internal"
 
     max_seconds = DEFAULT_MAX_SECONDS
     env = _tool_env()
@@ -148,19 +193,24 @@ def trace(req: TraceRequest):
         prog_in.write_text(req.stdin or "", encoding="utf-8")
 
         # 1. Compile.
+        t0 = time.perf_counter()
         try:
             cc = subprocess.run(
                 [GPP, "-g", "-O0", "-std=gnu++17", "-w", str(src), "-o", str(exe)],
                 capture_output=True, text=True, timeout=COMPILE_TIMEOUT, env=env, cwd=str(d),
             )
         except subprocess.TimeoutExpired:
-            return _envelope(error="Compilation timed out.", analysis=analysis)
+            return _envelope(error="Compilation timed out.", analysis=analysis,
+                             timed_out=True), "timeout"
         except FileNotFoundError:
-            return _envelope(error="g++ not found. Install MSYS2/MinGW g++.", analysis=analysis)
+            return _envelope(error="g++ not found. Install MSYS2/MinGW g++.",
+                             analysis=analysis), "internal"
+        finally:
+            PHASE_SECONDS.observe(time.perf_counter() - t0, phase="compile")
         if cc.returncode != 0 or not exe.exists():
             msg = (cc.stderr or cc.stdout or "Compilation failed.").strip()
             msg = _clean_compile_error(msg, str(src))
-            return _envelope(error=msg, analysis=analysis)
+            return _envelope(error=msg, analysis=analysis), "user_error"
 
         # 2. Trace under gdb.
         tenv = dict(env)
@@ -174,6 +224,7 @@ def trace(req: TraceRequest):
             "CPP_MAX_SECONDS": str(max_seconds),
             "CPP_PYPRINTERS": PYPRINTERS,
         })
+        t0 = time.perf_counter()
         try:
             subprocess.run(
                 [GDB, "--batch", "-nx", "-x", TRACER],
@@ -183,24 +234,37 @@ def trace(req: TraceRequest):
             partial = _read_trace(out_json)
             if partial:
                 partial["meta"]["truncated"] = True
+                partial["meta"]["timed_out"] = True
                 partial["meta"]["analysis"] = analysis
                 partial["meta"]["output"] = _read_text(prog_out)
-                return partial
-            return _envelope(error="Tracing timed out.", analysis=analysis, truncated=True)
+                return partial, "timeout"
+            return _envelope(error="Tracing timed out.", analysis=analysis,
+                             truncated=True, timed_out=True), "timeout"
         except FileNotFoundError:
             return _envelope(error="gdb not found on PATH. Install gdb (MSYS2/MinGW).",
-                             analysis=analysis)
+                             analysis=analysis), "internal"
+        finally:
+            PHASE_SECONDS.observe(time.perf_counter() - t0, phase="gdb")
 
         env_out = _read_trace(out_json)
         program_output = _read_text(prog_out)
         if not env_out:
             return _envelope(error="Tracer produced no output (gdb may have failed).",
-                             analysis=analysis, output=program_output)
+                             analysis=analysis, output=program_output), "internal"
 
         env_out["meta"]["analysis"] = analysis
         env_out["meta"]["output"] = program_output
         env_out["meta"]["language"] = "cpp"
-        return env_out
+        meta = env_out["meta"]
+        if meta.get("error"):
+            outcome = "user_error"
+        elif meta.get("timed_out"):
+            outcome = "timeout"
+        elif meta.get("truncated"):
+            outcome = "truncated"
+        else:
+            outcome = "ok"
+        return env_out, outcome
 
 
 def _read_trace(path):
@@ -710,6 +710,7 @@ class Recorder:
         self.call_ids = []         # call_id per live frame, parallel to prev_fps
         self.counter = 0           # next call_id (main gets 0, then 1,2,3...)
         self.truncated = False
+        self.timed_out = False     # stopped by MAX_SECONDS, not MAX_STEPS
         self.start = time.monotonic()
 
     def over_budget(self):
@@ -718,6 +719,7 @@ class Recorder:
             return True
         if time.monotonic() - self.start > MAX_SECONDS:
             self.truncated = True
+            self.timed_out = True
             return True
         return False
 
@@ -900,6 +902,7 @@ def run():
 
     # Program stdout captured separately by app.py; leave "output" for the worker.
     out["meta"]["truncated"] = rec.truncated
+    out["meta"]["timed_out"] = rec.timed_out
     out["meta"]["num_steps"] = len(rec.steps)
     out["steps"] = rec.steps
     _write(out)
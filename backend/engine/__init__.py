@@ -13,11 +13,16 @@ Pipeline:
            -> scope.*                 (loop metadata, branch outcomes)
            -> semantic.*              (compare / swap / recursion enter|exit ...)
       -> normalized Trace envelope    (meta + ordered steps)
+      -> delta.encode_steps           (optional: changed-locals-only steps)
+      -> compact.encode_envelope      (optional: binary wire format, interned
+                                       strings + columnar step fields)
 
 Everything below is language-agnostic in spirit: a future C++/Java tracer only
 has to emit the same Trace envelope and the whole frontend works unchanged.
 """
 
 from .runner import run_code, Trace
+from .delta import decode_steps, decode_trace
+from .compact import decode_envelope
 
-__all__ = ["run_code", "Trace"]
+__all__ = ["run_code", "Trace", "decode_steps", "decode_trace", "decode_envelope"]
@@ -0,0 +1,258 @@
+"""Execution backends: how a :class:`~engine.runner.Tracer` is hooked into the
+interpreter.
+
+``settrace``
+    The classic ``sys.settrace`` hook. Fires a Python callback for every
+    call / line / return in *every* frame (heapq, collections, ...); the tracer
+    filters library frames out itself.
+
+``monitoring``
+    PEP 669 ``sys.monitoring`` (Python 3.12+). Events are enabled *locally*,
+    only on the user's own code objects, so library code runs with no callback
+    at all. Produces the same events (and therefore the same Trace envelope)
+    as ``settrace``.
+
+``auto`` picks ``monitoring`` when the interpreter has it and falls back to
+``settrace`` otherwise (or when another tool already owns the monitoring slot).
+
+Run ``python -m engine.backends prog.py`` from ``backend/`` to time the two
+against each other on one program.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import types
+
+SETTRACE = "settrace"
+MONITORING = "monitoring"
+AUTO = "auto"
+BACKENDS = (AUTO, SETTRACE, MONITORING)
+
+HAS_MONITORING = hasattr(sys, "monitoring")
+USER_FILENAME = "<user-code>"
+
+
+class BackendUnavailable(Exception):
+    """The requested backend cannot be installed in this interpreter/process."""
+
+
+def code_objects(code: types.CodeType):
+    """``code`` plus every nested function / class / lambda body it defines."""
+    out, todo = [], [code]
+    while todo:
+        co = todo.pop()
+        out.append(co)
+        todo.extend(c for c in co.co_consts if isinstance(c, types.CodeType))
+    return out
+
+
+class SettraceBackend:
+    name = SETTRACE
+
+    def __init__(self):
+        self._old = sys.gettrace()
+
+    def install(self, tracer, compiled) -> None:
+        sys.settrace(tracer)
+
+    def hand_over(self, hook, frame=None) -> None:
+        """Route every further event to ``hook`` instead of the tracer.
+
+        ``sys.settrace`` only affects frames entered from now on; frames
+        already running keep their local trace function, so ``frame`` and
+        every traced caller above it are switched as well.
+        """
+        sys.settrace(hook)
+        while frame is not None:
+            if frame.f_trace is not None:
+                frame.f_trace = hook
+            frame = frame.f_back
+
+    def uninstall(self) -> None:
+        sys.settrace(self._old)
+
+
+class MonitoringBackend:
+    """``sys.monitoring`` driver that forwards events to a settrace-style tracer.
+
+    Event mapping (matches what ``sys.settrace`` reports):
+        PY_START / PY_RESUME  -> ``call``
+        LINE                  -> ``line``
+        PY_RETURN / PY_YIELD  -> ``return`` (with the value)
+        PY_UNWIND             -> ``return`` (value ``None``, frame left by raise)
+        JUMP (backward, same line) -> ``line`` (e.g. each pass of a one-line
+                                  comprehension, as settrace reports it)
+    """
+
+    name = MONITORING
+
+    def __init__(self, tool_id: int | None = None):
+        if not HAS_MONITORING:
+            raise BackendUnavailable("sys.monitoring needs Python 3.12+")
+        mon = sys.monitoring
+        self.tool_id = mon.DEBUGGER_ID if tool_id is None else tool_id
+        self._tracer = None
+        self._codes: list = []
+        self._lines: dict = {}         # code -> {instruction offset: line}
+        self._stopped = False
+        self._installed = False
+
+    # -- install / uninstall ---------------------------------------------- #
+    def install(self, tracer, compiled) -> None:
+        mon = sys.monitoring
+        ev = mon.events
+        if mon.get_tool(self.tool_id) is not None:
+            raise BackendUnavailable("monitoring tool slot already in use")
+        mon.use_tool_id(self.tool_id, "dsa-visualizer-tracer")
+        self._installed = True
+        self._tracer = tracer
+        self._stopped = False
+        self._callbacks = {
+            ev.PY_START: self._on_start,
+            ev.PY_RESUME: self._on_start,
+            ev.LINE: self._on_line,
+            ev.PY_RETURN: self._on_return,
+            ev.PY_YIELD: self._on_return,
+            ev.PY_UNWIND: self._on_unwind,
+            ev.JUMP: self._on_jump,
+        }
+        for event, cb in self._callbacks.items():
+            mon.register_callback(self.tool_id, event, cb)
+        local = (ev.PY_START | ev.PY_RESUME | ev.LINE | ev.PY_RETURN
+                 | ev.PY_YIELD | ev.JUMP)
+        self._codes = code_objects(compiled)
+        for co in self._codes:
+            self._lines[co] = {off: line for start, end, line in co.co_lines()
+                               for off in range(start, end, 2)}
+            mon.set_local_events(self.tool_id, co, local)
+        # PY_UNWIND cannot be enabled per code object; it only fires when an
+        # exception leaves a frame, so the global cost is negligible.
+        mon.set_events(self.tool_id, ev.PY_UNWIND)
+
+    def hand_over(self, hook, frame=None) -> None:
+        """Route every further event to ``hook`` instead of the tracer."""
+        self._tracer = hook
+
+    def stop(self, frame=None) -> None:
+        """Stop delivering events (execution continues untraced)."""
+        mon = sys.monitoring
+        self._stopped = True
+        for co in self._codes:
+            mon.set_local_events(self.tool_id, co, 0)
+        mon.set_events(self.tool_id, 0)
+
+    def uninstall(self) -> None:
+        if not self._installed:
+            return
+        mon = sys.monitoring
+        self.stop()
+        for event in self._callbacks:
+            mon.register_callback(self.tool_id, event, None)
+        mon.free_tool_id(self.tool_id)
+        self._installed = False
+        self._codes = []
+        self._lines = {}
+        self._tracer = None
+
+    # -- callbacks --------------------------------------------------------- #
+    # ``sys._getframe(1)`` inside a monitoring callback is the monitored frame.
+    def _on_start(self, code, offset):
+        if code.co_filename != USER_FILENAME:
+            return sys.monitoring.DISABLE
+        return self._fire(sys._getframe(1), "call", None)
+
+    def _on_line(self, code, line):
+        if code.co_filename != USER_FILENAME:
+            return sys.monitoring.DISABLE
+        return self._fire(sys._getframe(1), "line", None)
+
+    def _on_return(self, code, offset, retval):
+        if code.co_filename != USER_FILENAME:
+            return sys.monitoring.DISABLE
+        return self._fire(sys._getframe(1), "return", retval)
+
+    def _on_jump(self, code, offset, dest):
+        # Mirrors CPython's legacy-tracing shim: forward jumps never produce a
+        # line event, a backward jump onto a *different* line is reported by
+        # LINE itself, and a backward jump within one line re-reports it.
+        lines = self._lines.get(code)
+        if dest > offset or lines is None:
+            return sys.monitoring.DISABLE
+        if lines.get(dest) != lines.get(offset):
+            return None
+        return self._fire(sys._getframe(1), "line", None)
+
+    def _on_unwind(self, code, offset, exc):
+        if code.co_filename != USER_FILENAME:
+            return None             # non-local event: DISABLE is not allowed
+        return self._fire(sys._getframe(1), "return", None)
+
+    def _fire(self, frame, event, arg):
+        if self._stopped:
+            return None
+        try:
+            self._tracer(frame, event, arg)
+        except BaseException:
+            # Same contract as settrace: a raising hook is switched off.
+            self._stopped = True
+            raise
+        return None
+
+
+def resolve(name: str) -> str:
+    """Map a requested backend name to the one that will actually run."""
+    if name not in BACKENDS:
+        raise ValueError("unknown backend: " + repr(name))
+    if name == AUTO:
+        return MONITORING if HAS_MONITORING else SETTRACE
+    if name == MONITORING and not HAS_MONITORING:
+        return SETTRACE
+    return name
+
+
+def make_backend(name: str = SETTRACE):
+    """Instantiate the backend for ``name``, falling back to settrace."""
+    if resolve(name) == MONITORING:
+        try:
+            return MonitoringBackend()
+        except BackendUnavailable:
+            pass
+    return SettraceBackend()
+
+
+def benchmark(code: str, repeat: int = 3, stdin: str = "", **run_kwargs) -> dict:
+    """Best-of-``repeat`` wall time of ``run_code`` under each available backend."""
+    from .runner import run_code
+
+    names = [SETTRACE] + ([MONITORING] if HAS_MONITORING else [])
+    out = {}
+    for name in names:
+        best, env = None, None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            env = run_code(code, stdin=stdin, backend=name, **run_kwargs)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        out[name] = {
+            "seconds": round(best, 4),
+            "num_steps": env["meta"]["num_steps"],
+            "backend": env["meta"].get("backend"),
+            "truncated": env["meta"]["truncated"],
+        }
+    return out
+
+
+if __name__ == "__main__":
+    import json
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m engine.backends PROGRAM.py [STDIN_FILE]")
+    with open(sys.argv[1], encoding="utf-8") as fh:
+        src = fh.read()
+    feed = ""
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], encoding="utf-8") as fh:
+            feed = fh.read()
+    print(json.dumps(benchmark(src, stdin=feed), indent=2))
@@ -0,0 +1,576 @@
+"""Tracer benchmarks.
+
+    python -m engine.bench [--sizes small,medium,large] [--only NAME ...]
+                           [--out results.json] [--compare base.json]
+    python -m engine.bench --step-memory [--steps N] [--json]
+
+Corpus benchmark
+----------------
+:data:`CORPUS` is a fixed set of canonical DSA programs (the algorithms of the
+frontend premade set: sorting, N-Queens, Hanoi, grid BFS / DFS, Dijkstra with
+``heapq``, AVL insertion, trie, DSU, 2-D DP, linked-list reversal), each a
+template with an input size ``{n}`` and three sizes. :func:`run_corpus` traces
+every (program, size) pair through :func:`engine.runner.run_code` -- the full
+pipeline, exactly as ``/trace`` does -- and records:
+
+* ``steps``, ``truncated`` (and ``error``, which should stay ``None``);
+* ``seconds``, ``steps_per_sec``, ``us_per_step`` -- best of ``repeat`` runs;
+* ``bytes_per_step`` -- size of the JSON envelope divided by the step count;
+* ``peak_bytes`` -- ``tracemalloc`` peak of a separate run (tracemalloc slows
+  tracing down, so it never overlaps the timed runs).
+
+``--out`` writes the results as JSON together with the interpreter version
+and git revision; ``--compare`` prints the relative change against an earlier
+file, so runs can be compared across commits.
+
+Memory per step
+---------------
+:func:`step_memory` traces a program twice with the same :class:`Tracer`:
+
+* ``records`` -- the in-memory path: steps kept as
+  :class:`~engine.record.StepRecord` until tracing ends;
+* ``dicts``   -- every step converted to its public dict as it is recorded
+  and kept (what the tracer used to hold).
+
+and reports, per recorded step, the bytes still allocated when tracing ends
+(``tracemalloc``: the step objects plus everything they reference), the
+size of the step object itself, the tracing time and the number of gen-0
+garbage collections the run triggered.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from . import backends as backends_mod
+from .runner import DEFAULT_MAX_SECONDS, DEFAULT_MAX_STEPS, Tracer, run_code
+
+SIZES = ("small", "medium", "large")
+
+# name -> (template, {size: n}). Inputs are generated in the program itself
+# (a fixed LCG where order matters), so every run traces the same thing.
+CORPUS = {
+    "bubble_sort": ("""
+n = {n}
+a = [(i * 7919) % 1009 for i in range(n)]
+for i in range(n):
+    swapped = False
+    for j in range(n - 1 - i):
+        if a[j] > a[j + 1]:
+            a[j], a[j + 1] = a[j + 1], a[j]
+            swapped = True
+    if not swapped:
+        break
+print(a[:5])
+""", {"small": 12, "medium": 40, "large": 120}),
+
+    "merge_sort": ("""
+def merge_sort(arr):
+    if len(arr) <= 1:
+        return arr
+    mid = len(arr) // 2
+    left = merge_sort(arr[:mid])
+    right = merge_sort(arr[mid:])
+    out = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] <= right[j]:
+            out.append(left[i])
+            i += 1
+        else:
+            out.append(right[j])
+            j += 1
+    out.extend(left[i:])
+    out.extend(right[j:])
+    return out
+
+data = [(i * 7919) % 1009 for i in range({n})]
+print(merge_sort(data)[:5])
+""", {"small": 16, "medium": 128, "large": 1024}),
+
+    "nqueens": ("""
+def solve(n):
+    cols, d1, d2 = set(), set(), set()
+    board = [-1] * n
+    count = 0
+
+    def place(r):
+        nonlocal count
+        if r == n:
+            count += 1
+            return
+        for c in range(n):
+            if c in cols or r - c in d1 or r + c in d2:
+                continue
+            cols.add(c); d1.add(r - c); d2.add(r + c)
+            board[r] = c
+            place(r + 1)
+            board[r] = -1
+            cols.remove(c); d1.remove(r - c); d2.remove(r + c)
+
+    place(0)
+    return count
+
+print(solve({n}))
+""", {"small": 4, "medium": 6, "large": 8}),
+
+    "hanoi": ("""
+moves = []
+def hanoi(k, src, dst, via):
+    if k == 0:
+        return
+    hanoi(k - 1, src, via, dst)
+    moves.append((src, dst))
+    hanoi(k - 1, via, dst, src)
+
+hanoi({n}, "A", "C", "B")
+print(len(moves))
+""", {"small": 3, "medium": 7, "large": 12}),
+
+    "grid_bfs": ("""
+from collections import deque
+n = {n}
+grid = [[1 if (r * 31 + c * 17) % 7 == 0 else 0 for c in range(n)] for r in range(n)]
+grid[0][0] = grid[n - 1][n - 1] = 0
+dist = [[-1] * n for _ in range(n)]
+dist[0][0] = 0
+q = deque([(0, 0)])
+while q:
+    r, c = q.popleft()
+    for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        nr, nc = r + dr, c + dc
+        if 0 <= nr < n and 0 <= nc < n and grid[nr][nc] == 0 and dist[nr][nc] < 0:
+            dist[nr][nc] = dist[r][c] + 1
+            q.append((nr, nc))
+print(dist[n - 1][n - 1])
+""", {"small": 5, "medium": 15, "large": 40}),
+
+    "grid_dfs": ("""
+n = {n}
+grid = [[1 if (r * 13 + c * 7) % 5 < 2 else 0 for c in range(n)] for r in range(n)]
+seen = [[False] * n for _ in range(n)]
+
+def dfs(r, c):
+    if r < 0 or r >= n or c < 0 or c >= n or seen[r][c] or grid[r][c] == 0:
+        return 0
+    seen[r][c] = True
+    return 1 + dfs(r + 1, c) + dfs(r - 1, c) + dfs(r, c + 1) + dfs(r, c - 1)
+
+islands = 0
+for r in range(n):
+    for c in range(n):
+        if grid[r][c] == 1 and not seen[r][c]:
+            dfs(r, c)
+            islands += 1
+print(islands)
+""", {"small": 5, "medium": 12, "large": 30}),
+
+    "dijkstra": ("""
+import heapq
+n = {n}
+graph = {{u: [] for u in range(n)}}
+for u in range(n):
+    for k in (1, 2, 5):
+        v = (u * k + 3) % n
+        if v != u:
+            graph[u].append((v, (u * 7 + v * 3) % 11 + 1))
+dist = {{u: float("inf") for u in range(n)}}
+dist[0] = 0
+heap = [(0, 0)]
+while heap:
+    d, u = heapq.heappop(heap)
+    if d > dist[u]:
+        continue
+    for v, w in graph[u]:
+        if d + w < dist[v]:
+            dist[v] = d + w
+            heapq.heappush(heap, (dist[v], v))
+print(max(d for d in dist.values() if d < float("inf")))
+""", {"small": 8, "medium": 40, "large": 200}),
+
+    "avl_insert": ("""
+class Node:
+    def __init__(self, key):
+        self.key = key
+        self.left = None
+        self.right = None
+        self.height = 1
+
+def height(node):
+    return node.height if node else 0
+
+def rotate_right(y):
+    x = y.left
+    y.left = x.right
+    x.right = y
+    y.height = 1 + max(height(y.left), height(y.right))
+    x.height = 1 + max(height(x.left), height(x.right))
+    return x
+
+def rotate_left(x):
+    y = x.right
+    x.right = y.left
+    y.left = x
+    x.height = 1 + max(height(x.left), height(x.right))
+    y.height = 1 + max(height(y.left), height(y.right))
+    return y
+
+def insert(root, key):
+    if root is None:
+        return Node(key)
+    if key < root.key:
+        root.left = insert(root.left, key)
+    else:
+        root.right = insert(root.right, key)
+    root.height = 1 + max(height(root.left), height(root.right))
+    balance = height(root.left) - height(root.right)
+    if balance > 1 and key < root.left.key:
+        return rotate_right(root)
+    if balance < -1 and key >= root.right.key:
+        return rotate_left(root)
+    if balance > 1:
+        root.left = rotate_left(root.left)
+        return rotate_right(root)
+    if balance < -1:
+        root.right = rotate_right(root.right)
+        return rotate_left(root)
+    return root
+
+root = None
+for i in range({n}):
+    root = insert(root, (i * 37) % 101)
+print(root.key, root.height)
+""", {"small": 7, "medium": 30, "large": 120}),
+
+    "trie": ("""
+class TrieNode:
+    def __init__(self):
+        self.children = {{}}
+        self.end = False
+
+root = TrieNode()
+words = []
+for i in range({n}):
+    w, x = "", i * 2654435761 % 4096
+    for _ in range(3 + i % 4):
+        w += "abcd"[x % 4]
+        x //= 4
+    words.append(w)
+for w in words:
+    node = root
+    for ch in w:
+        if ch not in node.children:
+            node.children[ch] = TrieNode()
+        node = node.children[ch]
+    node.end = True
+
+def has(word):
+    node = root
+    for ch in word:
+        node = node.children.get(ch)
+        if node is None:
+            return False
+    return node.end
+
+print(sum(has(w) for w in words[::2]))
+""", {"small": 6, "medium": 30, "large": 150}),
+
+    "dsu": ("""
+n = {n}
+parent = list(range(n))
+rank = [0] * n
+
+def find(x):
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+def union(a, b):
+    ra, rb = find(a), find(b)
+    if ra == rb:
+        return False
+    if rank[ra] < rank[rb]:
+        ra, rb = rb, ra
+    parent[rb] = ra
+    if rank[ra] == rank[rb]:
+        rank[ra] += 1
+    return True
+
+merged = 0
+for i in range(n):
+    if union(i, (i * 7 + 3) % n):
+        merged += 1
+print(n - merged)
+""", {"small": 8, "medium": 60, "large": 400}),
+
+    "lcs_dp": ("""
+n = {n}
+a = "".join("ACGT"[(i * 7) % 4] for i in range(n))
+b = "".join("ACGT"[(i * 5 + 1) % 4] for i in range(n))
+dp = [[0] * (n + 1) for _ in range(n + 1)]
+for i in range(1, n + 1):
+    for j in range(1, n + 1):
+        if a[i - 1] == b[j - 1]:
+            dp[i][j] = dp[i - 1][j - 1] + 1
+        else:
+            dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
+print(dp[n][n])
+""", {"small": 6, "medium": 20, "large": 60}),
+
+    "linked_list_reverse": ("""
+class ListNode:
+    def __init__(self, val, next=None):
+        self.val = val
+        self.next = next
+
+head = None
+for v in range({n}, 0, -1):
+    head = ListNode(v, head)
+
+prev, cur = None, head
+while cur:
+    nxt = cur.next
+    cur.next = prev
+    prev = cur
+    cur = nxt
+head = prev
+print(head.val)
+""", {"small": 5, "medium": 40, "large": 300}),
+}
+
+
+def _measure(code: str, max_steps: int, max_seconds: float, repeat: int,
+             memory: bool) -> dict:
+    best, env = None, None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        env = run_code(code, max_steps=max_steps, max_seconds=max_seconds)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    meta = env["meta"]
+    steps = meta["num_steps"]
+    row = {
+        "steps": steps,
+        "truncated": meta["truncated"],
+        "error": meta["error"],
+        "seconds": round(best, 4),
+        "steps_per_sec": round(steps / best) if best else 0,
+        "us_per_step": round(best / steps * 1e6, 2) if steps else None,
+        "bytes_per_step": round(len(json.dumps(env)) / steps) if steps else None,
+        "peak_bytes": None,
+    }
+    del env
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        run_code(code, max_steps=max_steps, max_seconds=max_seconds)
+        row["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return row
+
+
+def run_corpus(sizes=SIZES, names=None, max_steps: int = DEFAULT_MAX_STEPS,
+               max_seconds: float = DEFAULT_MAX_SECONDS, repeat: int = 3,
+               memory: bool = True, progress=None) -> list:
+    """Benchmark rows for every (program, size) pair (see module doc)."""
+    rows = []
+    for name, (template, ns) in CORPUS.items():
+        if names and name not in names:
+            continue
+        for size in sizes:
+            n = ns[size]
+            row = {"program": name, "size": size, "n": n}
+            row.update(_measure(template.format(n=n), max_steps, max_seconds,
+                                repeat, memory))
+            rows.append(row)
+            if progress is not None:
+                progress(row)
+    return rows
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, timeout=5,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(base: list, rows: list) -> list:
+    """``(program, size, field, old, new, ratio)`` for the timing / size fields
+    of every row present in both runs."""
+    old = {(r["program"], r["size"]): r for r in base}
+    out = []
+    for row in rows:
+        prev = old.get((row["program"], row["size"]))
+        if prev is None:
+            continue
+        for field in ("us_per_step", "bytes_per_step", "peak_bytes"):
+            a, b = prev.get(field), row.get(field)
+            if a and b is not None:
+                out.append((row["program"], row["size"], field, a, b, round(b / a, 3)))
+    return out
+
+
+# -- memory per step (record vs dict storage) ------------------------------ #
+def _trace(code: str, max_steps: int, as_dicts: bool):
+    kept: list = []
+    tracer = Tracer(code, max_steps=max_steps, max_seconds=60,
+                    sink=kept.append if as_dicts else None)
+    compiled = compile(code, "<user-code>", "exec")
+    hook = backends_mod.SettraceBackend()
+    old_stdout, sys.stdout = sys.stdout, io.StringIO()
+    try:
+        hook.install(tracer, compiled)
+        exec(compiled, {"__name__": "__main__"})
+    except BaseException:
+        pass                                     # step cap
+    finally:
+        hook.uninstall()
+        sys.stdout = old_stdout
+    return tracer, kept if as_dicts else tracer.steps
+
+
+def step_memory(code: str, max_steps: int = 20_000) -> dict:
+    """Per-step memory / time of record vs dict step storage (see module doc)."""
+    out = {}
+    for mode in ("records", "dicts"):
+        gc.collect()
+        gen0 = gc.get_stats()[0]["collections"]
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        tracer, steps = _trace(code, max_steps, as_dicts=mode == "dicts")
+        seconds = time.perf_counter() - t0
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        n = max(1, len(steps))
+        out[mode] = {
+            "steps": len(steps),
+            "bytes_per_step": round(current / n),
+            "peak_bytes_per_step": round(peak / n),
+            "object_bytes_per_step": round(sum(map(sys.getsizeof, steps)) / n),
+            "us_per_step": round(seconds / n * 1e6, 2),
+            "gc_gen0": gc.get_stats()[0]["collections"] - gen0,
+        }
+        del tracer, steps
+    out["saved_bytes_per_step"] = (out["dicts"]["bytes_per_step"]
+                                   - out["records"]["bytes_per_step"])
+    return out
+
+
+STEP_MEMORY_PROGRAMS = {
+    "insertion_sort": """
+a = list(range(60, 0, -1))
+for i in range(1, len(a)):
+    key = a[i]
+    j = i - 1
+    while j >= 0 and a[j] > key:
+        a[j + 1] = a[j]
+        j -= 1
+    a[j + 1] = key
+""",
+    "fib_memo": """
+memo = {}
+def fib(n):
+    if n < 2:
+        return n
+    if n in memo:
+        return memo[n]
+    memo[n] = fib(n - 1) + fib(n - 2)
+    return memo[n]
+for k in range(200):
+    memo.clear()
+    fib(25)
+""",
+}
+
+
+def _main_step_memory(args) -> int:
+    results = {name: step_memory(code, args.steps)
+               for name, code in STEP_MEMORY_PROGRAMS.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'program':<16}{'mode':<9}{'steps':>7}{'B/step':>9}{'peak B/step':>13}"
+          f"{'obj B':>7}{'us/step':>9}{'gc0':>6}")
+    for name, res in results.items():
+        for mode in ("records", "dicts"):
+            r = res[mode]
+            print(f"{name:<16}{mode:<9}{r['steps']:>7}{r['bytes_per_step']:>9}"
+                  f"{r['peak_bytes_per_step']:>13}{r['object_bytes_per_step']:>7}"
+                  f"{r['us_per_step']:>9}{r['gc_gen0']:>6}")
+    return 0
+
+
+def _print_row(row: dict) -> None:
+    peak = row["peak_bytes"]
+    print(f"{row['program']:<20}{row['size']:<8}{row['n']:>6}{row['steps']:>7}"
+          f"{'T' if row['truncated'] else '':>3}{row['steps_per_sec']:>10}"
+          f"{row['us_per_step'] or 0:>9}{row['bytes_per_step'] or 0:>9}"
+          f"{'' if peak is None else round(peak / 1024):>10}"
+          f"{'  ' + row['error'] if row['error'] else ''}", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(SIZES),
+                        help="comma-separated subset of " + ",".join(SIZES))
+    parser.add_argument("--only", nargs="*", metavar="NAME", choices=sorted(CORPUS),
+                        help="programs to run (default: all)")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--step-memory", action="store_true",
+                        help="record-vs-dict memory per step instead of the corpus")
+    parser.add_argument("--steps", type=int, default=20_000, help="(--step-memory) step cap")
+    parser.add_argument("--json", action="store_true",
+                        help="(--step-memory) machine-readable output")
+    args = parser.parse_args(argv)
+    if args.step_memory:
+        return _main_step_memory(args)
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        parser.error("unknown size(s): " + ", ".join(sorted(unknown)))
+    print(f"{'program':<20}{'size':<8}{'n':>6}{'steps':>7}{'':>3}{'steps/s':>10}"
+          f"{'us/step':>9}{'B/step':>9}{'peak KiB':>10}", file=sys.stderr)
+    rows = run_corpus(sizes, args.only, args.max_steps, args.max_seconds,
+                      args.repeat, not args.no_memory, progress=_print_row)
+    result = {
+        "python": platform.python_version(),
+        "git": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "max_steps": args.max_steps,
+        "max_seconds": args.max_seconds,
+        "results": rows,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2))
+    else:
+        print(json.dumps(result, indent=2))
+    if args.compare:
+        base = json.loads(Path(args.compare).read_text())["results"]
+        for program, size, field, a, b, ratio in compare(base, rows):
+            print(f"{program:<20}{size:<8}{field:<16}{a:>12} -> {b:<12}x{ratio}",
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Compact binary envelope: interned strings, columnar step fields, shared scenes.
+
+A JSON envelope repeats every key name on every step, the same ``code`` line
+and ``function`` name thousands of times, and the full scene of each local
+even when it has not changed. The compact encoding stores each piece once:
+
+    b"DSAT" | u8 version | 3 pad bytes | u32 header length | header | columns
+
+``header`` is UTF-8 JSON::
+
+    {"meta":    {...},                 # the envelope meta, unchanged
+     "strings": ["line", "main", ...], # code lines, function / var names,
+                                       # events, scopes, type tags
+     "scenes":  [...],                 # every distinct scene, once
+     "stacks":  [[...], ...],          # every distinct call_stack, once
+     "extra":   [[i, {...}], ...],     # sparse per-step fields (semantic,
+                                       # loop_meta, branch_taken, return_value)
+     "columns": [["line", n], ...]}    # names and lengths of the columns
+
+and is padded so the columns that follow start 4-byte aligned: each column is
+a packed little-endian ``int32`` array (a JS ``Int32Array`` view works
+directly). Per-step columns are ``event function code scope line depth
+call_id parent_id stack`` (``-1`` for ``None``); ``locals_at`` /
+``highlight_at`` are offsets into the flat ``locals`` (name, type, scene
+triples) and ``highlight`` (name) columns.
+
+Scenes are shared by identity: the tracer reuses the scene object of a value
+that did not change (:mod:`engine.scene_cache`), so an unchanged array is
+stored once for the whole trace, not once per step. Compact always carries
+full steps -- that sharing already covers what ``delta`` saves.
+
+:func:`decode_envelope` is the reference decoder; it returns the ordinary
+``full`` envelope.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+import sys
+from array import array
+
+MEDIA_TYPE = "application/x-trace-compact"
+MAGIC = b"DSAT"
+VERSION = 1
+
+_HEAD = struct.Struct("<4sB3xI")
+
+# Step keys that live in columns; everything else goes to the sparse "extra".
+_COLUMNAR = frozenset({"i", "event", "line", "function", "code", "locals",
+                       "var_types", "highlight_vars", "scope", "depth",
+                       "call_id", "parent_id", "call_stack"})
+_STEP_COLUMNS = ("event", "function", "code", "scope", "line", "depth",
+                 "call_id", "parent_id", "stack")
+_SCALARS = (int, float, str, bool, type(None))
+
+
+def _int32(values: list) -> bytes:
+    col = array("i", values)
+    if sys.byteorder == "big":
+        col.byteswap()
+    return col.tobytes()
+
+
+class _Interner:
+    """value -> index table; ``key`` picks identity or equality."""
+
+    def __init__(self):
+        self.items: list = []
+        self.index: dict = {}
+
+    def add(self, value, key) -> int:
+        idx = self.index.get(key)
+        if idx is None:
+            idx = self.index[key] = len(self.items)
+            self.items.append(value)
+        return idx
+
+
+def encode_envelope(envelope: dict) -> bytes:
+    """Encode a ``full``-format envelope (see module doc)."""
+    meta = dict(envelope.get("meta", {}))
+    if meta.get("step_format", "full") != "full":
+        raise ValueError("compact encoding needs full steps")
+    meta["encoding"] = "compact"
+    steps = envelope.get("steps", [])
+
+    strings = _Interner()
+    scenes = _Interner()
+    stacks = _Interner()
+    s_add, sc_add = strings.add, scenes.add
+
+    def sid(text):
+        return -1 if text is None else s_add(text, text)
+
+    cols = {name: [] for name in _STEP_COLUMNS}
+    locals_at, flat_locals = [], []
+    highlight_at, flat_highlight = [], []
+    extra = []
+    for i, step in enumerate(steps):
+        cols["event"].append(sid(step.get("event")))
+        cols["function"].append(sid(step.get("function")))
+        cols["code"].append(sid(step.get("code")))
+        cols["scope"].append(sid(step.get("scope")))
+        cols["line"].append(step.get("line") or 0)
+        cols["depth"].append(step.get("depth", 0))
+        cols["call_id"].append(step.get("call_id", 0))
+        parent = step.get("parent_id")
+        cols["parent_id"].append(-1 if parent is None else parent)
+        stack = step.get("call_stack")
+        cols["stack"].append(-1 if stack is None else stacks.add(stack, id(stack)))
+
+        locals_at.append(len(flat_locals))
+        types = step.get("var_types", {})
+        for name, scene in step.get("locals", {}).items():
+            key = (type(scene), scene) if type(scene) in _SCALARS else id(scene)
+            flat_locals += (s_add(name, name), sid(types.get(name)), sc_add(scene, key))
+        highlight_at.append(len(flat_highlight))
+        flat_highlight.extend(s_add(n, n) for n in step.get("highlight_vars", ()))
+
+        rest = {k: v for k, v in step.items() if k not in _COLUMNAR}
+        if rest.get("semantic") == []:
+            del rest["semantic"]
+        if rest:
+            extra.append([i, rest])
+    locals_at.append(len(flat_locals))
+    highlight_at.append(len(flat_highlight))
+
+    columns = [(name, cols[name]) for name in _STEP_COLUMNS]
+    columns += [("locals_at", locals_at), ("locals", flat_locals),
+                ("highlight_at", highlight_at), ("highlight", flat_highlight)]
+    header = json.dumps({
+        "meta": meta,
+        "strings": strings.items,
+        "scenes": scenes.items,
+        "stacks": stacks.items,
+        "extra": extra,
+        "columns": [[name, len(values)] for name, values in columns],
+    }, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-len(header) % 4)          # align the int32 columns
+    parts = [_HEAD.pack(MAGIC, VERSION, len(header)), header]
+    parts += [_int32(values) for _, values in columns]
+    return b"".join(parts)
+
+
+def decode_envelope(data: bytes) -> dict:
+    """Rebuild the ordinary ``full`` envelope from :func:`encode_envelope` output."""
+    magic, version, header_len = _HEAD.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a compact trace (magic/version mismatch)")
+    offset = _HEAD.size
+    header = json.loads(data[offset:offset + header_len])
+    offset += header_len
+    cols = {}
+    for name, count in header["columns"]:
+        col = array("i")
+        col.frombytes(data[offset:offset + 4 * count])
+        if sys.byteorder == "big":
+            col.byteswap()
+        cols[name] = col
+        offset += 4 * count
+
+    strings, scenes, stacks = header["strings"], header["scenes"], header["stacks"]
+
+    def text(idx):
+        return None if idx < 0 else strings[idx]
+
+    extra = {i: rest for i, rest in header["extra"]}
+    flat_locals, flat_highlight = cols["locals"], cols["highlight"]
+    steps = []
+    for i in range(len(cols["line"])):
+        scene_map, types = {}, {}
+        for j in range(cols["locals_at"][i], cols["locals_at"][i + 1], 3):
+            name = strings[flat_locals[j]]
+            types[name] = text(flat_locals[j + 1])
+            scene_map[name] = scenes[flat_locals[j + 2]]
+        parent = cols["parent_id"][i]
+        stack = cols["stack"][i]
+        step = {
+            "i": i,
+            "event": text(cols["event"][i]),
+            "line": cols["line"][i],
+            "function": text(cols["function"][i]),
+            "code": text(cols["code"][i]),
+            "locals": scene_map,
+            "var_types": types,
+            "highlight_vars": [strings[n] for n in flat_highlight[
+                cols["highlight_at"][i]:cols["highlight_at"][i + 1]]],
+            "scope": text(cols["scope"][i]),
+            "depth": cols["depth"][i],
+            "call_id": cols["call_id"][i],
+            "parent_id": None if parent < 0 else parent,
+            "semantic": [],
+            "call_stack": None if stack < 0 else stacks[stack],
+        }
+        step.update(extra.get(i, ()))
+        steps.append(step)
+    meta = {k: v for k, v in header["meta"].items() if k != "encoding"}
+    return {"meta": meta, "steps": steps}
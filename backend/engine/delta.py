@@ -0,0 +1,186 @@
+"""Delta-encoded step stream with periodic keyframes.
+
+A full step carries every local's scene and type tag, so a 5000-step sort
+re-ships the whole array 5000 times. In the ``delta`` step format a step only
+carries what changed since the previous step *of the same call*:
+
+    {"i": 7, ..., "locals_delta": {"set": {"j": 3}, "types": {"j": "primitive"},
+                                   "del": ["tmp"]}}
+
+Every ``keyframe_every`` steps a **keyframe** starts a new segment. Deltas never
+reach back across a keyframe: the first step of each call inside a segment is
+stored in full (plain ``locals`` / ``var_types``). A client can therefore seek
+to step ``k`` by decoding from the keyframe at ``k - k % keyframe_every``.
+
+A linked list or tree whose scene changed (same type tag as before) goes
+under ``patch`` instead of ``set`` -- only the nodes added / removed,
+re-linked or changed, by stable node id (see :mod:`engine.patch`)::
+
+    "locals_delta": {"set": {}, "types": {},
+                     "patch": {"root": {"add": {"9": {...}}, "link": {"4": {"right": 9}}}}}
+
+A patch that would re-add at least as many nodes as the new scene holds is
+dropped for a plain ``set``.
+
+Everything except ``locals`` / ``var_types`` is left untouched, so semantic
+events, call stacks and loop metadata read the same in both formats.
+"""
+
+from __future__ import annotations
+
+from . import patch as patch_mod
+
+DEFAULT_KEYFRAME_EVERY = 100
+
+FORMAT_FULL = "full"
+FORMAT_DELTA = "delta"
+FORMAT_SHARED = "shared"      # scene references, see engine.hashcons
+FORMAT_HEAP = "heap"          # locals point into a per-step node table, see engine.heap
+STEP_FORMATS = (FORMAT_FULL, FORMAT_DELTA, FORMAT_SHARED, FORMAT_HEAP)
+
+
+class DeltaEncoder:
+    """Incremental encoder: feed full steps in order, get delta steps back.
+
+    Used directly by the streaming path; :func:`encode_steps` wraps it for a
+    finished trace.
+    """
+
+    def __init__(self, keyframe_every: int = DEFAULT_KEYFRAME_EVERY):
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.count = 0
+        self.base: dict = {}           # call_id -> (locals, var_types) in segment
+        self.flat: dict = {}           # (call_id, name) -> (scene, flattened)
+
+    def encode(self, step: dict) -> dict:
+        keyframe = self.count % self.keyframe_every == 0
+        self.count += 1
+        if keyframe:
+            self.base = {}
+            self.flat = {}
+        scenes = step.get("locals", {})
+        types = step.get("var_types", {})
+        call_id = step.get("call_id")
+        enc = {k: v for k, v in step.items() if k not in ("locals", "var_types")}
+        if keyframe:
+            enc["keyframe"] = True
+
+        prev = self.base.get(call_id)
+        if prev is None:
+            enc["locals"] = scenes
+            enc["var_types"] = types
+        else:
+            prev_scenes, prev_types = prev
+            changed = {}
+            changed_types = {}
+            patches = {}
+            for name, scene in scenes.items():
+                if name in prev_scenes and prev_types.get(name) == types.get(name):
+                    before = prev_scenes[name]
+                    if before is scene or before == scene:
+                        continue
+                    patch = self._patch(call_id, name, before, scene)
+                    if patch is not None:
+                        patches[name] = patch
+                        continue
+                changed[name] = scene
+                changed_types[name] = types.get(name)
+            delta: dict = {"set": changed, "types": changed_types}
+            if patches:
+                delta["patch"] = patches
+            removed = [name for name in prev_scenes if name not in scenes]
+            if removed:
+                delta["del"] = removed
+            enc["locals_delta"] = delta
+
+        self.base[call_id] = (scenes, types)
+        return enc
+
+    def _patch(self, call_id, name: str, before, scene):
+        """Structural patch from ``before`` to ``scene``, or ``None`` to send
+        ``scene`` whole."""
+        if type(scene) is not dict or scene.get("type") not in patch_mod.LINKS \
+                or type(before) is not dict or before.get("type") != scene.get("type"):
+            return None
+        key = (call_id, name)
+        cached = self.flat.get(key)
+        old = cached[1] if cached is not None and cached[0] is before \
+            else patch_mod.flatten(before)
+        new = patch_mod.flatten(scene)
+        if old is None or new is None:
+            self.flat.pop(key, None)
+            return None
+        self.flat[key] = (scene, new)
+        patch = patch_mod.diff(old, new)
+        if len(patch.get("add", ())) >= len(new[1]):
+            return None
+        return patch
+
+
+def encode_steps(steps: list, keyframe_every: int = DEFAULT_KEYFRAME_EVERY) -> list:
+    """Return a delta-encoded copy of ``steps`` (the input is not mutated)."""
+    encoder = DeltaEncoder(keyframe_every)
+    return [encoder.encode(step) for step in steps]
+
+
+def decode_steps(steps: list) -> list:
+    """Rebuild full steps (plain ``locals`` / ``var_types``) from a delta stream.
+
+    Accepts any contiguous run of steps that starts at a keyframe, so a client
+    can decode just the segment it is seeking into.
+    """
+    out = []
+    base: dict = {}
+    flat: dict = {}                    # (call_id, name) -> (scene, flattened)
+    for step in steps:
+        if step.get("keyframe"):
+            base = {}
+            flat = {}
+        call_id = step.get("call_id")
+        dec = {k: v for k, v in step.items() if k not in ("locals_delta", "keyframe")}
+        delta = step.get("locals_delta")
+        if delta is None:
+            scenes = dict(step.get("locals", {}))
+            types = dict(step.get("var_types", {}))
+        else:
+            prev_scenes, prev_types = base.get(call_id, ({}, {}))
+            scenes = dict(prev_scenes)
+            types = dict(prev_types)
+            for name in delta.get("del", ()):
+                scenes.pop(name, None)
+                types.pop(name, None)
+            scenes.update(delta.get("set", {}))
+            types.update(delta.get("types", {}))
+            for name, patch in delta.get("patch", {}).items():
+                cached = flat.get((call_id, name))
+                before = scenes[name]
+                old = cached[1] if cached is not None and cached[0] is before \
+                    else patch_mod.flatten(before)
+                new = patch_mod.apply(old, patch)
+                scenes[name] = patch_mod.unflatten(*new)
+                flat[(call_id, name)] = (scenes[name], new)
+        dec["locals"] = scenes
+        dec["var_types"] = types
+        base[call_id] = (scenes, types)
+        out.append(dec)
+    return out
+
+
+def decode_trace(envelope: dict) -> dict:
+    """Turn a ``delta`` / ``shared`` / ``heap`` envelope back into the
+    ``full`` format (no-op otherwise)."""
+    meta = envelope.get("meta", {})
+    fmt = meta.get("step_format")
+    if fmt == FORMAT_SHARED:
+        from . import hashcons
+        steps = hashcons.decode_steps(envelope.get("steps", []))
+    elif fmt == FORMAT_HEAP:
+        from . import heap
+        steps = heap.decode_steps(envelope.get("steps", []))
+    elif fmt == FORMAT_DELTA:
+        steps = decode_steps(envelope.get("steps", []))
+    else:
+        return envelope
+    meta = {k: v for k, v in meta.items() if k != "keyframe_every"}
+    meta["step_format"] = FORMAT_FULL
+    return {"meta": meta, "steps": steps}
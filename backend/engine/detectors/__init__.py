@@ -8,47 +8,132 @@ in priority order. The first confident answer wins; otherwise we fall back to
 Adding support for a new structure = add a detector here. That is the whole
 "scalable engine" idea: renderers key off these tags, so one new tag can unlock
 a whole class of problems.
+
+The first decision -- which family a value belongs to -- is a single lookup on
+``type(val)`` in :data:`DETECTORS` (see :mod:`engine.dispatch`); a new kind of
+value gets a handler there instead of another ``isinstance`` branch.
+
+Custom objects are classified once per class: pass a per-run ``plans`` dict
+and the tree / linked-structure decision, which depends on attribute names, is
+stored under the class together with the signature it was made for (attribute
+names and which of them hold callables). An object of a known class with the
+same signature costs one ``vars()`` scan and a dict lookup; a different
+signature (an attribute added later, ``__init__`` still running) re-plans.
+The few checks that do look at values -- a container's ``head``, an n-ary
+node's children list -- stay in the stored plan and run every time.
+
+A :class:`Plans` is that dict, plus the separate matrix memo of
+:mod:`.linear` (large grids keep their decision while their rows keep their
+identity and length); a plain dict works too, without the matrix memo.
 """
 
 from __future__ import annotations
 
+from collections import deque
 from typing import Any
+from weakref import ref
 
+from ..dispatch import TypeDispatch
 from . import trees, graph, linear, structural
 
 # Order matters: most specific first.
 PRIMITIVE = (int, float, str, bool, type(None))
 
 
-def detect_type(val: Any, name: str = "") -> str:
+class Plans(dict):
+    """Per-run detector memo: class -> ``(signature, plan)``; :attr:`shapes`
+    is the grid memo of :func:`.linear.detect_sequence`."""
+
+    __slots__ = ("shapes",)
+
+    def __init__(self):
+        super().__init__()
+        self.shapes: dict = {}
+
+
+def _object_plan(attrs: dict):
+    """Tag for a custom object with instance dict ``attrs`` -- or, when values
+    must be looked at, ``resolve(obj, plans) -> tag``."""
+    fallback = "object" if attrs else "constructing"
+    # Trees first (they go by every attribute name), then linked structures
+    # (only non-callable attributes count, see serialize.get_attrs).
+    steps = [trees.plan(set(attrs))]
+    if not isinstance(steps[0], str):
+        steps.append(structural.plan({k for k, v in attrs.items() if not callable(v)}))
+    steps = [p for p in steps if p is not None]
+    if not steps:
+        return fallback
+    if isinstance(steps[0], str):
+        return steps[0]
+
+    def resolve(obj, plans):
+        for p in steps:
+            tag = p if isinstance(p, str) else p(obj, plans)
+            if tag:
+                return tag
+        return fallback
+    return resolve
+
+
+def _object(val, name, plans):
+    # Custom classes: trees, then linked structures (planned per class).
+    attrs = vars(val)
+    if plans is None:
+        plan = _object_plan(attrs)
+    else:
+        sig = (tuple(attrs), tuple(map(callable, attrs.values())))
+        hit = plans.get(type(val))
+        if hit is not None and hit[0] == sig:
+            plan = hit[1]
+        else:
+            plan = _object_plan(attrs)
+            plans[type(val)] = (sig, plan)
+    return plan if isinstance(plan, str) else plan(val, plans)
+
+
+def _mapping(val, name, plans):
+    return graph.detect(val, name) or "object"
+
+
+def _other(val, name, plans):
+    if callable(val):
+        return "function"
+    return type(val).__name__.lower()
+
+
+def _resolve(val):
+    """The ordered chain, for types without a registered handler."""
+    if isinstance(val, PRIMITIVE):
+        return "primitive"
+    if hasattr(val, "__dict__"):
+        return _object
+    if isinstance(val, dict):
+        return _mapping
+    if isinstance(val, (list, tuple)):
+        return linear.detect_sequence
+    if isinstance(val, (set, frozenset)):
+        return "set"
+    if isinstance(val, deque):
+        return "deque"
+    return _other
+
+
+# type -> tag, or handler(val, name, plans) -> tag. Register new structures here.
+DETECTORS = TypeDispatch(_resolve)
+DETECTORS.register(*PRIMITIVE)("primitive")
+DETECTORS.register(dict)(_mapping)
+DETECTORS.register(list, tuple)(linear.detect_sequence)
+DETECTORS.register(set, frozenset)("set")
+DETECTORS.register(deque)("deque")
+_exact = DETECTORS.exact.get
+_derived = DETECTORS.derived.data.get
+_lookup = DETECTORS.lookup
+
+
+def detect_type(val: Any, name: str = "", plans: dict | None = None) -> str:
     try:
-        if isinstance(val, PRIMITIVE):
-            return "primitive"
-
-        # Custom classes: trees, then linked structures.
-        if hasattr(val, "__dict__"):
-            t = trees.detect(val)
-            if t:
-                return t
-            t = structural.detect(val)
-            if t:
-                return t
-            return "object" if vars(val) else "constructing"
-
-        # dict-like.
-        if isinstance(val, dict):
-            t = graph.detect(val, name)
-            if t:
-                return t
-            return "object"
-
-        # list / tuple / deque / set.
-        t = linear.detect(val, name)
-        if t:
-            return t
-
-        if callable(val):
-            return "function"
-        return type(val).__name__.lower()
+        cls = type(val)
+        handler = _exact(cls) or _derived(ref(cls)) or _lookup(val)
+        return handler if isinstance(handler, str) else handler(val, name, plans)
     except Exception:
         return "unknown"
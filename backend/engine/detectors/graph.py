@@ -1,33 +1,41 @@
-"""Detect graph-shaped values held in dicts."""
+"""Detect graph-shaped values held in dicts.
+
+Both shapes are decided by the types of keys and values alone, checked with
+:func:`~engine.detectors.linear.all_instances` (a type scan run in C). For a
+dict that is cheaper than any memo could be: proving a dict unchanged means
+visiting every key and value anyway.
+"""
 
 from __future__ import annotations
 
+from itertools import chain
 from typing import Any
 
+from .linear import all_instances
+
+_KEYS = (int, str, tuple)
+_NEIGHBOURS = (list, tuple, set)
+_WEIGHTS = (int, float)
+_KEY_SET = frozenset(_KEYS)
+_NEIGHBOUR_SET = frozenset(_NEIGHBOURS)
+_WEIGHT_SET = frozenset(_WEIGHTS)
+_DICT_SET = frozenset((dict,))
+
 
 def detect(val: dict, name: str = "") -> str | None:
     if not isinstance(val, dict) or not val:
         return None
 
     # Adjacency list: every key maps to an iterable of neighbours.
-    looks_adj = True
-    for k, v in val.items():
-        if not isinstance(k, (int, str, tuple)):
-            looks_adj = False
-            break
-        if not isinstance(v, (list, tuple, set)):
-            looks_adj = False
-            break
-    if looks_adj:
+    values = val.values()
+    if (all_instances(val, _KEYS, _KEY_SET)
+            and all_instances(values, _NEIGHBOURS, _NEIGHBOUR_SET)):
         return "graph_adjacency_list"
 
     # Weighted adjacency: key -> {neighbour: weight}.
-    if all(isinstance(v, dict) for v in val.values()):
-        inner_ok = all(
-            all(isinstance(w, (int, float)) for w in v.values())
-            for v in val.values() if v
-        )
-        if inner_ok:
+    if all_instances(values, (dict,), _DICT_SET):
+        weights = list(chain.from_iterable(map(dict.values, values)))
+        if all_instances(weights, _WEIGHTS, _WEIGHT_SET):
             return "graph_weighted"
 
     return None
@@ -7,10 +7,25 @@ Detection blends two signals:
 
 Access-pattern based promotion (a list used purely with append/pop -> stack)
 is applied later in the runner using usage stats; here we use name + shape.
+
+Shape checks are type scans run in C (``map(type, ...)`` against a set of
+exact types), falling back to the ``isinstance`` scan only when that fails, so
+subclasses still count. Large matrices are re-detected on every step (their
+windowed scenes are rebuilt each time), so with a per-run
+:class:`~engine.detectors.Plans` a positive matrix decision is memoized per
+object (in ``plans.shapes``): while the grid keeps its
+identity, row count, row objects and row lengths, only rows that were replaced
+or resized are rescanned, plus a rotating sample of :data:`SAMPLE_CELLS` cells
+of the others. Any structural change is therefore caught at once; a
+non-scalar written in place into an unchanged row of a grid larger than
+:data:`SCAN_BUDGET` cells is caught when the sample reaches its row. Grids
+within the budget are always scanned in full.
 """
 
 from __future__ import annotations
 
+from collections import deque
+from itertools import chain
 from typing import Any
 
 STACK_NAMES = {"stack", "st", "stk", "callstack"}
@@ -19,41 +34,95 @@ HEAP_NAMES = {"heap", "pq", "priorityqueue", "minheap", "maxheap"}
 DSU_NAMES = {"parent", "parents", "par", "uf", "dsu", "root", "rank"}
 DP_NAMES = {"dp", "memo", "cache", "table", "tab", "cost"}
 
+SCAN_BUDGET = 16_384     # grids up to this many cells are always fully scanned
+SAMPLE_CELLS = 2_048     # unchanged cells re-checked per step above the budget
+SHAPE_SLOTS = 32         # memoized grids per run
+
+_ROWS = (list, tuple)
+_SCALARS = (int, float, str, bool, type(None))
+_ROW_SET = frozenset(_ROWS)
+_SCALAR_SET = frozenset(_SCALARS)
+_INT_SET = frozenset((int,))
+
+
+def all_instances(items, kinds: tuple, exact: frozenset) -> bool:
+    """``all(isinstance(x, kinds) for x in items)`` -- by exact type in C first
+    (``exact`` is ``frozenset(kinds)``); ``items`` must be re-iterable."""
+    return (all(map(exact.__contains__, map(type, items)))
+            or all(isinstance(x, kinds) for x in items))
 
-def _is_matrix(val) -> bool:
+
+def _scalar_rows(rows) -> bool:
+    return (all(map(_SCALAR_SET.__contains__, map(type, chain.from_iterable(rows))))
+            or all(all_instances(row, _SCALARS, _SCALAR_SET) for row in rows))
+
+
+def _is_matrix(val, plans: dict | None = None) -> bool:
     if not val or not isinstance(val, (list, tuple)):
         return False
-    if not all(isinstance(row, (list, tuple)) for row in val):
+    if not all_instances(val, _ROWS, _ROW_SET):
         return False
     # Rectangular-ish and scalar cells.
-    return all(
-        all(isinstance(x, (int, float, str, bool, type(None))) for x in row)
-        for row in val
-    )
+    memo = getattr(plans, "shapes", None)
+    if memo is None:
+        return _scalar_rows(val)
+    lens = tuple(map(len, val))
+    cells = sum(lens)
+    if cells <= SCAN_BUDGET:
+        return _scalar_rows(val)
 
+    ids = tuple(map(id, val))
+    entry = memo.get(id(val))
+    # entry = [grid, row ids, row lengths, sample cursor]; holding the grid
+    # keeps its id from being reused while the entry lives.
+    if entry is None or entry[0] is not val or len(entry[1]) != len(ids):
+        memo.pop(id(val), None)
+        if not _scalar_rows(val):
+            return False
+        if len(memo) >= SHAPE_SLOTS:
+            del memo[next(iter(memo))]
+        memo[id(val)] = [val, ids, lens, 0]
+        return True
 
-def detect(val: Any, name: str = "") -> str | None:
-    is_deque = type(val).__name__ == "deque"
-    if not isinstance(val, (list, tuple)) and not is_deque and not isinstance(val, (set, frozenset)):
-        return None
+    n = len(ids)
+    changed = []
+    if ids != entry[1] or lens != entry[2]:
+        changed = [val[k] for k, (i, m, pi, pm)
+                   in enumerate(zip(ids, lens, entry[1], entry[2]))
+                   if i != pi or m != pm]
+    step = max(1, SAMPLE_CELLS * n // cells)
+    start = entry[3] % n
+    sample = val[start:start + step]
+    if not _scalar_rows(changed) or not _scalar_rows(sample):
+        del memo[id(val)]
+        return False
+    entry[1], entry[2], entry[3] = ids, lens, start + step
+    return True
 
-    low = name.lower()
 
+def detect(val: Any, name: str = "", plans: dict | None = None) -> str | None:
     if isinstance(val, (set, frozenset)):
         return "set"
-
-    if is_deque:
+    if isinstance(val, deque):
         return "deque"
+    if not isinstance(val, (list, tuple)):
+        return None
+    return detect_sequence(val, name, plans)
+
+
+def detect_sequence(val: list | tuple, name: str = "", plans: dict | None = None) -> str:
+    """Tag for a list / tuple (``detect`` minus the set / deque cases)."""
+    low = name.lower()
 
     # 2D numeric/scalar grid.
-    if _is_matrix(val):
+    if _is_matrix(val, plans):
         # DP tables are matrices conventionally named dp/memo/cost/...
         if low in DP_NAMES:
             return "dp_grid"
         return "matrix"
 
     # Name-driven linear roles.
-    if low in DSU_NAMES and all(isinstance(x, int) for x in val):
+    if low in DSU_NAMES and all_instances(val, (int,), _INT_SET):
         return "dsu"
     if low in STACK_NAMES:
         return "stack"
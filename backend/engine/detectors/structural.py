@@ -4,42 +4,72 @@ A *node* has a value plus at least one reference to another same-shaped object
 through a ``next``/``prev`` style attribute. A *container* (e.g. ``LinkedList``)
 is a thin wrapper holding a ``head``. We classify either as a linked list so the
 serializer can walk it.
+
+Only the container check looks at values (is ``head`` a node right now?); the
+rest depends on attribute names alone, which :func:`plan` decides once per
+class (see :func:`engine.detectors.detect_type`).
 """
 
 from __future__ import annotations
 
+from functools import partial
 from typing import Any
 
 from ..serialize import NEXT_ATTRS, PREV_ATTRS, VAL_ATTRS, get_attrs
 
 _LINK = set(NEXT_ATTRS) | set(PREV_ATTRS)
+_PREV = set(PREV_ATTRS)
 _VAL = set(VAL_ATTRS)
 _HEAD = {"head", "root", "front", "first"}
 
 
-def _is_node(obj: Any) -> bool:
-    if not hasattr(obj, "__dict__"):
-        return False
-    attrs = set(get_attrs(obj).keys())
+def _node_kind(attrs: set) -> str | None:
+    """Linked-list tag for a node with these (non-callable) attribute names."""
     has_link = bool(attrs & _LINK)
     has_val = bool(attrs & _VAL) or len(attrs) <= 3
-    return has_link and has_val
+    if not (has_link and has_val):
+        return None
+    return "doubly_linked_list" if (attrs & _PREV) else "linked_list"
 
 
-def detect(obj: Any) -> str | None:
+def node_kind(obj: Any, plans: dict | None = None) -> str | None:
+    """:func:`_node_kind` of ``obj``, memoized per class in ``plans``."""
     if not hasattr(obj, "__dict__"):
         return None
+    if plans is None:
+        return _node_kind(set(get_attrs(obj)))
+    d = vars(obj)
+    sig = (tuple(d), tuple(map(callable, d.values())))
+    key = ("node", type(obj))
+    hit = plans.get(key)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    kind = _node_kind({k for k, v in d.items() if not callable(v)})
+    plans[key] = (sig, kind)
+    return kind
 
-    # Direct node?
-    if _is_node(obj):
-        attrs = set(get_attrs(obj).keys())
-        return "doubly_linked_list" if (attrs & set(PREV_ATTRS)) else "linked_list"
-
-    # Container wrapping a head node?
-    attrs = get_attrs(obj)
-    for key in _HEAD:
-        if key in attrs and _is_node(attrs[key]):
-            inner = set(get_attrs(attrs[key]).keys())
-            return "doubly_linked_list" if (inner & set(PREV_ATTRS)) else "linked_list"
 
+def _container(obj: Any, plans: dict | None = None, heads: tuple = ()) -> str | None:
+    attrs = vars(obj)
+    for key in heads:
+        kind = node_kind(attrs[key], plans)
+        if kind:
+            return kind
     return None
+
+
+def plan(attrs: set):
+    """The name-only part of :func:`detect` for non-callable attribute names
+    ``attrs``: a tag, ``None``, or ``resolve(obj, plans)`` for a container."""
+    kind = _node_kind(attrs)
+    if kind:
+        return kind
+    heads = tuple(key for key in _HEAD if key in attrs)
+    return partial(_container, heads=heads) if heads else None
+
+
+def detect(obj: Any, plans: dict | None = None) -> str | None:
+    if not hasattr(obj, "__dict__"):
+        return None
+    p = plan(set(get_attrs(obj)))
+    return p(obj, plans) if callable(p) else p
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from functools import partial
 from typing import Any
 
 from ..serialize import LEFT_ATTRS, RIGHT_ATTRS
@@ -10,11 +11,14 @@ _LEFT = set(LEFT_ATTRS)
 _RIGHT = set(RIGHT_ATTRS)
 
 
-def detect(obj: Any) -> str | None:
-    if not hasattr(obj, "__dict__"):
-        return None
-    attrs = set(vars(obj).keys())
+def _nary(obj: Any, plans: dict | None = None, attr: str = "children") -> str | None:
+    return "nary_tree" if isinstance(getattr(obj, attr), (list, tuple)) else None
 
+
+def plan(attrs: set):
+    """Classification from attribute names: a tag, ``None``, or -- for an
+    n-ary candidate, which also needs its children to be a list --
+    ``resolve(obj, plans)``."""
     has_left = bool(attrs & _LEFT)
     has_right = bool(attrs & _RIGHT)
 
@@ -37,13 +41,15 @@ def detect(obj: Any) -> str | None:
         return "trie"
 
     # N-ary tree: a value + a list of children.
-    if attrs & {"children", "kids", "child"}:
-        children = None
-        for n in ("children", "kids", "child"):
-            if n in attrs:
-                children = getattr(obj, n)
-                break
-        if isinstance(children, (list, tuple)):
-            return "nary_tree"
+    for n in ("children", "kids", "child"):
+        if n in attrs:
+            return partial(_nary, attr=n)
 
     return None
+
+
+def detect(obj: Any, plans: dict | None = None) -> str | None:
+    if not hasattr(obj, "__dict__"):
+        return None
+    p = plan(set(vars(obj).keys()))
+    return p(obj, plans) if callable(p) else p
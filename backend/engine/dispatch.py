@@ -0,0 +1,60 @@
+"""Exact-type dispatch tables.
+
+``detect_type`` and ``deep_json_safe`` run on every value of every step, and
+used to decide through chains of ``isinstance`` / ``hasattr`` tests -- a value
+paid for every test above the one that matched. A :class:`TypeDispatch` maps
+exact types to handlers instead: one dict lookup on ``type(val)``.
+
+A type nobody registered (a subclass, a user class) goes once through the
+table's ``resolve(val)`` -- the ordered chain, kept as the slow path so
+subclasses behave as before -- and the handler it picks is cached for that
+type. That cache holds classes weakly: a traced program's classes (and,
+through their methods, its globals) must not outlive the run.
+
+New structures register a handler for their type (``@table.register(T)``)
+rather than growing the chain; registered handlers apply to the exact type,
+subclasses still go through ``resolve``.
+
+Hot callers can inline the two cached lookups and call ``lookup`` only on a
+miss: ``exact.get(cls) or derived.data.get(weakref.ref(cls))`` -- ``ref(cls)``
+is CPython's shared callback-free weakref, cheap to get, and it hashes and
+compares like the class while the class lives.
+"""
+
+from __future__ import annotations
+
+import weakref
+from typing import Any, Callable
+
+_ref = weakref.ref
+
+
+class TypeDispatch:
+    """``type(val)`` -> handler (any object, e.g. a callable or a constant),
+    with a cached ``resolve`` fallback."""
+
+    def __init__(self, resolve: Callable[[Any], Any]):
+        self.exact: dict = {}                         # registered type -> handler
+        self.derived = weakref.WeakKeyDictionary()    # resolved type -> handler
+        exact_get, derived_get = self.exact.get, self.derived.data.get
+        derived = self.derived
+
+        # A closure, not a method: no attribute lookups on the hot path.
+        def lookup(val: Any) -> Any:
+            cls = type(val)
+            handler = exact_get(cls)
+            if handler is None:
+                handler = derived_get(_ref(cls))
+                if handler is None:
+                    handler = derived[cls] = resolve(val)
+            return handler
+        self.lookup = lookup
+
+    def register(self, *types: type):
+        """Decorator: handle values whose type is exactly one of ``types``."""
+        def add(handler):
+            for t in types:
+                self.exact[t] = handler
+            self.derived.clear()      # earlier fallback decisions may be stale
+            return handler
+        return add
@@ -0,0 +1,210 @@
+"""Hash-consed scenes and the ``shared`` step format.
+
+:class:`~engine.scene_cache.SceneCache` reuses a scene while the *same call*
+sees the *same* value unchanged. Everything else -- a tree passed down
+through 1000 recursive calls, a grid rebuilt because one cell changed, a
+windowed array -- still produced a fresh deep copy per step. The
+:class:`SceneInterner` makes scenes hash-consed values instead: every dict /
+list node is looked up by content (children by identity, scalars by type and
+value) and replaced by the one canonical object, bottom-up. Equal scenes, and
+the unchanged subtrees of changed ones, are then one object however many
+steps refer to them.
+
+Scenes are immutable from here on: nothing downstream may mutate a scene in
+place (relabeling only touches ``var_types``).
+
+``shared`` step format
+----------------------
+Because equal scenes are now the *same object*, the envelope can say "same as
+scene #k" instead of repeating it::
+
+    {"i": 7, ..., "locals": {"i": 3}, "scene_refs": {"arr": 4, "root": 2},
+     "call_stack_refs": [0, 5], "scenes": {"4": [1, 2, 5, 9]}}
+
+``locals`` keeps scalar values inline; every container scene is a reference
+into a table that grows as the trace goes. ``call_stack`` frames (interned on
+entry, so a tree passed down a recursion is one object in every frame) go
+into the same table. A step carries (under ``scenes``) only the entries that
+appear for the first time, so output size follows the number of *changes*,
+not the number of steps or the recursion depth. :func:`decode_steps` rebuilds
+the ``full`` format.
+
+The encoder remembers the last :data:`MAX_ENTRIES` scenes it referenced
+(least recently used dropped), so a long trace does not keep every scene it
+ever sent alive. A forgotten scene that comes back is sent again under a new
+number; numbers are never reused, so the decoder needs no eviction of its own.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any
+
+MAX_ENTRIES = 50_000      # interned nodes kept (least recently used dropped)
+RECURSE_LEVELS = 64       # nesting interned recursively; deeper goes to a stack
+
+_CONTAINERS = (dict, list)
+
+
+def _ref(v: Any):
+    return id(v) if type(v) in _CONTAINERS else (type(v), v)
+
+
+class SceneInterner:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> canonical node. A key names its children by id(); the
+        # canonical node holds those children, so the ids stay valid for as
+        # long as the entry lives.
+        self._table: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def intern(self, scene: Any, _depth: int = 0, _done: dict | None = None) -> Any:
+        """The canonical object equal to ``scene`` (scalars are returned as-is).
+
+        A container that occurs several times in ``scene`` (deep_json_safe
+        reuses repeated sub-values) is interned once: ``_done`` maps its id to
+        the result for the rest of the call.
+        """
+        t = type(scene)
+        if t is not dict and t is not list:
+            return scene
+        if _done is None:
+            _done = {}
+        else:
+            found = _done.get(id(scene))
+            if found is not None:
+                return found
+        if _depth == RECURSE_LEVELS:
+            # Deeper than this (a 500-node degenerate tree) -> explicit stack.
+            return self._intern_deep(scene, _done)
+        if t is dict:
+            canon = {k: self.intern(v, _depth + 1, _done) for k, v in scene.items()}
+            key = (dict, tuple((k, _ref(v)) for k, v in canon.items()))
+        else:
+            canon = [self.intern(v, _depth + 1, _done) for v in scene]
+            key = (list, tuple(map(_ref, canon)))
+        found = _done[id(scene)] = self._canonical(key, canon)
+        return found
+
+    def adopt(self, node: Any) -> Any:
+        """:meth:`intern` for a dict / list whose containers are canonical
+        already -- one level, no recursion (see :mod:`engine.heap`)."""
+        if type(node) is dict:
+            key = (dict, tuple((k, _ref(v)) for k, v in node.items()))
+        else:
+            key = (list, tuple(map(_ref, node)))
+        return self._canonical(key, node)
+
+    def _intern_deep(self, scene: Any, done: dict) -> Any:
+        """:meth:`intern` over an explicit stack (children before parents);
+        ``done`` maps id(node) -> canonical node."""
+        if type(scene) not in _CONTAINERS:
+            return scene
+        stack = [(scene, False)]
+        while stack:
+            node, ready = stack.pop()
+            if ready:
+                if type(node) is dict:
+                    canon = {k: done[id(v)] if type(v) in _CONTAINERS else v
+                             for k, v in node.items()}
+                    key = (dict, tuple((k, _ref(v)) for k, v in canon.items()))
+                else:
+                    canon = [done[id(v)] if type(v) in _CONTAINERS else v for v in node]
+                    key = (list, tuple(map(_ref, canon)))
+                done[id(node)] = self._canonical(key, canon)
+            elif id(node) not in done:
+                stack.append((node, True))
+                items = node.values() if type(node) is dict else node
+                stack.extend((v, False) for v in items if type(v) in _CONTAINERS)
+        return done[id(scene)]
+
+    def _canonical(self, key: tuple, canon: Any) -> Any:
+        try:
+            found = self._table.get(key)
+        except TypeError:                  # unhashable leaf: leave it alone
+            return canon
+        if found is not None:
+            self._table.move_to_end(key)
+            self.hits += 1
+            return found
+        self.misses += 1
+        self._table[key] = canon
+        if len(self._table) > self.max_entries:
+            self._table.popitem(last=False)
+        return canon
+
+    def stats(self) -> dict:
+        looked = self.hits + self.misses
+        return {"nodes": len(self._table), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / looked, 4) if looked else 0.0}
+
+
+class SharedEncoder:
+    """Incremental ``full`` -> ``shared`` step encoder (see module doc)."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        # id(scene) -> (table index, scene); holding the scene keeps its id
+        # from being reused while the entry lives.
+        self._ids: OrderedDict = OrderedDict()
+        self._next = 0
+
+    def _ref(self, scene, new: dict) -> int:
+        entry = self._ids.get(id(scene))
+        if entry is not None:
+            self._ids.move_to_end(id(scene))
+            return entry[0]
+        k = self._next
+        self._next += 1
+        self._ids[id(scene)] = (k, scene)
+        new[str(k)] = scene
+        if len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
+        return k
+
+    def encode(self, step: dict) -> dict:
+        enc = {k: v for k, v in step.items() if k not in ("locals", "call_stack")}
+        inline, refs, new = {}, {}, {}
+        for name, scene in step.get("locals", {}).items():
+            if type(scene) in _CONTAINERS:
+                refs[name] = self._ref(scene, new)
+            else:
+                inline[name] = scene
+        enc["locals"] = inline
+        if refs:
+            enc["scene_refs"] = refs
+        stack = step.get("call_stack")
+        if stack is not None:
+            enc["call_stack_refs"] = [self._ref(frame, new) for frame in stack]
+        if new:
+            enc["scenes"] = new
+        return enc
+
+
+def encode_steps(steps: list) -> list:
+    """Return a ``shared``-format copy of ``steps`` (the input is not mutated)."""
+    encoder = SharedEncoder()
+    return [encoder.encode(step) for step in steps]
+
+
+def decode_steps(steps) -> list:
+    """Rebuild full steps from a ``shared`` stream (must start at step 0)."""
+    table: dict = {}
+    out = []
+    for step in steps:
+        table.update(step.get("scenes", {}))
+        dec = {k: v for k, v in step.items()
+               if k not in ("scene_refs", "scenes", "call_stack_refs")}
+        merged = dict(step.get("locals", {}))
+        for name, k in step.get("scene_refs", {}).items():
+            merged[name] = table[str(k)]
+        # Keep the variables in var_types order (the order they were recorded).
+        order = list(step.get("var_types", {}))
+        dec["locals"] = {n: merged[n] for n in order if n in merged}
+        dec["locals"].update((n, v) for n, v in merged.items() if n not in dec["locals"])
+        if "call_stack_refs" in step:
+            dec["call_stack"] = [table[str(k)] for k in step["call_stack_refs"]]
+        out.append(dec)
+    return out
@@ -0,0 +1,249 @@
+"""Per-step object heap: each list / tree node is serialized once per step.
+
+In linked-list and tree code several locals usually point into one structure
+-- ``head``, ``prev``, ``cur``, ``nxt``, ``dummy``, ``node`` -- and every step
+used to fingerprint, serialize and intern the whole chain or tree once per
+alias. A :class:`StepHeap` lives for one step (one ``_serialize_locals``) and
+makes the node objects, not the variables, the unit of work:
+
+* **Linked lists.** A list node's dict (:func:`engine.serialize.list_node`)
+  depends on that node alone: ``next`` / ``prev`` name the ids of the objects
+  it points at. The heap builds it once per object per step, so a second
+  alias walking the same chain only looks nodes up. A node whose dict equals
+  last step's reuses that canonical (interned) dict, and the scene around
+  them is interned one level deep (:meth:`SceneInterner.adopt`) -- an
+  unchanged list comes out as the very same scene object, without a
+  fingerprint.
+
+* **Trees.** A tree scene built (or taken from the scene cache) this step is
+  *clean* when nothing in it was cut or marked as a revisit. Every subtree of
+  a clean scene is exactly what a walk from that node would produce, so a
+  local pointing at any of its nodes gets that canonical subtree as its root,
+  with no walk at all. The index of a clean scene is built the first time an
+  alias asks.
+
+Each local's scene still names the node it points at -- ``nodes[0]["id"]`` or
+``root["id"]`` -- so the client can draw every variable as an arrow into one
+drawing of the structure.
+
+The ``heap`` step format puts the same model on the wire. Every list / tree
+local that shares nodes with another local becomes a pointer -- its scene with
+the node structure replaced, in place, by ``ref``, the id of the node it
+starts at -- and the step carries each node they reach once, as a
+:func:`engine.patch.flatten` row::
+
+    {"i": 12, ...,
+     "locals": {"head": {"type": "linked_list", "circular": false, "ref": 1, "head": 0},
+                "cur": {"type": "linked_list", "circular": false, "ref": 3, "head": 0}},
+     "heap": {"1": {"value": 5, "next": 2, "prev": null}, "2": {...}, "3": {...}}}
+
+A list is rebuilt by following ``next`` from ``ref`` (stopping at a repeat
+or :data:`~engine.serialize.MAX_NODES`, as the walk did); a tree from the row
+of ``ref`` down. A structure no other local reaches stays inline, and so does
+any scene that would not reproduce exactly -- an error scene, a tree cut
+where another alias is not.
+:class:`HeapEncoder` / :func:`decode_steps` convert from / to ``full``.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from . import patch as patch_mod
+from . import serialize as ser
+from .patch import LINKS, LIST_TYPES
+
+LIST_TAGS = frozenset({"linked_list", "doubly_linked_list"})
+TREE_TAGS = frozenset({"binary_tree", "avl_tree", "red_black_tree", "segment_tree",
+                       "nary_tree", "trie"})
+
+
+class StepHeap:
+    """One step's list / tree nodes, shared by every local that reaches them.
+
+    ``rows`` (stable id -> canonical node dict) is the previous step's
+    :attr:`rows`; the tracer hands it from one step to the next.
+    """
+
+    def __init__(self, ids, interner, rows: dict):
+        self.ids = ids
+        self.interner = interner
+        self.prev_rows = rows
+        self.rows: dict = {}           # stable id -> canonical list node, this step
+        self._nodes: dict = {}         # id(obj) -> (canonical list node, next obj)
+        self._pending: list = []       # (vtype, tree scene) not indexed yet
+        self._subtrees: dict = {}      # (vtype, stable id) -> canonical subtree
+
+    def scene(self, val: Any, vtype: str) -> Any:
+        """Scene of a list / tree local built from the heap, or ``None`` when
+        the caller has to build it itself."""
+        try:
+            if vtype in LIST_TAGS:
+                return self.linked_list(val)
+            if vtype in TREE_TAGS:
+                return self.subtree(val, vtype)
+        except Exception as exc:       # same contract as build_scene
+            return {"type": vtype, "error": str(exc)[:120]}
+        return None
+
+    # -- linked lists -------------------------------------------------------- #
+    def list_node(self, obj: Any) -> tuple[dict, Any]:
+        entry = self._nodes.get(id(obj))
+        if entry is None:
+            node, nxt = ser.list_node(obj, self.ids)
+            nid = node["id"]
+            canon = self.prev_rows.get(nid)
+            if canon != node:
+                canon = self.interner.intern(node)
+            self.rows[nid] = canon
+            entry = self._nodes[id(obj)] = (canon, nxt)
+        return entry
+
+    def linked_list(self, val: Any) -> dict:
+        scene = ser.serialize_linked_list(val, self.ids, self.list_node)
+        scene["nodes"] = self.interner.adopt(scene["nodes"])
+        return self.interner.adopt(scene)
+
+    # -- trees --------------------------------------------------------------- #
+    def record(self, vtype: str, scene: Any) -> None:
+        """Offer a canonical tree scene built this step to later aliases."""
+        if vtype in TREE_TAGS and type(scene) is dict and "elided" not in scene \
+                and type(scene.get("root")) is dict:
+            self._pending.append((vtype, scene))
+
+    def subtree(self, val: Any, vtype: str) -> dict | None:
+        while self._pending:
+            self._index(*self._pending.pop())
+        if not self._subtrees:
+            return None
+        root = self._subtrees.get((vtype, self.ids.of(val)))
+        if root is None:
+            return None
+        return self.interner.adopt({"type": vtype, "root": root})
+
+    def _index(self, vtype: str, scene: dict) -> None:
+        """Index every subtree of ``scene`` -- unless it holds a marker."""
+        fields, shape = LINKS[vtype]
+        found = {}
+        stack = [scene["root"]]
+        while stack:
+            node = stack.pop()
+            if type(node) is not dict or "id" not in node:
+                return                 # cut / revisit marker: not clean
+            found[(vtype, node["id"])] = node
+            for f in fields:
+                v = node[f]
+                if shape == "one":
+                    if v is not None:
+                        stack.append(v)
+                elif shape == "list":
+                    stack.extend(v)
+                else:
+                    stack.extend(v.values())
+        self._subtrees.update(found)
+
+
+# -- the ``heap`` step format ---------------------------------------------- #
+def _walk(first: int, rows: dict) -> list:
+    """Node ids of a list from ``first``, stopping where the serializer did."""
+    out, seen, nid = [], set(), first
+    while nid is not None and nid not in seen and len(out) < ser.MAX_NODES:
+        row = rows.get(nid)
+        if row is None:
+            break
+        seen.add(nid)
+        out.append(nid)
+        nid = row["next"]
+    return out
+
+
+def _pointer(top: dict) -> dict | None:
+    """``top`` with its node structure swapped, in place, for ``ref``."""
+    key = "nodes" if top["type"] in LIST_TYPES else "root"
+    first = top[key][0] if key == "nodes" and top[key] else top[key]
+    if type(first) is not int:
+        return None                    # empty list / tree, or a bare marker
+    return {("ref" if k == key else k): (first if k == key else v)
+            for k, v in top.items()}
+
+
+class HeapEncoder:
+    """Incremental ``full`` -> ``heap`` step encoder (see module doc)."""
+
+    def __init__(self):
+        self._flat: dict = {}          # id(scene) -> (scene, flattened), last step
+
+    def _flatten(self, scene, seen: dict):
+        hit = self._flat.get(id(scene))
+        flat = hit[1] if hit is not None and hit[0] is scene else patch_mod.flatten(scene)
+        seen[id(scene)] = (scene, flat)
+        return flat
+
+    def encode(self, step: dict) -> dict:
+        enc = {k: v for k, v in step.items() if k != "locals"}
+        types = step.get("var_types", {})
+        seen: dict = {}
+        found = []                     # (name, pointer, rows) of list / tree locals
+        owner: dict = {}               # node id -> first local reaching it
+        aliased: set = set()
+        for name, scene in step.get("locals", {}).items():
+            if types.get(name) not in LINKS or type(scene) is not dict \
+                    or scene.get("type") not in LINKS:
+                continue
+            flat = self._flatten(scene, seen)
+            pointer = flat and _pointer(flat[0])
+            if pointer is None or (scene["type"] in LIST_TYPES
+                                   and _walk(pointer["ref"], flat[1]) != flat[0]["nodes"]):
+                continue
+            found.append((name, pointer, flat[1]))
+            for nid in flat[1]:
+                first = owner.setdefault(nid, name)
+                if first != name:
+                    aliased.update((first, name))
+        self._flat = seen
+        scenes = dict(step.get("locals", {}))
+        table: dict = {}
+        for name, pointer, rows in found:
+            # Only locals sharing nodes with another one: a lone structure is
+            # no smaller as a pointer plus rows.
+            if name not in aliased \
+                    or any(table.get(nid, row) != row for nid, row in rows.items()):
+                continue
+            table.update(rows)
+            scenes[name] = pointer
+        enc["locals"] = scenes
+        if table:
+            enc["heap"] = {str(nid): row for nid, row in table.items()}
+        return enc
+
+
+def encode_steps(steps: list) -> list:
+    """Return a ``heap``-format copy of ``steps`` (the input is not mutated)."""
+    encoder = HeapEncoder()
+    return [encoder.encode(step) for step in steps]
+
+
+def _rebuild(pointer: dict, rows: dict) -> dict:
+    kind = pointer["type"]
+    key = "nodes" if kind in LIST_TYPES else "root"
+    first = pointer["ref"]
+    top = {(key if k == "ref" else k): v for k, v in pointer.items()}
+    if kind in LIST_TYPES:
+        top["nodes"] = _walk(first, rows)
+    return patch_mod.unflatten(top, rows)
+
+
+def decode_steps(steps) -> list:
+    """Rebuild full steps from a ``heap`` stream (any step decodes alone)."""
+    out = []
+    for step in steps:
+        dec = {k: v for k, v in step.items() if k != "heap"}
+        rows = {int(k): v for k, v in step.get("heap", {}).items()}
+        types = step.get("var_types", {})
+        dec["locals"] = {
+            name: _rebuild(scene, rows)
+            if types.get(name) in LINKS and type(scene) is dict and "ref" in scene
+            else scene
+            for name, scene in step.get("locals", {}).items()}
+        out.append(dec)
+    return out
@@ -0,0 +1,369 @@
+"""Per-line metadata, computed once per program instead of once per step.
+
+Everything the tracer used to derive from the source text on *every* event --
+the stripped line, its scope kind, its semantic keyword tag, the loop header
+shape and the branch condition -- only depends on the line itself.
+:func:`build_line_table` works it all out up front from the AST, so the hot
+path does ``table[lineno]`` and nothing else.
+
+Multi-line statements
+---------------------
+A statement or ``for``/``while``/``if`` header that spans several physical
+lines is classified once, on its first line, from the *whole* statement text
+(so ``if (a and\\n    b):`` evaluates ``(a and\\n    b)``). Its continuation
+lines carry no scope / tag / loop / condition of their own -- their events
+belong to the statement already described on its first line.
+
+Sources that get evaluated (conditions, ``range`` arguments, subscript
+indices) are taken verbatim, so a string literal keeps its exact whitespace;
+only the display fields (``condition``, ``iterable``, ``vars``) of a
+multi-line header are normalized.
+
+Single-line statements are classified from the line text exactly like the
+string helpers in :mod:`engine.scope` / :mod:`engine.semantic`, except that
+loop headers and conditions come from the AST (so ``range(len(arr))`` splits
+into the right arguments and ``if x: y`` yields the condition ``x``).
+"""
+
+from __future__ import annotations
+
+import ast
+from dataclasses import dataclass
+
+from . import scope as scope_mod
+from . import semantic as sem
+
+
+@dataclass(frozen=True)
+class Effects:
+    """What running one line can do to objects that already exist, for
+    :class:`~engine.scene_cache.SceneCache`.
+
+    A *chain* ``(name, ((kind, key), ...))`` names an object the way the line
+    does: ``self.items[i]`` is ``("self", (("a", "items"), ("i", "i")))``.
+    Chains are resolved after the line has run; ``"i"`` keys are index
+    sources for :func:`engine.scope.eval_expr`.
+    """
+
+    binds: frozenset = frozenset()  # names (re)bound
+    stores: tuple = ()              # chains of objects written in place
+    loads: tuple = ()               # chains of containers indexed (defaultdict inserts)
+    calls: tuple = ()               # (receiver chain, method name)
+    reads: tuple = ()               # chains a builtin calls or iterates (must be inert)
+    builtins: frozenset = frozenset()  # whitelisted builtins called by name
+
+
+@dataclass
+class LineInfo:
+    text: str                       # stripped source line (the step's ``code``)
+    scope: str | None = None        # "loop" / "conditional" / None
+    tag: str | None = None          # semantic.classify_line result
+    loop: dict | None = None        # scope.parse_loop_header-shaped dict
+    loop_end: int | None = None     # last line of the loop body (AST span)
+    cond: object = None             # condition source, scope.ELSE, or None
+    writes: tuple = ()              # (name, (index source, ...)) per a[i] = / a[i][j] +=
+    effects: Effects | None = None  # what running the line may change; None: anything
+
+
+# Builtins that never change their arguments. A user function shadowing one
+# runs as traced code, which the scene cache sees as a step of another call.
+_PURE_BUILTINS = frozenset({
+    "len", "abs", "min", "max", "sum", "range", "enumerate", "zip", "sorted",
+    "reversed", "print", "str", "int", "float", "bool", "list", "tuple", "set",
+    "frozenset", "dict", "isinstance", "type", "ord", "chr", "divmod", "pow",
+    "round", "any", "all", "map", "filter", "repr", "hash", "id", "input",
+})
+# Argument slots a builtin calls: ``map(f, ...)``, ``filter(f, ...)``, ``key=f``.
+# Only a lambda (traced like any user function), ``None`` or a plain name
+# (checked when the line has run) may fill one -- ``map(a.__setitem__, ...)``
+# or ``map(setattr, ...)`` writes without a trace event.
+_CALLABLE_ARGS = {"map": 0, "filter": 0}
+_OPAQUE_STMTS = (ast.With, ast.AsyncWith, ast.AsyncFor, ast.AsyncFunctionDef,
+                 ast.Raise, ast.Match)
+
+
+def _segment(code: str, node: ast.AST) -> str:
+    """Source of ``node`` exactly as written, for evaluation: string literals
+    keep their whitespace, and a multi-line expression is parenthesized so it
+    still parses on its own."""
+    src = ast.get_source_segment(code, node) or ""
+    return "(" + src + ")" if "\n" in src else src
+
+
+def _display(code: str, node: ast.AST) -> str:
+    """Source of ``node`` for display only: one line, as written when it
+    already is one, otherwise normalized by :func:`ast.unparse`."""
+    src = ast.get_source_segment(code, node) or ""
+    return ast.unparse(node) if "\n" in src else src
+
+
+def _loop_header(code: str, node: ast.AST) -> dict | None:
+    if isinstance(node, ast.While):
+        return {"kind": "while", "condition": _display(code, node.test)}
+    if not isinstance(node, ast.For):
+        return None
+    it, target = node.iter, node.target
+    if isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and not it.keywords \
+            and not any(isinstance(a, ast.Starred) for a in it.args):
+        if it.func.id == "range" and isinstance(target, ast.Name) and 1 <= len(it.args) <= 3:
+            return {"kind": "for_range", "index_var": target.id,
+                    "range_args": [_segment(code, a) for a in it.args]}
+        if it.func.id == "enumerate":
+            return {"kind": "for_enumerate", "vars": _target_vars(code, target)}
+    return {"kind": "for_in", "vars": _target_vars(code, target),
+            "iterable": _display(code, it)}
+
+
+def _target_vars(code: str, target: ast.AST) -> list:
+    if isinstance(target, ast.Tuple):
+        return [_display(code, e) for e in target.elts]
+    return [_display(code, target)]
+
+
+def _subscript_writes(code: str, target: ast.AST, out: list) -> None:
+    """``a[i]`` / ``a[i][j]`` store targets -> ``("a", ("i", "j"))``."""
+    if isinstance(target, (ast.Tuple, ast.List)):
+        for elt in target.elts:
+            _subscript_writes(code, elt, out)
+        return
+    if isinstance(target, ast.Starred):
+        _subscript_writes(code, target.value, out)
+        return
+    indices = []
+    while isinstance(target, ast.Subscript):
+        if not isinstance(target.slice, ast.Slice):
+            indices.append(_segment(code, target.slice))
+        target = target.value
+    if indices and isinstance(target, ast.Name):
+        out.append((target.id, tuple(reversed(indices))))
+
+
+def _header_end(node: ast.stmt) -> int:
+    """Last line of a statement's *own* text (a compound header stops before
+    its body)."""
+    if isinstance(node, (ast.If, ast.While)):
+        return node.test.end_lineno
+    if isinstance(node, ast.For):
+        return node.iter.end_lineno
+    if hasattr(node, "body"):
+        return node.lineno          # def/class/with/try: text-based as before
+    return node.end_lineno or node.lineno
+
+
+def _chain(code: str, node: ast.AST, names: set):
+    """``node`` as a chain (see :class:`Effects`), or ``None``; names read by
+    its index sources are added to ``names``."""
+    ops = []
+    while not isinstance(node, ast.Name):
+        if isinstance(node, ast.Attribute):
+            ops.append(("a", node.attr))
+        elif isinstance(node, ast.Subscript) and not isinstance(node.slice, ast.Slice):
+            ops.append(("i", _segment(code, node.slice)))
+            names.update(n.id for n in ast.walk(node.slice) if isinstance(n, ast.Name))
+        else:
+            return None
+        node = node.value
+    return node.id, tuple(reversed(ops))
+
+
+def _own_parts(node: ast.stmt) -> list | None:
+    """The code a statement runs itself -- a compound statement's header, not
+    its body; ``None`` when it runs code the analysis cannot follow."""
+    if isinstance(node, _OPAQUE_STMTS):
+        return None
+    if isinstance(node, (ast.If, ast.While)):
+        return [node.test]
+    if isinstance(node, ast.For):
+        return [node.target, node.iter]
+    if isinstance(node, ast.FunctionDef):
+        a = node.args
+        return node.decorator_list + a.defaults + [d for d in a.kw_defaults if d]
+    if isinstance(node, ast.ClassDef):
+        return node.decorator_list + node.bases + [k.value for k in node.keywords]
+    if isinstance(node, ast.AnnAssign):
+        return [node.target] + ([node.value] if node.value else [])
+    if hasattr(node, "body"):            # try: nothing runs on its own line
+        return []
+    return [node]
+
+
+def _walk(nodes):
+    """``ast.walk`` over ``nodes``, minus lambda bodies: a lambda only runs
+    when called, and then as traced code of its own."""
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, ast.Lambda):
+            stack.extend(node.args.defaults)
+            stack.extend(d for d in node.args.kw_defaults if d)
+        else:
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def _consumed(node: ast.AST) -> list:
+    """Expressions whose *values* ``node`` iterates or hands to a builtin --
+    a lazy ``map`` / ``filter`` object read there runs whatever it wraps."""
+    out = []
+    if isinstance(node, ast.Call):
+        out += [a.value if isinstance(a, ast.Starred) else a for a in node.args]
+        out += [k.value for k in node.keywords]
+    elif isinstance(node, (ast.For, ast.comprehension)):
+        out.append(node.iter)
+    elif isinstance(node, ast.Starred):
+        out.append(node.value)
+    elif isinstance(node, ast.Compare):
+        out += [c for op, c in zip(node.ops, node.comparators)
+                if isinstance(op, (ast.In, ast.NotIn))]
+    elif isinstance(node, ast.Assign) and \
+            any(isinstance(t, (ast.Tuple, ast.List)) for t in node.targets):
+        out.append(node.value)
+    return out
+
+
+def _effects(code: str, node: ast.stmt) -> Effects | None:
+    """:class:`Effects` of one statement, or ``None`` if it may call code that
+    changes objects the analysis cannot name (an unknown function, a
+    ``with`` block, a ``yield`` ...)."""
+    parts = _own_parts(node)
+    if parts is None:
+        return None
+    binds, stores, loads, calls, index_names = set(), [], [], [], set()
+    reads, called = [], set()
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+        binds.add(node.name)
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+        binds.update((a.asname or a.name).split(".")[0] for a in node.names)
+    elif isinstance(node, ast.AugAssign):
+        # ``x += y`` grows a list / set / dict x in place.
+        target = _chain(code, node.target, index_names)
+        if target is None:
+            return None
+        stores.append(target)
+    iterated = _consumed(node)
+    for sub in _walk(parts):
+        if isinstance(sub, (ast.Await, ast.Yield, ast.YieldFrom)):
+            return None
+        if isinstance(sub, (ast.Starred, ast.Compare, ast.comprehension)):
+            iterated += _consumed(sub)
+        load = isinstance(getattr(sub, "ctx", None), ast.Load)
+        if isinstance(sub, ast.Name):
+            if not load:
+                binds.add(sub.id)
+        elif isinstance(sub, ast.Subscript) or \
+                (isinstance(sub, ast.Attribute) and not load):
+            base = _chain(code, sub.value, index_names)
+            if base is not None:
+                (loads if load else stores).append(base)
+            elif not load:
+                return None
+        elif isinstance(sub, ast.Call):
+            fn = sub.func
+            if isinstance(fn, ast.Name) and fn.id in _PURE_BUILTINS:
+                slot = _CALLABLE_ARGS.get(fn.id)
+                fns = [sub.args[slot]] if slot is not None and len(sub.args) > slot else []
+                fns += [k.value for k in sub.keywords if k.arg == "key"]
+                for f in fns:
+                    if isinstance(f, ast.Name):
+                        reads.append((f.id, ()))
+                    elif not isinstance(f, ast.Lambda) and not (
+                            isinstance(f, ast.Constant) and f.value is None):
+                        return None
+                called.add(fn.id)
+                iterated += _consumed(sub)
+                continue
+            if isinstance(fn, ast.Attribute):
+                if isinstance(fn.value, ast.Constant):      # ", ".join(...)
+                    continue
+                recv = _chain(code, fn.value, index_names)
+                if recv is not None:
+                    calls.append((recv, fn.attr))
+                    continue
+            return None
+    for value in iterated:
+        if isinstance(value, (ast.Name, ast.Attribute, ast.Subscript)):
+            chain = _chain(code, value, index_names)
+            if chain is None:
+                return None
+            reads.append(chain)
+    if index_names & binds:
+        return None            # chains are resolved after the line rebound them
+    return Effects(frozenset(binds), tuple(dict.fromkeys(stores)),
+                   tuple(dict.fromkeys(loads)), tuple(dict.fromkeys(calls)),
+                   tuple(dict.fromkeys(reads)), frozenset(called))
+
+
+def _merge(effects: list) -> Effects | None:
+    """Effects of several statements sharing one line (``a = 1; b[a] = 2``)."""
+    if len(effects) == 1:
+        return effects[0]
+    if None in effects:
+        return None
+    chains = [c for fx in effects for c in fx.stores + fx.loads + fx.reads]
+    chains += [recv for fx in effects for recv, _ in fx.calls]
+    if any(ops for _, ops in chains):
+        return None            # an index may read a name a later statement rebinds
+    return Effects(frozenset().union(*(fx.binds for fx in effects)),
+                   tuple(dict.fromkeys(c for fx in effects for c in fx.stores)),
+                   tuple(dict.fromkeys(c for fx in effects for c in fx.loads)),
+                   tuple(dict.fromkeys(c for fx in effects for c in fx.calls)),
+                   tuple(dict.fromkeys(c for fx in effects for c in fx.reads)),
+                   frozenset().union(*(fx.builtins for fx in effects)))
+
+
+def _from_text(text: str) -> LineInfo:
+    scope = scope_mod.scope_type("line", text)
+    return LineInfo(
+        text=text, scope=scope, tag=sem.classify_line(text),
+        loop=scope_mod.parse_loop_header(text) if scope == "loop" else None,
+        cond=scope_mod.branch_condition(text) if scope == "conditional" else None,
+    )
+
+
+def build_line_table(code: str, tree: ast.AST | None = None) -> list:
+    """``table[lineno]`` -> :class:`LineInfo` for every line of ``code``
+    (index 0 is a blank placeholder)."""
+    physical = code.splitlines()
+    table = [LineInfo(text="")] + [_from_text(ln.strip()) for ln in physical]
+    if tree is None:
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return table
+
+    seen: set = set()
+    effects: dict = {}                     # first line -> [Effects | None, ...]
+    continued: set = set()                 # lines inside a multi-line statement
+    for node in ast.walk(tree):            # outer statements come first
+        if not isinstance(node, ast.stmt):
+            continue
+        effects.setdefault(node.lineno, []).append(_effects(code, node))
+        continued.update(range(node.lineno + 1, _header_end(node) + 1))
+        if node.lineno in seen:
+            continue
+        first, last = node.lineno, _header_end(node)
+        seen.add(first)
+        if not 0 < first < len(table):
+            continue
+        info = table[first]
+        if last > first:
+            whole = " ".join(ln.strip() for ln in physical[first - 1:last])
+            info = _from_text(whole)
+            info.text = table[first].text
+            for ln in range(first + 1, min(last, len(table) - 1) + 1):
+                table[ln] = LineInfo(text=table[ln].text)
+            table[first] = info
+        if isinstance(node, (ast.For, ast.While)) and info.scope == "loop":
+            info.loop = _loop_header(code, node)
+            info.loop_end = node.end_lineno
+        elif isinstance(node, ast.If) and info.scope == "conditional":
+            info.cond = _segment(code, node.test)
+        elif isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            writes: list = []
+            for target in getattr(node, "targets", None) or [node.target]:
+                _subscript_writes(code, target, writes)
+            info.writes = tuple(writes)
+    for ln, found in effects.items():
+        if 0 < ln < len(table) and ln not in continued:
+            table[ln].effects = _merge(found)
+    return table
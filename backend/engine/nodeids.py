@@ -0,0 +1,62 @@
+"""Stable node ids for linked-list and tree scenes.
+
+Linked-list nodes used to be numbered by walk position, and tree nodes not at
+all: inserting at the head renumbered every node, and a client could not tell
+which nodes of step ``k`` were still there at step ``k + 1``. A
+:class:`NodeIds` registry, owned by the tracer for the whole run, hands every
+node object a small int the first time a serializer meets it and the same int
+on every later step -- whichever variable, call or structure it is reached
+from.
+
+Ids are keyed by ``id(obj)``, which CPython reuses once an object is freed. A
+weakref callback therefore drops the entry when the node dies; objects that
+cannot be weakly referenced (``__slots__`` without ``__weakref__``) are pinned
+for the rest of the run instead, so their address cannot be recycled under a
+live id. Ids are never reissued.
+
+A fresh registry per call (the serializers' default) numbers nodes in walk
+order -- the old positional ids.
+"""
+
+from __future__ import annotations
+
+import itertools
+import weakref
+from typing import Any
+
+
+class NodeIds:
+    """``ids(obj)`` / ``ids.of(obj)`` -> the object's stable id for this run."""
+
+    def __init__(self):
+        ids: dict[int, int] = {}      # id(obj) -> stable id
+        refs: dict[int, Any] = {}     # id(obj) -> weakref (owns the callback)
+        pinned: list = []             # nodes that refuse weakrefs
+        counter = itertools.count()
+        ids_get = ids.get
+
+        def forget_cb(key: int):
+            def forget(_ref):
+                ids.pop(key, None)
+                refs.pop(key, None)
+            return forget
+
+        # A closure, not a method: serializers call it once per node.
+        def of(obj: Any) -> int:
+            key = id(obj)
+            nid = ids_get(key)
+            if nid is None:
+                nid = ids[key] = next(counter)
+                try:
+                    refs[key] = weakref.ref(obj, forget_cb(key))
+                except TypeError:
+                    pinned.append(obj)
+            return nid
+        self.of = of
+        self._ids = ids
+
+    def __call__(self, obj: Any) -> int:
+        return self.of(obj)
+
+    def __len__(self) -> int:
+        return len(self._ids)
@@ -0,0 +1,167 @@
+"""Structural patches between two scenes of one linked list or tree.
+
+With stable node ids (:mod:`engine.nodeids`) a list or tree scene is a set of
+*rows* -- one per node, keyed by id, whose pointer fields name other nodes by
+id -- plus a small *top* (type, root / node order, head, elided counts). Two
+scenes of the same structure then differ by a few rows, and the ``delta``
+step format ships just those::
+
+    {"top": {...},                       # only if the top changed
+     "add": {"7": {"val": 4, "left": None, "right": None}},
+     "remove": [3],
+     "link": {"5": {"left": 7}},          # pointer fields re-linked
+     "value": {"2": {"height": 3}}}       # any other field changed
+
+``add`` also re-sends a row whose set of fields changed (a trie node gaining
+``word``). Row ids are strings in ``add`` / ``link`` / ``value`` (JSON object
+keys) and ints everywhere else.
+
+Rows hold markers (cut / cycle nodes, which carry no id) inline. Flattening and
+rebuilding are iterative, so a 10k-deep chain costs no recursion; the rebuilt
+scene equals the original, key order included.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+LIST_TYPES = ("linked_list", "doubly_linked_list")
+_BINARY = ("left", "right")
+
+# scene type -> (pointer fields of a row, tree slot shape: "one" | "list" | "map")
+LINKS = {
+    "linked_list": (("next", "prev"), None),
+    "doubly_linked_list": (("next", "prev"), None),
+    "binary_tree": (_BINARY, "one"),
+    "avl_tree": (_BINARY, "one"),
+    "red_black_tree": (_BINARY, "one"),
+    "segment_tree": (_BINARY, "one"),
+    "nary_tree": (("children",), "list"),
+    "trie": (("children",), "map"),
+}
+
+
+def flatten(scene: Any):
+    """``(top, rows)`` for a list / tree scene with node ids, else ``None``."""
+    if type(scene) is not dict:
+        return None
+    kind = scene.get("type")
+    spec = LINKS.get(kind)
+    if spec is None:
+        return None
+    top = dict(scene)
+    rows: dict[int, dict] = {}
+    if kind in LIST_TYPES:
+        if "nodes" not in scene:
+            return None
+        for node in scene["nodes"]:
+            row = dict(node)
+            rows[row.pop("id")] = row
+        top["nodes"] = list(rows)
+        return top, rows
+
+    if "root" not in scene:           # error scene
+        return None
+    fields, shape = spec
+    stack: list = []
+
+    def ref(v):
+        if type(v) is dict and "id" in v:
+            stack.append(v)
+            return v["id"]
+        return v                      # None or a marker
+
+    top["root"] = ref(scene["root"])
+    while stack:
+        row = dict(stack.pop())
+        nid = row.pop("id")
+        for f in fields:
+            v = row[f]
+            if shape == "one":
+                row[f] = ref(v)
+            elif shape == "list":
+                row[f] = [ref(c) for c in v]
+            else:
+                row[f] = {k: ref(c) for k, c in v.items()}
+        rows[nid] = row
+    return top, rows
+
+
+def unflatten(top: dict, rows: dict) -> dict:
+    """Rebuild the scene :func:`flatten` took apart."""
+    scene = dict(top)
+    kind = top["type"]
+    if kind in LIST_TYPES:
+        scene["nodes"] = [{"id": nid, **rows[nid]} for nid in top["nodes"]]
+        return scene
+    fields, shape = LINKS[kind]
+    stack = []
+    if type(top["root"]) is int:
+        stack.append((scene, "root", top["root"]))
+    while stack:
+        container, key, nid = stack.pop()
+        out = container[key] = {"id": nid, **rows[nid]}
+        for f in fields:
+            v = out[f]
+            if shape == "one":
+                if type(v) is int:
+                    stack.append((out, f, v))
+                continue
+            v = out[f] = list(v) if shape == "list" else dict(v)
+            keys = range(len(v)) if shape == "list" else list(v)
+            stack.extend((v, k, v[k]) for k in keys if type(v[k]) is int)
+    return scene
+
+
+def diff(old, new) -> dict:
+    """Patch taking flattened ``old`` to flattened ``new`` (same scene type)."""
+    old_top, old_rows = old
+    new_top, new_rows = new
+    links = LINKS[new_top["type"]][0]
+    patch: dict = {}
+    if old_top != new_top:
+        patch["top"] = new_top
+    add: dict = {}
+    link: dict = {}
+    value: dict = {}
+    for nid, row in new_rows.items():
+        prev = old_rows.get(nid)
+        if prev == row:
+            continue
+        if prev is None or prev.keys() != row.keys():
+            add[str(nid)] = row
+            continue
+        for f, v in row.items():
+            if prev[f] != v:
+                (link if f in links else value).setdefault(str(nid), {})[f] = v
+    removed = [nid for nid in old_rows if nid not in new_rows]
+    if add:
+        patch["add"] = add
+    if removed:
+        patch["remove"] = removed
+    if link:
+        patch["link"] = link
+    if value:
+        patch["value"] = value
+    return patch
+
+
+def apply(old, patch: dict):
+    """Flattened scene after ``patch`` (``old`` is not modified)."""
+    top, rows = old
+    rows = dict(rows)
+    for nid in patch.get("remove", ()):
+        rows.pop(nid, None)
+    for nid, row in patch.get("add", {}).items():
+        rows[int(nid)] = row
+    for part in ("link", "value"):
+        for nid, fields in patch.get(part, {}).items():
+            nid = int(nid)
+            rows[nid] = {**rows[nid], **fields}
+    return patch.get("top", top), rows
+
+
+def touched(patch: dict) -> int:
+    """Rows a patch re-sends in full or in part."""
+    return (len(patch.get("add", ())) + len(patch.get("remove", ()))
+            + len(patch.get("link", ())) + len(patch.get("value", ())))
@@ -0,0 +1,194 @@
+"""Optional per-phase timing of the trace pipeline.
+
+``run_code(..., perf=True)`` times each phase and puts the result under
+``meta.perf``:
+
+* request phases, once per run: ``safety``, ``analyze``, ``compile`` (parse,
+  line table, ``compile()``), ``exec`` (the traced program, hook included),
+  ``promote``, ``encode`` (step-format encoding / step-store finalization);
+* tracer phases, once per call inside ``Tracer.__call__``: ``locals`` (the
+  whole locals snapshot), within it ``detect`` (``detect_type``) and
+  ``serialize`` (``build_scene`` and the step heap); ``semantic`` (highlight
+  + event diffing), ``scope`` (loop metadata, branch outcomes),
+  ``call_stack`` (frame entry on call) and ``emit`` (hand-off to the sink /
+  store);
+* ``respond``, added by the worker once the response body is encoded
+  (``worker.pool.encode``).
+
+Phases nest (``detect`` is inside ``locals``, which is inside ``exec``), so
+totals are wall time per phase, not a partition. Each phase reports its call
+count, total and max, and a histogram of call durations in power-of-two
+microsecond buckets::
+
+    "perf": {"total_ms": 41.2, "events": 812,
+             "phases": {"detect": {"count": 2436, "total_ms": 3.1, "max_us": 88.0,
+                                   "hist": {"le_us": [1, 2, 4, ...],
+                                            "counts": [1500, 800, 120, ...]}},
+                        ...}}
+
+Disabled (the default) costs nothing: the tracer looks its phase functions up
+through the instance, and :func:`instrument` only swaps in timing wrappers on
+a tracer that was asked for them -- an untimed run executes exactly the code
+it did before.
+
+:class:`PerfAggregate` merges per-request reports (``AGGREGATE`` is the
+process-wide one the worker exposes).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_BUCKETS = 24                         # 1 us .. ~8 s, then overflow
+_NULL = nullcontext()
+
+# Tracer phase -> attributes wrapped by instrument() (see engine.runner.Tracer).
+TRACER_PHASES = {
+    "locals": ("_serialize_locals",),
+    "detect": ("_detect",),
+    "serialize": ("_build_scene", "_heap_scene"),
+    "semantic": ("_changed_vars", "_build_events"),
+    "scope": ("_eval_branch",),
+    "call_stack": ("_push_frame",),
+    "emit": ("_emit",),
+}
+
+
+def _bucket(ns: int) -> int:
+    # ns >> 10 ~ microseconds; bucket k holds [2**(k-1), 2**k) us.
+    return min((ns >> 10).bit_length(), _BUCKETS)
+
+
+class _Phase:
+    __slots__ = ("count", "total_ns", "max_ns", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.hist = [0] * (_BUCKETS + 1)
+
+    def add(self, ns: int) -> None:
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self.hist[_bucket(ns)] += 1
+
+    def report(self) -> dict:
+        last = max((k for k, n in enumerate(self.hist) if n), default=0)
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ns / 1e6, 3),
+            "max_us": round(self.max_ns / 1e3, 1),
+            "hist": {"le_us": [1 << k for k in range(last + 1)],
+                     "counts": self.hist[:last + 1]},
+        }
+
+
+class PhaseTimer:
+    """Per-run phase timings (see module doc)."""
+
+    def __init__(self):
+        self.phases: dict = {}
+        self.events = 0
+        self._start = time.perf_counter_ns()
+
+    def add(self, name: str, ns: int) -> None:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase()
+        phase.add(ns)
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - t0)
+
+    def wrap(self, name: str, fn):
+        clock, add = time.perf_counter_ns, self.add
+
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                add(name, clock() - t0)
+        return timed
+
+    def report(self) -> dict:
+        return {"total_ms": round((time.perf_counter_ns() - self._start) / 1e6, 3),
+                "events": self.events,
+                "phases": {name: p.report() for name, p in self.phases.items()}}
+
+
+def add_phase(report: dict, name: str, ns: int) -> None:
+    """Add a phase timed outside the run (e.g. response encoding) to a report."""
+    p = _Phase()
+    p.add(ns)
+    report.setdefault("phases", {})[name] = p.report()
+
+
+def phase(timer: PhaseTimer | None, name: str):
+    """``timer.phase(name)``, or a no-op context when timing is off."""
+    return _NULL if timer is None else timer.phase(name)
+
+
+def instrument(tracer, timer: PhaseTimer) -> None:
+    """Time ``tracer``'s phases into ``timer`` by wrapping them on the instance."""
+    for name, attrs in TRACER_PHASES.items():
+        for attr in attrs:
+            setattr(tracer, attr, timer.wrap(name, getattr(tracer, attr)))
+    tracer.loops.visit = timer.wrap("scope", tracer.loops.visit)
+
+
+class PerfAggregate:
+    """Thread-safe running totals of :meth:`PhaseTimer.report` dicts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_ms = 0.0
+        self.phases: dict = {}
+
+    def merge(self, report: dict | None) -> None:
+        if not report:
+            return
+        with self._lock:
+            self.requests += 1
+            self.total_ms += report.get("total_ms", 0.0)
+            for name, p in report.get("phases", {}).items():
+                agg = self.phases.get(name)
+                if agg is None:
+                    agg = self.phases[name] = {"count": 0, "total_ms": 0.0,
+                                               "max_us": 0.0, "hist": [0] * (_BUCKETS + 1)}
+                agg["count"] += p["count"]
+                agg["total_ms"] += p["total_ms"]
+                agg["max_us"] = max(agg["max_us"], p["max_us"])
+                for k, n in enumerate(p["hist"]["counts"]):
+                    agg["hist"][k] += n
+
+    def stats(self) -> dict:
+        with self._lock:
+            phases = {}
+            for name, agg in self.phases.items():
+                last = max((k for k, n in enumerate(agg["hist"]) if n), default=0)
+                phases[name] = {
+                    "count": agg["count"],
+                    "total_ms": round(agg["total_ms"], 3),
+                    "mean_us": round(agg["total_ms"] * 1e3 / agg["count"], 2)
+                    if agg["count"] else 0.0,
+                    "max_us": agg["max_us"],
+                    "hist": {"le_us": [1 << k for k in range(last + 1)],
+                             "counts": agg["hist"][:last + 1]},
+                }
+            return {"requests": self.requests, "total_ms": round(self.total_ms, 3),
+                    "phases": phases}
+
+
+AGGREGATE = PerfAggregate()
@@ -33,15 +33,22 @@ def _sig():
     return {"append": 0, "pop_end": 0, "pop_front": 0, "heap": 0, "self_index": 0}
 
 
-def promote(steps: list) -> None:
-    """Mutate ``steps`` in place: relabel list-like vars by access pattern."""
-    usage: dict[str, dict] = {}
+class UsageStats:
+    """Per-variable access counts, fed one step at a time.
 
-    def bump(name, key):
-        usage.setdefault(name, _sig())[key] += 1
+    :func:`promote` drives it over a finished trace; the streaming path feeds it
+    as steps are emitted and ships :meth:`roles` in the final meta record.
+    """
 
-    for s in steps:
-        code = s.get("code", "") or ""
+    def __init__(self):
+        self.usage: dict[str, dict] = {}
+
+    def _bump(self, name, key):
+        self.usage.setdefault(name, _sig())[key] += 1
+
+    def observe(self, step: dict) -> None:
+        code = step.get("code", "") or ""
+        bump = self._bump
         for m in _APPEND.finditer(code): bump(m.group(1), "append")
         for m in _ADD.finditer(code): bump(m.group(1), "append")
         for m in _POPLEFT.finditer(code): bump(m.group(1), "pop_front")
@@ -51,24 +58,39 @@ def promote(steps: list) -> None:
         for m in _HEAPPOP.finditer(code): bump(m.group(1), "heap")
         for m in _SELF_INDEX.finditer(code): bump(m.group(1), "self_index")
 
-    role: dict[str, str] = {}
-    for name, u in usage.items():
-        if u["heap"]:
-            role[name] = "heap"
-        elif u["append"] and u["pop_front"]:
-            role[name] = "queue"
-        elif u["append"] and u["pop_end"]:
-            role[name] = "stack"
-        elif u["self_index"]:
-            role[name] = "dsu"
+    def roles(self) -> dict[str, str]:
+        role: dict[str, str] = {}
+        for name, u in self.usage.items():
+            if u["heap"]:
+                role[name] = "heap"
+            elif u["append"] and u["pop_front"]:
+                role[name] = "queue"
+            elif u["append"] and u["pop_end"]:
+                role[name] = "stack"
+            elif u["self_index"]:
+                role[name] = "dsu"
+        return role
 
-    if not role:
-        return
 
-    # Relabel across every step, but only when the current tag is generic
-    # list-like (never override a detected linked_list / tree / graph).
+def relabel(steps, role: dict[str, str]) -> None:
+    """Rewrite ``var_types`` (and delta-encoded ``locals_delta.types``) in place,
+    but only when the current tag is generic list-like (never override a
+    detected linked_list / tree / graph)."""
     for s in steps:
-        vt = s.get("var_types", {})
-        for name, r in role.items():
-            if name in vt and vt[name] in LISTLIKE:
-                vt[name] = r
+        for vt in (s.get("var_types"), s.get("locals_delta", {}).get("types")):
+            if not vt:
+                continue
+            for name, r in role.items():
+                if name in vt and vt[name] in LISTLIKE:
+                    vt[name] = r
+
+
+def promote(steps: list) -> None:
+    """Mutate ``steps`` in place: relabel list-like vars by access pattern."""
+    stats = UsageStats()
+    for s in steps:
+        stats.observe(s)
+    role = stats.roles()
+    if not role:
+        return
+    relabel(steps, role)
@@ -0,0 +1,77 @@
+"""Compact in-tracer step records.
+
+The public step is a 14-17 key dict. Built inside the trace callback for every
+line, that dict is the largest single allocation per step (~460 bytes before
+its values), and an in-memory trace keeps every one of them alive until the
+envelope is built. :class:`StepRecord` holds the same fields in ``__slots__``
+(~170 bytes, no per-instance ``__dict__``); the optional ``loop_meta`` /
+``branch_taken`` / ``return_value`` fields, and the usually empty
+``highlight_vars`` / ``semantic`` lists, cost nothing when absent.
+
+Records never leave the engine: :meth:`StepRecord.as_dict` produces the
+public shape (same keys, same order) when a step is emitted -- handed to a
+streaming sink, or once tracing has finished for an in-memory trace.
+"""
+
+from __future__ import annotations
+
+_MISSING = object()
+
+_OPTIONAL = ("loop_meta", "branch_taken", "return_value")
+
+
+class StepRecord:
+    __slots__ = ("i", "event", "line", "function", "code", "locals", "var_types",
+                 "highlight_vars", "scope", "depth", "call_id", "parent_id",
+                 "semantic", "call_stack") + _OPTIONAL
+
+    def __init__(self, i, event, line, function, code, locals, var_types,
+                 highlight_vars, scope, depth, call_id, parent_id, semantic,
+                 call_stack):
+        self.i = i
+        self.event = event
+        self.line = line
+        self.function = function
+        self.code = code
+        self.locals = locals
+        self.var_types = var_types
+        self.highlight_vars = highlight_vars or None     # most steps: nothing
+        self.scope = scope
+        self.depth = depth
+        self.call_id = call_id
+        self.parent_id = parent_id
+        self.semantic = semantic or None
+        self.call_stack = call_stack
+        self.loop_meta = self.branch_taken = self.return_value = _MISSING
+
+    def as_dict(self) -> dict:
+        """The public step dict (see :mod:`engine.runner`)."""
+        step = {
+            "i": self.i,
+            "event": self.event,
+            "line": self.line,
+            "function": self.function,
+            "code": self.code,
+            "locals": self.locals,
+            "var_types": self.var_types,
+            "highlight_vars": self.highlight_vars or [],
+            "scope": self.scope,
+            "depth": self.depth,
+            "call_id": self.call_id,
+            "parent_id": self.parent_id,
+            "semantic": self.semantic or [],
+            "call_stack": self.call_stack,
+        }
+        for name in _OPTIONAL:
+            value = getattr(self, name)
+            if value is not _MISSING:
+                step[name] = value
+        return step
+
+
+def materialize(records: list) -> list:
+    """Convert ``records`` to public dicts **in place** (each record is freed as
+    its dict replaces it, so the two never coexist for the whole trace)."""
+    for k, rec in enumerate(records):
+        records[k] = rec.as_dict()
+    return records
@@ -6,9 +6,15 @@ Design notes
   re-entrant and easy to unit test.
 * ``call_id`` / ``parent_id`` are assigned on every function call so the
   frontend can reconstruct the recursion tree directly from the step stream.
+* ``call_stack`` comes from a shadow stack maintained on call/return (args
+  serialized once on entry), never from walking ``f_back`` per step.
 * Hard ``max_steps`` / ``max_seconds`` caps guarantee we never blow up on
   N-Queens-sized runs or infinite loops; when a cap is hit we ABORT execution
-  (not just recording) and mark the trace ``truncated``.
+  (not just recording) and mark the trace ``truncated`` -- and
+  ``timed_out`` when it was the clock. With ``fast_forward=True`` the step
+  cap only ends *recording*: the tracer hands over to a counting hook
+  (:class:`_FastForward`) and the program finishes unrecorded, still under
+  ``max_seconds``.
 * ``stdin`` is fed via an in-memory buffer so input()-based solutions run.
 """
 
@@ -19,25 +25,79 @@ import io
 import linecache
 import sys
 import time
+from collections import deque
 from dataclasses import dataclass, field
 from typing import Any
 
+from . import backends as backends_mod
+from . import delta as delta_mod
+from . import hashcons
+from . import perf as perf_mod
+from .record import StepRecord, materialize
 from . import promote as promote_mod
 from . import scope as scope_mod
 from . import semantic as sem
 from . import serialize as ser
+from . import viewport as viewport_mod
 from .analyze import analyze_source
-from .detectors import detect_type
+from . import heap as heap_mod
+from .heap import StepHeap
+from .detectors import Plans, detect_type
+from .lines import LineInfo, build_line_table
+from .nodeids import NodeIds
+from .scene_cache import SceneCache
 from .safety import UnsafeCodeError, check_code
+from .store import StepStore
 
 DEFAULT_MAX_STEPS = 5000
 DEFAULT_MAX_SECONDS = 8.0
+FF_CHECK_EVERY = 256          # fast-forward events between clock checks
+
+_SCALAR_TYPES = frozenset({int, float, str, bool, type(None)})
+_CONTAINER_TYPES = frozenset({list, tuple, dict, set, frozenset, deque})
 
 
 class _Abort(Exception):
     """Internal signal to stop execution when a limit is hit (not a user error)."""
 
 
+class _OutOfTime(BaseException):
+    """Raised by :class:`_FastForward` at the deadline. A ``BaseException`` so
+    that the user's own ``except Exception:`` blocks cannot swallow it."""
+
+
+class _FastForward:
+    """Trace hook once the step cap is reached: records nothing, counts the
+    user-code events and checks the clock every :data:`FF_CHECK_EVERY` of them.
+
+    It stays installed local to every user frame (``line`` events included),
+    so a loop that makes no calls still reaches a check. A bare ``except:``
+    that swallows :class:`_OutOfTime` ends the checks -- a raising trace
+    function is switched off by the interpreter -- and leaves the run to the
+    pool's hard job timeout.
+    """
+
+    __slots__ = ("deadline", "events", "timed_out", "_countdown")
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline          # time.monotonic() value
+        self.events = 0
+        self.timed_out = False
+        self._countdown = FF_CHECK_EVERY
+
+    def __call__(self, frame, event, arg):
+        if frame.f_code.co_filename != "<user-code>":
+            return None
+        self.events += 1
+        self._countdown -= 1
+        if not self._countdown:
+            self._countdown = FF_CHECK_EVERY
+            if time.monotonic() > self.deadline:
+                self.timed_out = True
+                raise _OutOfTime
+        return self
+
+
 @dataclass
 class Trace:
     meta: dict
@@ -50,18 +110,22 @@ class Trace:
 # --------------------------------------------------------------------------- #
 # Scene building: detected type -> renderer-ready JSON
 # --------------------------------------------------------------------------- #
-def build_scene(val: Any, vtype: str, name: str = "") -> Any:
+def build_scene(val: Any, vtype: str, name: str = "", focus=(),
+                viewport: bool = True, ids: NodeIds | None = None) -> Any:
+    """Renderer-ready JSON for ``val``. With ``viewport`` on, large arrays /
+    matrices / dicts / graphs are windowed around ``focus`` (see
+    :mod:`engine.viewport`). List and tree nodes take their ids from ``ids``
+    (see :mod:`engine.nodeids`)."""
     try:
+        if viewport and viewport_mod.is_large(val):
+            scene = _windowed_scene(val, vtype, focus)
+            if scene is not None:
+                return scene
         if vtype in ("linked_list", "doubly_linked_list"):
-            return ser.serialize_linked_list(val)
-        if vtype in ("binary_tree", "avl_tree", "red_black_tree"):
-            return {"type": vtype, "root": ser.serialize_tree(val, vtype)}
-        if vtype == "segment_tree":
-            return {"type": vtype, "root": ser.serialize_segment_tree(val)}
-        if vtype == "nary_tree":
-            return {"type": vtype, "root": ser.serialize_nary_tree(val)}
-        if vtype == "trie":
-            return {"type": vtype, "root": ser.serialize_trie(val)}
+            return ser.serialize_linked_list(val, ids)
+        if vtype in ("binary_tree", "avl_tree", "red_black_tree", "segment_tree",
+                     "nary_tree", "trie"):
+            return ser.tree_scene(val, vtype, ids=ids)
         if vtype in ("graph_adjacency_list", "graph_weighted"):
             return {"type": vtype, "adjacency": ser.json_safe(val)}
         if vtype in ("stack", "queue", "deque", "heap", "dp_array"):
@@ -81,6 +145,27 @@ def build_scene(val: Any, vtype: str, name: str = "") -> Any:
         return {"type": vtype, "error": str(exc)[:120]}
 
 
+def _windowed_scene(val: Any, vtype: str, focus) -> Any:
+    if vtype in ("matrix", "dp_grid"):
+        capped = viewport_mod.cap_matrix(val, focus)
+        return capped and {"type": vtype, **capped}
+    if vtype in ("graph_adjacency_list", "graph_weighted"):
+        capped = viewport_mod.cap_mapping(val, focus)
+        return capped and {"type": vtype, "adjacency": capped, "num_nodes": len(val)}
+    if vtype == "object" and isinstance(val, dict):
+        capped = viewport_mod.cap_mapping(val, focus)
+        return capped and {"type": "object", "cls": "dict", "fields": capped,
+                           "num_entries": len(val)}
+    if vtype in ("array", "stack", "queue", "deque", "heap", "dp_array", "set", "dsu"):
+        capped = viewport_mod.cap_sequence(val, () if vtype == "set" else focus)
+        if capped is None:
+            return None
+        if vtype == "dsu":
+            capped["parent"] = capped.pop("values")
+        return {"type": vtype, **capped}
+    return None
+
+
 def executable_lines(code: str) -> set:
     """Line numbers that count as real execution (skip defs/imports/docstrings)."""
     try:
@@ -102,63 +187,139 @@ def executable_lines(code: str) -> set:
 
 
 class Tracer:
+    # Phase functions are looked up through the instance so engine.perf can
+    # wrap them with timers on a tracer that asked for it (see perf.instrument).
+    _detect = staticmethod(detect_type)
+    _build_scene = staticmethod(build_scene)
+    _heap_scene = staticmethod(StepHeap.scene)
+    _changed_vars = staticmethod(sem.changed_vars)
+    _build_events = staticmethod(sem.build_events)
+    _eval_branch = staticmethod(scope_mod.eval_branch)
+
     def __init__(self, code: str, max_steps: int = DEFAULT_MAX_STEPS,
-                 max_seconds: float = DEFAULT_MAX_SECONDS):
+                 max_seconds: float = DEFAULT_MAX_SECONDS, sink=None,
+                 lines: list | None = None, on_cap=None, viewport: bool = False):
         self.code = code
         self.code_lines = code.splitlines()
+        self.lines = lines if lines is not None else build_line_table(code)
         self.max_steps = max_steps
         self.max_seconds = max_seconds
         self.start_time = time.monotonic()
 
-        self.steps = []
+        self.steps = []                       # StepRecords (see engine.record)
+        self.num_steps = 0
+        self.events = 0                       # hook events seen in user code
+        self.on_cap = on_cap                  # step cap: detach instead of abort
+        self.sink = sink                      # if set, steps are handed off, not kept
         self.depth = 0
         self.call_counter = 0
         self.call_stack = []                  # stack of call_ids
+        self.frames = []                      # shadow call stack (see _push_frame)
         self.prev_locals_by_call = {}
+        self.prev_line_by_call = {}
+        self.loops = scope_mod.LoopTracker()
+        self.scene_cache = SceneCache()
+        self.interner = hashcons.SceneInterner()
+        self.class_plans = Plans()            # detect_type's per-class decisions
+        self.node_ids = NodeIds()             # stable list / tree node ids
+        self.node_rows = {}                   # list nodes of the last step (engine.heap)
+        self.viewport = viewport
         self.main_lines = executable_lines(code)
         self.start_at = min(self.main_lines) if self.main_lines else 1
         self.tracing = False
         self.truncated = False
+        self.timed_out = False                # stopped by max_seconds, not max_steps
 
     # -- frame helpers ----------------------------------------------------- #
-    def _line_text(self, frame) -> str:
-        text = linecache.getline(frame.f_code.co_filename, frame.f_lineno).strip()
-        if not text and 0 <= frame.f_lineno - 1 < len(self.code_lines):
-            text = self.code_lines[frame.f_lineno - 1].strip()
-        return text
-
-    def _call_stack(self, frame):
-        stack, curr = [], frame
-        while curr:
-            name = curr.f_code.co_name
-            if name in ("<module>", "_run", "exec"):
-                curr = curr.f_back
-                continue
-            argc = curr.f_code.co_argcount
-            arg_names = curr.f_code.co_varnames[:argc]
-            args = {n: ser.json_safe(curr.f_locals[n])
-                    for n in arg_names
-                    if n in curr.f_locals and not callable(curr.f_locals[n])}
-            stack.append({"function": name, "args": args})
-            curr = curr.f_back
-        stack.reverse()
-        return stack
-
-    def _serialize_locals(self, frame):
+    def _line_info(self, lineno: int) -> LineInfo:
+        if 0 < lineno < len(self.lines):
+            return self.lines[lineno]
+        return LineInfo(text="")
+
+    def _push_frame(self, frame) -> None:
+        """Enter a call on the shadow stack; its args are serialized once, here.
+
+        The stack is copy-on-write: steps keep a reference to the list that was
+        current when they were recorded, so consecutive steps of one call share
+        a single snapshot and nothing is rebuilt per line.
+        """
+        code = frame.f_code
+        f_locals = frame.f_locals
+        args = {n: ser.json_safe(f_locals[n])
+                for n in code.co_varnames[:code.co_argcount]
+                if n in f_locals and not callable(f_locals[n])}
+        entry = self.interner.intern({"function": code.co_name, "args": args})
+        self.frames = self.frames + [entry]
+
+    def _pop_frame(self) -> None:
+        self.frames = self.frames[:-1]
+
+    def _serialize_locals(self, f_locals, call_id, frame=None, infos=()):
         import types as _types
-        clean = {k: v for k, v in frame.f_locals.items()
+        clean = {k: v for k, v in f_locals.items()
                  if not k.startswith("__") and not k.startswith(".")
                  and k != "fromlist" and not callable(v)
                  # imported modules (heapq, math, ...) are machinery, not the
                  # user's data -- never show them as variables
                  and not isinstance(v, _types.ModuleType)}
         scenes, types = {}, {}
+        cache = self.scene_cache
+        pointers = heap = None
         for name, val in clean.items():
-            vtype = detect_type(val, name)
+            if type(val) in _SCALAR_TYPES:
+                vtype = self._detect(val, name, self.class_plans)
+                scene = self._build_scene(val, vtype, name)
+            elif self.viewport and viewport_mod.is_large(val):
+                # Windowed scenes follow writes and pointers, so they are
+                # rebuilt every step (cheap: only the window is serialized).
+                if pointers is None:
+                    pointers = [v for v in clean.values() if type(v) in (int, str)]
+                vtype = self._detect(val, name, self.class_plans)
+                focus = pointers
+                if frame is not None:
+                    focus = viewport_mod.write_focus(
+                        name, infos, f_locals, frame.f_globals) + pointers
+                scene = self.interner.intern(
+                    self._build_scene(val, vtype, name, focus, ids=self.node_ids))
+            else:
+                vtype = scene = None
+                if type(val) not in _CONTAINER_TYPES:
+                    # A node of a list / tree: served from this step's heap
+                    # when another local already reached it.
+                    if heap is None:
+                        heap = StepHeap(self.node_ids, self.interner, self.node_rows)
+                    vtype = self._detect(val, name, self.class_plans)
+                    scene = self._heap_scene(heap, val, vtype)
+                if scene is None:
+                    # Unchanged since this call's previous step -> reuse the scene.
+                    cached, scene, sig = cache.lookup(call_id, name, val)
+                    if cached is None:
+                        if vtype is None:
+                            vtype = self._detect(val, name, self.class_plans)
+                        scene = self.interner.intern(
+                            self._build_scene(val, vtype, name, viewport=self.viewport,
+                                              ids=self.node_ids))
+                        cache.store(call_id, name, val, sig, vtype, scene)
+                    else:
+                        vtype = cached
+                    if heap is not None:
+                        heap.record(vtype, scene)
             types[name] = vtype
-            scenes[name] = build_scene(val, vtype, name)
+            scenes[name] = scene
+        if heap is not None and heap.rows:
+            self.node_rows = heap.rows
         return scenes, types
 
+    def _emit(self, step: StepRecord) -> None:
+        self.num_steps += 1
+        if self.sink is None:
+            self.steps.append(step)
+            return
+        t0 = time.monotonic()
+        self.sink(step.as_dict())
+        # A slow consumer must not eat into the program's time budget.
+        self.start_time += time.monotonic() - t0
+
     # -- the trace callback ------------------------------------------------ #
     def __call__(self, frame, event, arg):
         if event not in ("call", "line", "return"):
@@ -169,17 +330,25 @@ class Tracer:
         # ...) as if they were the user's variables. Library calls stay opaque.
         if frame.f_code.co_filename != "<user-code>":
             return None
+        self.events += 1
         # Hard limits: stop EXECUTION (not just recording) so infinite loops and
-        # runaway recursion cannot hang the worker.
-        if len(self.steps) >= self.max_steps:
+        # runaway recursion cannot hang the worker -- unless fast-forward asked
+        # for the step cap to hand the program back to full-speed execution.
+        if self.num_steps >= self.max_steps:
             self.truncated = True
+            if self.on_cap is not None:
+                return self.on_cap(frame)
             raise _Abort
         if time.monotonic() - self.start_time > self.max_seconds:
             self.truncated = True
+            self.timed_out = True
             raise _Abort
 
-        # Skip the harness module lines before user code begins.
-        if frame.f_code.co_name == "<module>" and frame.f_lineno < self.start_at:
+        # Skip the harness module lines before user code begins. Entering the
+        # module frame itself is never a step (settrace reports it at line 0,
+        # sys.monitoring may report the first line).
+        if frame.f_code.co_name == "<module>" and \
+                (event == "call" or frame.f_lineno < self.start_at):
             return self
         if not self.tracing and frame.f_lineno not in self.main_lines \
                 and frame.f_code.co_name == "<module>":
@@ -194,97 +363,217 @@ class Tracer:
             parent_id = self.call_stack[-1] if self.call_stack else None
             call_id = self.call_counter
             self.call_stack.append(call_id)
+            self._push_frame(frame)
             self.depth += 1
 
-        code_line = self._line_text(frame)
-        scenes, types = self._serialize_locals(frame)
+        lineno = frame.f_lineno
+        info = self._line_info(lineno)
+        code_line = info.text
+        f_locals = frame.f_locals             # one snapshot per event
+        prev_lineno = self.prev_line_by_call.get(call_id)
+        ran = None if prev_lineno is None else self._line_info(prev_lineno)
+        infos = (info,) if ran is None else (ran, info)
+        self.scene_cache.begin(call_id, ran, f_locals, frame.f_globals)
+        scenes, types = self._serialize_locals(f_locals, call_id, frame, infos)
 
         prev = self.prev_locals_by_call.get(call_id, {})
-        highlight = sem.changed_vars(prev, scenes)
-        events = sem.build_events(code_line, prev, scenes, event,
-                                  frame.f_code.co_name)
-
-        st = scope_mod.scope_type(event, code_line)
-        step = {
-            "i": len(self.steps),
-            "event": event,
-            "line": frame.f_lineno,
-            "function": frame.f_code.co_name,
-            "code": code_line,
-            "locals": scenes,
-            "var_types": types,
-            "highlight_vars": highlight,
-            "scope": st,
-            "depth": self.depth,
-            "call_id": call_id,
-            "parent_id": parent_id,
-            "semantic": events,
-            "call_stack": self._call_stack(frame),
-        }
+        highlight = self._changed_vars(prev, scenes)
+        events = self._build_events(code_line, prev, scenes, event,
+                                  frame.f_code.co_name, tag=info.tag)
+
+        st = "function" if event == "call" else info.scope
+        step = StepRecord(self.num_steps, event, lineno, frame.f_code.co_name,
+                          code_line, scenes, types, highlight, st, self.depth,
+                          call_id, parent_id, events, self.frames)
         if st == "loop":
-            step["loop_meta"] = scope_mod.loop_meta(code_line, frame.f_locals, frame.f_globals)
+            step.loop_meta = self.loops.visit(
+                call_id, lineno, prev_lineno, info.loop,
+                info.loop_end, f_locals, frame.f_globals, advance=event == "line")
         if st == "conditional":
-            step["branch_taken"] = scope_mod.branch_taken(
-                code_line, frame.f_locals, frame.f_globals)
+            step.branch_taken = self._eval_branch(
+                info.cond, f_locals, frame.f_globals)
         # Capture the returned value (settrace passes it as `arg` on return) so
         # the recursion tree can show values bubbling up to the parent call.
         if event == "return":
             try:
-                step["return_value"] = ser.json_safe(arg)
+                step.return_value = ser.json_safe(arg)
             except Exception:
                 pass
 
-        self.steps.append(step)
+        self._emit(step)
         self.prev_locals_by_call[call_id] = scenes
+        self.prev_line_by_call[call_id] = lineno
 
         if event == "return":
             self.depth = max(0, self.depth - 1)
             if self.call_stack:
                 self.call_stack.pop()
+                self._pop_frame()
+            # Everything keyed by this call dies with it: a program making 50k
+            # calls must not keep 50k sets of scenes alive.
+            self.scene_cache.drop_call(call_id)
+            self.loops.drop_call(call_id)
+            self.prev_line_by_call.pop(call_id, None)
+            self.prev_locals_by_call.pop(call_id, None)
 
         return self
 
+    def final_state(self, f_locals) -> dict:
+        """Scenes for the module-level variables once the program has finished."""
+        self.scene_cache.begin(0, None, f_locals, {})
+        scenes, types = self._serialize_locals(f_locals, 0)
+        return {"locals": scenes, "var_types": types}
+
 
 def run_code(code: str, max_steps: int = DEFAULT_MAX_STEPS,
-             max_seconds: float = DEFAULT_MAX_SECONDS, stdin: str = "") -> dict:
+             max_seconds: float = DEFAULT_MAX_SECONDS, stdin: str = "",
+             step_format: str = delta_mod.FORMAT_FULL,
+             keyframe_every: int = delta_mod.DEFAULT_KEYFRAME_EVERY,
+             backend: str = backends_mod.SETTRACE, on_step=None,
+             fast_forward: bool = False, memory_budget: int | None = None,
+             viewport: bool = False, perf: bool = False) -> dict:
     """Public entry point: returns a normalized Trace envelope as a dict.
 
     ``stdin`` is fed to the program as if typed at the terminal, so solutions
     that call ``input()`` / read ``sys.stdin`` work (Codeforces-style). It is an
     in-memory buffer, never the real terminal.
+
+    ``step_format="delta"`` ships only changed locals per step with a full
+    keyframe every ``keyframe_every`` steps (see :mod:`engine.delta`);
+    ``"shared"`` ships each distinct scene once and refers back to it by
+    number (see :mod:`engine.hashcons`); ``"heap"`` makes list / tree locals
+    pointers into a per-step table of their nodes (see :mod:`engine.heap`).
+
+    ``backend`` selects the interpreter hook: ``"settrace"``, ``"monitoring"``
+    (PEP 669, Python 3.12+) or ``"auto"``; unavailable backends fall back to
+    settrace (see :mod:`engine.backends`).
+
+    ``on_step`` switches to streaming: each step is passed to it as soon as it
+    is recorded (already delta-encoded if requested) and the returned envelope
+    has no steps. Access-pattern promotion cannot rewrite steps that are
+    already gone, so ``meta.var_roles`` carries the relabel table instead (see
+    :func:`engine.promote.relabel`).
+
+    ``fast_forward=True`` changes what the step cap does: instead of killing
+    the program, recording stops and the program runs to completion under a
+    hook that only counts events and checks ``max_seconds``. ``output`` and
+    ``error`` then cover the whole run, ``meta.final_state`` holds the final
+    module-level variables in the usual scene format, and
+    ``meta.fast_forward`` reports ``at_step``, ``events`` (call / line /
+    return events in user code over the whole run, recorded and
+    fast-forwarded alike), ``seconds`` spent after the cap and ``timed_out``.
+
+    ``memory_budget`` (bytes) records into a :class:`~engine.store.StepStore`
+    instead of a list: steps are kept JSON-encoded, spilled to a temp file past
+    the budget, and the envelope's ``steps`` is that store (a lazy read-only
+    sequence). Encode such an envelope with :func:`engine.store.encode_json`.
+
+    ``viewport=True`` windows the scenes of large arrays, matrices, dicts and
+    graphs around recent writes and index pointers, with elision markers and
+    the true size (see :mod:`engine.viewport`). It changes the scene shape a
+    renderer must understand, so it is opt-in; off ships every element on
+    every step.
+
+    ``perf=True`` times every pipeline and tracer phase and reports it under
+    ``meta.perf`` (see :mod:`engine.perf`); off costs nothing.
     """
+    if step_format not in delta_mod.STEP_FORMATS:
+        raise ValueError("unknown step_format: " + repr(step_format))
+    timer = perf_mod.PhaseTimer() if perf else None
+    with perf_mod.phase(timer, "analyze"):
+        analysis = analyze_source(code)
     meta = {
         "language": "python",
-        "analysis": analyze_source(code),
+        "analysis": analysis,
         "output": "",
         "error": None,
         "truncated": False,
+        "timed_out": False,
         "num_steps": 0,
+        "step_format": step_format,
+        "backend": backends_mod.resolve(backend),
     }
+    if step_format == delta_mod.FORMAT_DELTA:
+        meta["keyframe_every"] = max(1, int(keyframe_every))
 
     # Safety gate.
     try:
-        check_code(code)
+        with perf_mod.phase(timer, "safety"):
+            check_code(code)
     except UnsafeCodeError as exc:
         meta["error"] = str(exc)
+        meta["unsafe"] = True
+        if timer is not None:
+            meta["perf"] = timer.report()
         return Trace(meta=meta).as_dict()
 
-    tracer = Tracer(code, max_steps=max_steps, max_seconds=max_seconds)
+    usage = store = None
+    if on_step is None and memory_budget is not None:
+        store = StepStore(memory_budget)
+        on_step = store.append
+    if on_step is not None:
+        usage = promote_mod.UsageStats()
+        encoder = None
+        if step_format == delta_mod.FORMAT_DELTA:
+            encoder = delta_mod.DeltaEncoder(meta["keyframe_every"])
+        elif step_format == delta_mod.FORMAT_SHARED:
+            encoder = hashcons.SharedEncoder()
+        elif step_format == delta_mod.FORMAT_HEAP:
+            encoder = heap_mod.HeapEncoder()
+
+        def sink(step):
+            usage.observe(step)
+            on_step(encoder.encode(step) if encoder else step)
+    else:
+        sink = None
+
+    with perf_mod.phase(timer, "compile"):
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            tree = None
+        lines = build_line_table(code, tree)
+    tracer = Tracer(code, max_steps=max_steps, max_seconds=max_seconds, sink=sink,
+                    lines=lines, viewport=viewport)
+    if timer is not None:
+        perf_mod.instrument(tracer, timer)
     buffer = io.StringIO()
     old_stdout = sys.stdout
     old_stdin = sys.stdin
-    old_trace = sys.gettrace()
+    hook = backends_mod.make_backend(backend)
+    globals_dict = {"__name__": "__main__"}
+    fast = None
+    detached_at = None
+    exec_started = None
+
+    def detach(frame):
+        nonlocal fast, detached_at
+        tracer.on_cap = None
+        detached_at = time.monotonic()
+        fast = _FastForward(tracer.start_time + max_seconds)
+        hook.hand_over(fast, frame)
+        return fast
+
+    if fast_forward:
+        tracer.on_cap = detach
 
     try:
-        compiled = compile(code, "<user-code>", "exec")
+        with perf_mod.phase(timer, "compile"):
+            compiled = compile(code, "<user-code>", "exec")
         linecache.cache["<user-code>"] = (
             len(code), None, code.splitlines(True), "<user-code>")
         sys.stdout = buffer
         sys.stdin = io.StringIO(stdin)
-        globals_dict = {"__name__": "__main__"}
-        sys.settrace(tracer)
+        try:
+            hook.install(tracer, compiled)
+        except backends_mod.BackendUnavailable:
+            hook.uninstall()
+            hook = backends_mod.SettraceBackend()
+            hook.install(tracer, compiled)
+        meta["backend"] = hook.name
+        exec_started = time.perf_counter_ns()
         exec(compiled, globals_dict)
-    except _Abort:
+    except (_Abort, _OutOfTime):
         # Hit a step/time limit; partial trace is intentional, not an error.
         pass
     except Exception as exc:  # surface user runtime errors with line info
@@ -298,12 +587,48 @@ def run_code(code: str, max_steps: int = DEFAULT_MAX_STEPS,
         if lineno:
             meta["error_line"] = lineno
     finally:
-        sys.settrace(old_trace)
+        hook.uninstall()
         sys.stdout = old_stdout
         sys.stdin = old_stdin
+        if timer is not None and exec_started is not None:
+            timer.add("exec", time.perf_counter_ns() - exec_started)
 
     meta["output"] = buffer.getvalue()
-    promote_mod.promote(tracer.steps)  # access-pattern relabel (name-independent)
     meta["truncated"] = tracer.truncated
-    meta["num_steps"] = len(tracer.steps)
-    return Trace(meta=meta, steps=tracer.steps).as_dict()
+    meta["timed_out"] = tracer.timed_out or (fast is not None and fast.timed_out)
+    meta["num_steps"] = tracer.num_steps
+    meta["scene_cache"] = tracer.scene_cache.stats()
+    meta["scene_interner"] = tracer.interner.stats()
+    if detached_at is not None:
+        meta["fast_forward"] = {
+            "at_step": tracer.num_steps,
+            "events": tracer.events + fast.events,
+            "seconds": round(time.monotonic() - detached_at, 4),
+            "timed_out": fast.timed_out,
+        }
+        meta["final_state"] = tracer.final_state(globals_dict)
+    if timer is not None:
+        timer.events = tracer.events
+    if store is not None:
+        with perf_mod.phase(timer, "promote"):
+            store.set_roles(usage.roles())
+        meta["step_store"] = store.stats()
+        steps = store
+    elif usage is not None:
+        with perf_mod.phase(timer, "promote"):
+            meta["var_roles"] = usage.roles()
+        steps = []
+    else:
+        steps = materialize(tracer.steps)
+        with perf_mod.phase(timer, "promote"):
+            promote_mod.promote(steps)  # access-pattern relabel (name-independent)
+        with perf_mod.phase(timer, "encode"):
+            if step_format == delta_mod.FORMAT_DELTA:
+                steps = delta_mod.encode_steps(steps, meta["keyframe_every"])
+            elif step_format == delta_mod.FORMAT_SHARED:
+                steps = hashcons.encode_steps(steps)
+            elif step_format == delta_mod.FORMAT_HEAP:
+                steps = heap_mod.encode_steps(steps)
+    if timer is not None:
+        meta["perf"] = timer.report()
+    return Trace(meta=meta, steps=steps).as_dict()
@@ -0,0 +1,300 @@
+"""Per-call scene cache: skip ``detect_type`` + ``build_scene`` for unchanged values.
+
+Most lines touch one or two variables, yet every step used to re-detect and
+re-serialize *every* local -- a 10k-element array or a 500-node tree included.
+The cache remembers, per ``(call_id, name)``, the object identity, a cheap
+*signature* and the scene built from it, and reuses that scene object while
+the value cannot have changed.
+
+"Cannot have changed" is decided per step, from the line that ran since the
+call's previous step (:meth:`SceneCache.begin`), never by walking the value:
+
+* a step of *another* call in between (a callee, a comprehension, a user
+  ``__eq__``) or a line that runs code the analysis cannot follow (an unknown
+  function, ``with``, ``yield``; see :class:`engine.lines.Effects`) drops
+  every entry of the call;
+* otherwise the objects the line may have changed in place -- the targets of
+  ``a[i] = ...`` / ``node.next = ...`` / ``x += ...``, the receivers of
+  ``arr.append(...)``, a ``defaultdict`` read with ``d[k]`` -- are resolved
+  in the frame, and an entry is dropped when it *is* one of them or may
+  contain one. Entries remember their layout: a flat container (scalars
+  only) contains nothing, a two-level one (a grid, an adjacency list) only
+  its rows, anything deeper may contain anything;
+* names the line rebinds are dropped;
+* whatever a whitelisted builtin calls or iterates -- ``map(f, xs)``,
+  ``sorted(xs, key=k)``, ``for x in it`` -- must be *inert*: a builtin
+  container or scalar, a plain builtin such as ``len``, or user code (traced,
+  so it shows up as another call). A bound method or ``setattr`` reached
+  through ``map`` writes without a trace event, so it drops every entry.
+
+On top of that, :func:`signature` -- type, length and a fixed sample of
+elements or attributes, O(1) -- must still match; it catches what the line
+analysis cannot see, such as a ``defaultdict`` growing under a read. Values
+with no signature (generators, ``range`` ...) are rebuilt every step (counted
+as a ``bypass``). Any doubt means a rebuild, never a stale scene.
+"""
+
+from __future__ import annotations
+
+import builtins
+import types
+from collections import Counter, OrderedDict, defaultdict, deque
+from itertools import islice
+from typing import Any
+
+from . import scope as scope_mod
+from .backends import USER_FILENAME
+
+SAMPLE = 8                # elements / attributes compared by signature()
+
+_SCALARS = frozenset({int, float, str, bool, type(None)})
+_IMMUTABLE = _SCALARS | {tuple, frozenset, bytes, range, complex}
+_SEQS = frozenset({list, tuple, deque})
+_SETS = frozenset({set, frozenset})
+_DICTS = frozenset({dict, defaultdict, OrderedDict, Counter})
+# Containers whose own methods change nothing but the container itself.
+_CONTAINERS = frozenset({list, set, deque, bytearray}) | _DICTS
+# Indexing these runs no code and inserts nothing.
+_READ_SAFE = frozenset({list, tuple, str, bytes, range, deque, dict, OrderedDict,
+                        Counter})
+# Builtins that may be handed to map() / sorted(key=...): they run no code
+# of the values they are given beyond their own dunder conversions.
+_INERT_CALLABLES = frozenset(id(getattr(builtins, n)) for n in (
+    "len", "abs", "str", "int", "float", "bool", "ord", "chr", "repr", "hash",
+    "id", "round", "type", "tuple", "list", "set", "frozenset", "sorted",
+    "reversed", "sum", "min", "max", "print"))
+_MISSING = object()
+_DEEP = None              # layout: may contain anything
+
+
+def _item(v: Any) -> Any:
+    t = type(v)
+    return (t, v) if t in _SCALARS else id(v)
+
+
+def signature(val: Any) -> Any:
+    """O(1) signature of ``val`` -- type, length, sampled elements -- or
+    ``None`` for values that are never cached."""
+    t = type(val)
+    if t is list or t is tuple:
+        n = len(val)
+        return (t, n, tuple(map(_item, val[::n // SAMPLE or 1])),
+                _item(val[-1]) if n else None)
+    if t in _DICTS:
+        if not val:
+            return (t, 0)
+        first, last = next(iter(val)), next(reversed(val))
+        return (t, len(val), _item(first), _item(val[first]),
+                _item(last), _item(val[last]))
+    if t is deque:
+        return (t, len(val), _item(val[0]), _item(val[-1])) if val else (t, 0)
+    if t in _SETS:
+        return (t, len(val))
+    if hasattr(val, "__dict__") and not callable(val):
+        attrs = vars(val)
+        return (t, len(attrs),
+                tuple((k, _item(v)) for k, v in islice(attrs.items(), SAMPLE)))
+    return None
+
+
+def _flat(items) -> bool:
+    return frozenset(map(type, items)) <= _SCALARS
+
+
+def layout(val: Any) -> Any:
+    """What ``val`` may hold: ``frozenset()`` (scalars only), the ids of its
+    rows when they are flat containers, or ``_DEEP``."""
+    t = type(val)
+    if t in _DICTS:
+        if not _flat(val):
+            return _DEEP
+        items = val.values()
+    elif t in _SEQS or t in _SETS:
+        items = val
+    elif hasattr(val, "__dict__"):
+        items = vars(val).values()
+    else:
+        return _DEEP
+    if _flat(items):
+        return frozenset()
+    rows = []
+    for row in items:
+        rt = type(row)
+        if rt in _SCALARS:
+            continue
+        if rt in _DICTS:
+            if not (_flat(row) and _flat(row.values())):
+                return _DEEP
+        elif rt not in _SEQS and rt not in _SETS or not _flat(row):
+            return _DEEP
+        rows.append(id(row))
+    return frozenset(rows)
+
+
+def _user_instance(obj: Any) -> bool:
+    # Classes defined by the traced program (it runs as ``__main__``).
+    return getattr(type(obj), "__module__", None) == "__main__"
+
+
+def _user_code(obj: Any) -> bool:
+    # Functions / generators of the traced program: their frames are traced.
+    code = getattr(obj, "__code__", None) or getattr(obj, "gi_code", None)
+    return isinstance(obj, (types.FunctionType, types.GeneratorType)) and \
+        code.co_filename == USER_FILENAME
+
+
+def _inert(obj: Any) -> bool:
+    """Whether a builtin may call or iterate ``obj`` without running code
+    that escapes the trace."""
+    t = type(obj)
+    if t in _IMMUTABLE or t in _CONTAINERS or id(obj) in _INERT_CALLABLES:
+        return True
+    if _user_code(obj):
+        return True
+    klass = obj if isinstance(obj, type) else t
+    return klass.__module__ == "__main__" and all(
+        k.__module__ == "__main__" or k is object for k in klass.__mro__)
+
+
+def _resolve(chain: tuple, f_locals, f_globals) -> Any:
+    """The object a chain names, reading only ``__dict__`` entries and
+    builtin containers (no user code, no ``__missing__``); raises otherwise."""
+    name, ops = chain
+    obj = f_locals.get(name, _MISSING)
+    if obj is _MISSING:
+        obj = f_globals.get(name, _MISSING)
+        if obj is _MISSING:
+            obj = getattr(builtins, name)
+    for kind, key in ops:
+        if kind == "a":
+            obj = vars(obj)[key]
+            continue
+        t = type(obj)
+        if t not in _READ_SAFE and t is not defaultdict:
+            raise LookupError(key)
+        key = scope_mod.eval_expr(key, f_locals, f_globals)
+        if t in _DICTS and key not in obj:
+            raise LookupError(key)
+        obj = obj[key]
+    return obj
+
+
+def _method_owner(obj: Any, name: str):
+    for klass in type(obj).__mro__:
+        if name in vars(klass):
+            return klass
+    return None
+
+
+def touched(effects, f_locals, f_globals) -> set | None:
+    """Ids of the mutable objects a line with ``effects`` may have changed in
+    place, or ``None`` if that cannot be told."""
+    out = set()
+    try:
+        for chain in effects.stores:
+            obj = _resolve(chain, f_locals, f_globals)
+            if type(obj) not in _IMMUTABLE:
+                out.add(id(obj))
+        for chain in effects.loads:
+            obj = _resolve(chain, f_locals, f_globals)
+            if isinstance(obj, defaultdict):
+                out.add(id(obj))
+            elif type(obj) not in _READ_SAFE and not _user_instance(obj):
+                return None
+        for chain, method in effects.calls:
+            obj = _resolve(chain, f_locals, f_globals)
+            t = type(obj)
+            if t in _IMMUTABLE:
+                continue
+            if t not in _CONTAINERS:
+                if not _user_instance(obj):
+                    return None             # a module, a library object ...
+                owner = _method_owner(obj, method)
+                if owner is None or owner.__module__ == "__main__":
+                    out.add(id(obj))        # user code: traced like any call
+                    continue
+                if owner not in _CONTAINERS:
+                    return None
+            if method not in scope_mod.PURE_METHODS:
+                out.add(id(obj))
+        for name in effects.builtins:
+            fn = _resolve((name, ()), f_locals, f_globals)
+            if fn is not getattr(builtins, name) and not _user_code(fn):
+                return None                 # shadowed by a library function
+        for chain in effects.reads:
+            if not _inert(_resolve(chain, f_locals, f_globals)):
+                return None
+    except Exception:
+        return None
+    return out
+
+
+class SceneCache:
+    """Scenes of the current step's locals, keyed by ``(call_id, name)``."""
+
+    def __init__(self):
+        # call_id -> name -> (id, signature, vtype, scene, layout)
+        self._calls: dict[int, dict[str, tuple]] = {}
+        self._last_call = None
+        self.hits = 0
+        self.misses = 0
+        self.bypass = 0
+        self.invalidated = 0      # steps that dropped every entry of a call
+
+    def begin(self, call_id: int, ran, f_locals, f_globals) -> None:
+        """Start a step of ``call_id``; ``ran`` is the :class:`LineInfo` of the
+        line that ran since the call's previous step (``None`` if unknown)."""
+        last, self._last_call = self._last_call, call_id
+        entries = self._calls.get(call_id)
+        if not entries:
+            return
+        effects = ran.effects if ran is not None and last == call_id else None
+        changed = None if effects is None else touched(effects, f_locals, f_globals)
+        if changed is None:
+            entries.clear()
+            self.invalidated += 1
+            return
+        for name in effects.binds:
+            entries.pop(name, None)
+        if changed:
+            for name in [n for n, e in entries.items()
+                         if e[4] is _DEEP or e[0] in changed
+                         or not changed.isdisjoint(e[4])]:
+                del entries[name]
+
+    def lookup(self, call_id: int, name: str, val: Any):
+        """Return ``(vtype, scene, sig)``; ``vtype`` is ``None`` on a miss and
+        ``sig`` is what to pass back to :meth:`store`."""
+        try:
+            sig = signature(val)
+        except Exception:
+            sig = None
+        if sig is None:
+            self.bypass += 1
+            return None, None, None
+        entry = self._calls.get(call_id, {}).get(name)
+        if entry is not None and entry[0] == id(val) and entry[1] == sig:
+            self.hits += 1
+            return entry[2], entry[3], sig
+        self.misses += 1
+        return None, None, sig
+
+    def store(self, call_id: int, name: str, val: Any, sig: Any,
+              vtype: str, scene: Any) -> None:
+        if sig is not None:
+            self._calls.setdefault(call_id, {})[name] = (
+                id(val), sig, vtype, scene, layout(val))
+
+    def drop_call(self, call_id: int) -> None:
+        """Forget a call's entries once its frame has returned."""
+        self._calls.pop(call_id, None)
+
+    def stats(self) -> dict:
+        looked = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypass": self.bypass,
+            "invalidated": self.invalidated,
+            "hit_rate": round(self.hits / looked, 4) if looked else 0.0,
+        }
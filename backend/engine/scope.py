@@ -2,11 +2,20 @@
 
 These give the frontend what it needs to draw the "for-loop box that counts up"
 and to highlight which branch of an if/elif/else was actually taken.
+
+Conditions and ``range`` arguments are compiled once per source string
+(:func:`compile_expr`) and evaluated against a :class:`~collections.ChainMap`
+over the frame's locals and globals -- nothing is re-parsed or copied per step.
+Only side-effect-free expressions are evaluated at all: evaluating
+``stack.pop() == "("`` a line early would pop the user's stack twice.
 """
 
 from __future__ import annotations
 
+import ast
 import re
+from collections import ChainMap, Counter, OrderedDict, defaultdict, deque
+from functools import lru_cache
 from typing import Any
 
 _FOR_RANGE = re.compile(
@@ -28,42 +37,15 @@ def scope_type(event: str, code_line: str) -> str | None:
     return None
 
 
-def loop_meta(code_line: str, frame_locals: dict, frame_globals: dict) -> dict | None:
-    """Best-effort structured description of a ``for``/``while`` header."""
+def parse_loop_header(code_line: str) -> dict | None:
+    """Static part of :func:`loop_meta` -- everything that does not depend on
+    runtime values. ``for_range`` carries the raw ``range_args`` sources."""
     s = code_line.strip()
 
     m = _FOR_RANGE.search(s)
     if m:
-        var = m.group("var")
         raw = [a.strip() for a in m.group("args").split(",") if a.strip()]
-        bounds = []
-        for a in raw:
-            try:
-                bounds.append(int(eval(a, {"__builtins__": {}}, {**frame_globals, **frame_locals})))
-            except Exception:
-                bounds.append(None)
-        if len(bounds) == 1:
-            start, stop, step = 0, bounds[0], 1
-        elif len(bounds) == 2:
-            start, stop, step = bounds[0], bounds[1], 1
-        else:
-            start, stop, step = bounds[0], bounds[1], bounds[2] or 1
-        total = None
-        if None not in (start, stop, step) and step != 0:
-            total = max(0, (stop - start + (step - (1 if step > 0 else -1))) // step)
-        current = frame_locals.get(var)
-        cur_iter = None
-        if isinstance(current, int) and start is not None and step:
-            try:
-                cur_iter = (current - start) // step
-            except Exception:
-                cur_iter = None
-        return {
-            "kind": "for_range", "index_var": var,
-            "start": start, "stop": stop, "step": step,
-            "total_iterations": total, "current_value": current,
-            "current_iteration": cur_iter,
-        }
+        return {"kind": "for_range", "index_var": m.group("var"), "range_args": raw}
 
     m = _FOR_ENUM.search(s)
     if m:
@@ -81,22 +63,215 @@ def loop_meta(code_line: str, frame_locals: dict, frame_globals: dict) -> dict |
     return None
 
 
-def branch_taken(code_line: str, frame_locals: dict, frame_globals: dict) -> bool | None:
-    """Evaluate an if/elif condition to record which branch was taken.
+# Builtins a condition / range bound may call, and methods known not to mutate
+# -- on the builtin types below only. A user class's ``find`` / ``get`` (DSU
+# path compression, an LRU cache reordering itself) is not pure, so a method
+# call is routed through :func:`_pure_method`, which checks the receiver's
+# exact type when the expression runs.
+_SAFE_CALLS = {"len": len, "abs": abs, "min": min, "max": max}
+PURE_METHODS = {
+    "get", "keys", "values", "items", "count", "index", "find",
+    "startswith", "endswith", "isdigit", "isalpha", "isalnum", "isspace",
+    "isupper", "islower", "lower", "upper", "strip",
+}
+_PURE_RECEIVERS = frozenset({dict, list, str, tuple, defaultdict, OrderedDict,
+                             Counter, deque})
+_METHOD = "<method>"      # not an identifier: no user variable can shadow it
+_IMPURE = (ast.NamedExpr, ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp,
+           ast.GeneratorExp, ast.Await, ast.Yield, ast.YieldFrom)
+
+
+def _pure_method(receiver: Any, name: str):
+    if type(receiver) not in _PURE_RECEIVERS:
+        raise ValueError("method call on " + type(receiver).__name__)
+    return getattr(receiver, name)
+
+
+_EVAL_GLOBALS = {"__builtins__": {**_SAFE_CALLS, _METHOD: _pure_method}}
+
+
+def _is_pure(tree: ast.AST) -> bool:
+    for node in ast.walk(tree):
+        if isinstance(node, _IMPURE):
+            return False
+        if isinstance(node, ast.Call):
+            fn = node.func
+            if isinstance(fn, ast.Name) and fn.id in _SAFE_CALLS:
+                continue
+            if isinstance(fn, ast.Attribute) and fn.attr in PURE_METHODS:
+                continue
+            return False
+    return True
+
+
+class _GuardMethods(ast.NodeTransformer):
+    """``recv.get(k)`` -> ``<method>(recv, "get")(k)``."""
+
+    def visit_Call(self, node: ast.Call) -> ast.Call:
+        self.generic_visit(node)
+        fn = node.func
+        if isinstance(fn, ast.Attribute):
+            node.func = ast.Call(ast.Name(_METHOD, ast.Load()),
+                                 [fn.value, ast.Constant(fn.attr)], [])
+        return node
+
+
+@lru_cache(maxsize=4096)
+def compile_expr(src: str):
+    """Code object for a side-effect-free expression, or ``None`` if ``src``
+    does not parse or might mutate state. Cached per source string."""
+    try:
+        tree = ast.parse(src.strip(), mode="eval")
+    except SyntaxError:
+        return None
+    if not _is_pure(tree):
+        return None
+    tree = ast.fix_missing_locations(_GuardMethods().visit(tree))
+    return compile(tree, "<expr>", "eval")
+
+
+def eval_expr(src: str, frame_locals, frame_globals) -> Any:
+    """Evaluate ``src`` in the frame (locals first); raises on any failure."""
+    code = compile_expr(src)
+    if code is None:
+        raise ValueError("not evaluable: " + src)
+    return eval(code, _EVAL_GLOBALS, ChainMap(frame_locals, frame_globals))
+
+
+def range_bounds(range_args: list, frame_locals, frame_globals) -> tuple:
+    """``(start, stop, step, total)`` of ``range(*range_args)``; ``None`` for
+    anything that cannot be evaluated."""
+    bounds = []
+    for a in range_args:
+        try:
+            bounds.append(int(eval_expr(a, frame_locals, frame_globals)))
+        except Exception:
+            bounds.append(None)
+    if len(bounds) == 1:
+        start, stop, step = 0, bounds[0], 1
+    elif len(bounds) == 2:
+        start, stop, step = bounds[0], bounds[1], 1
+    else:
+        start, stop, step = bounds[0], bounds[1], bounds[2] or 1
+    total = None
+    if None not in (start, stop, step) and step != 0:
+        total = max(0, (stop - start + (step - (1 if step > 0 else -1))) // step)
+    return start, stop, step, total
+
+
+def _describe(header: dict, bounds: tuple | None, iteration, frame_locals) -> dict:
+    if header["kind"] != "for_range":
+        return dict(header)
+    start, stop, step, total = bounds
+    return {
+        "kind": "for_range", "index_var": header["index_var"],
+        "start": start, "stop": stop, "step": step,
+        "total_iterations": total, "current_value": frame_locals.get(header["index_var"]),
+        "current_iteration": iteration,
+    }
+
+
+def eval_loop(header: dict | None, frame_locals, frame_globals) -> dict | None:
+    """Runtime loop metadata for a parsed header (see :func:`parse_loop_header`),
+    recomputed from scratch. The tracer uses :class:`LoopTracker` instead."""
+    if header is None:
+        return None
+    if header["kind"] != "for_range":
+        return dict(header)
+    bounds = range_bounds(header["range_args"], frame_locals, frame_globals)
+    start, _, step, _ = bounds
+    current = frame_locals.get(header["index_var"])
+    cur_iter = None
+    if isinstance(current, int) and start is not None and step:
+        cur_iter = (current - start) // step
+    return _describe(header, bounds, cur_iter, frame_locals)
+
 
-    Uses a restricted ``eval`` (no builtins) on the condition only. Returns
-    ``None`` if it cannot be evaluated safely.
+class LoopTracker:
+    """Per-call loop bookkeeping, driven by the tracer's own line events.
+
+    A header hit is a *re-entry* of the loop it heads when the call's previous
+    line lies inside the loop (``header_line <= prev <= loop_end``); anything
+    else is a fresh entry. ``range`` bounds are evaluated once on entry (when
+    Python itself evaluates them) and ``current_iteration`` is a hit counter:
+    ``None`` on entry, then 0, 1, ... on each pass back through the header.
     """
+
+    def __init__(self):
+        self._calls: dict[int, dict[int, list]] = {}
+
+    def visit(self, call_id: int, lineno: int, prev_lineno: int | None,
+              header: dict | None, loop_end: int | None,
+              frame_locals, frame_globals, advance: bool = True) -> dict | None:
+        """Loop metadata for a header hit; ``advance=False`` (e.g. the
+        ``return`` event a frame reports on its exhausted loop header) reads
+        the state without counting a pass."""
+        if header is None:
+            return None
+        loops = self._calls.setdefault(call_id, {})
+        state = loops.get(lineno)
+        if prev_lineno is None:
+            inside = False
+        elif loop_end is not None:
+            inside = lineno <= prev_lineno <= loop_end
+        else:                   # no AST span: body lines sit below the header
+            inside = prev_lineno >= lineno
+        if state is not None and not advance:
+            pass
+        elif state is None or not inside:
+            bounds = (range_bounds(header["range_args"], frame_locals, frame_globals)
+                      if header["kind"] == "for_range" else None)
+            state = loops[lineno] = [bounds, 0]
+        else:
+            state[1] += 1
+        iteration = state[1] - 1 if state[1] else None
+        meta = _describe(header, state[0], iteration, frame_locals)
+        if header["kind"] != "for_range":
+            meta["current_iteration"] = iteration
+        return meta
+
+    def drop_call(self, call_id: int) -> None:
+        self._calls.pop(call_id, None)
+
+
+def loop_meta(code_line: str, frame_locals: dict, frame_globals: dict) -> dict | None:
+    """Best-effort structured description of a ``for``/``while`` header."""
+    return eval_loop(parse_loop_header(code_line), frame_locals, frame_globals)
+
+
+ELSE = object()          # branch "condition" of an ``else:`` line: always taken
+
+
+def branch_condition(code_line: str):
+    """Static part of :func:`branch_taken`: the condition source of an
+    ``if``/``elif`` line, :data:`ELSE` for ``else``, ``None`` otherwise."""
     s = code_line.strip().rstrip(":")
+    if s.startswith("if "):
+        return s[3:]
+    if s.startswith("elif "):
+        return s[5:]
+    if s.startswith("else"):
+        return ELSE
+    return None
+
+
+def eval_branch(cond, frame_locals, frame_globals) -> bool | None:
+    """Evaluate a parsed branch condition (see :func:`branch_condition`)."""
+    if cond is ELSE:
+        return True
+    if cond is None:
+        return None
     try:
-        if s.startswith("if "):
-            cond = s[3:]
-        elif s.startswith("elif "):
-            cond = s[5:]
-        elif s.startswith("else"):
-            return True
-        else:
-            return None
-        return bool(eval(cond, {"__builtins__": {}}, {**frame_globals, **frame_locals}))
+        return bool(eval_expr(cond, frame_locals, frame_globals))
     except Exception:
         return None
+
+
+def branch_taken(code_line: str, frame_locals: dict, frame_globals: dict) -> bool | None:
+    """Evaluate an if/elif condition to record which branch was taken.
+
+    Uses a restricted ``eval`` (only ``len``/``abs``/``min``/``max``, no
+    mutating calls) on the condition only. Returns ``None`` if it cannot be
+    evaluated safely.
+    """
+    return eval_branch(branch_condition(code_line), frame_locals, frame_globals)
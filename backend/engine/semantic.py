@@ -62,9 +62,16 @@ def array_writes(prev_val: Any, cur_val: Any):
             for i in diffs]
 
 
+_CLASSIFY = object()
+
+
 def build_events(code_line: str, prev_locals: dict, cur_locals: dict,
-                 event: str, function: str = ""):
-    """Assemble the semantic events for one step."""
+                 event: str, function: str = "", tag=_CLASSIFY):
+    """Assemble the semantic events for one step.
+
+    ``tag`` is the line's precomputed :func:`classify_line` result (see
+    :mod:`engine.lines`); it is derived from ``code_line`` when omitted.
+    """
     events = []
 
     # Only real function frames count as recursion enter/exit (not <module>).
@@ -74,7 +81,8 @@ def build_events(code_line: str, prev_locals: dict, cur_locals: dict,
         elif event == "return":
             events.append({"kind": "recursion_exit"})
 
-    tag = classify_line(code_line)
+    if tag is _CLASSIFY:
+        tag = classify_line(code_line)
     if tag:
         events.append({"kind": tag})
 
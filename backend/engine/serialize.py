@@ -5,38 +5,144 @@ Two layers:
   * The structure serializers (linked list, tree, trie, segment tree, graph)
     -- produce rich, renderer-ready scene dicts.
 
-Every serializer is cycle-safe (tracks visited object ids) and depth-capped so
-a pathological input can never hang the worker.
+Every serializer is cycle-safe (tracks visited object ids) and node-budgeted
+so a pathological input can never hang the worker; the tree walkers are
+iterative, so depth alone never truncates them.
 """
 
 from __future__ import annotations
 
+import sys
+from collections import deque
 from typing import Any
 
+from .dispatch import TypeDispatch
+from .nodeids import NodeIds
+
 MAX_NODES = 500          # hard cap on nodes walked per structure
-MAX_DEPTH = 64           # recursion depth cap for tree/trie walks
+MAX_DEPTH = 64           # deep_json_safe depth cap; least scene nesting allowed
 
 
 # --------------------------------------------------------------------------- #
 # Generic JSON safety
 # --------------------------------------------------------------------------- #
-def deep_json_safe(obj: Any, _depth: int = 0) -> Any:
-    """Recursively coerce any object into something ``json.dumps`` accepts."""
-    if obj is None or isinstance(obj, (int, float, str, bool)):
-        return obj
-    if _depth > MAX_DEPTH:
-        return "<max-depth>"
+# deep_json_safe walks one value with a _JsonWalk: the containers on the
+# current path (a container met again there is a cycle -> "<cycle>"), the
+# containers already converted, and a node budget shared by the whole value.
+# A container reached again off the path (a DAG: ``[[0] * 3] * 3``, or
+# ``x = [x, x]`` thirty times over) reuses its converted output while the
+# budget still covers its size, and becomes "<shared>" once it does not; a
+# container cut by the spent budget ends in one "<truncated>" entry. Every
+# node costs at least one unit, so any value costs time linear in the budget.
+
+JSON_BUDGET = 100_000    # nodes one deep_json_safe value may expand to
+
+_SCALARS = frozenset({int, float, str, bool, type(None)})
+
+
+def _same(walk, obj, depth):
+    return obj
+
+
+def _json_mapping(walk, obj, depth):
+    out = {}
+    value, depth = walk.value, depth + 1
+    for k, v in obj.items():
+        if walk.budget <= 0:
+            out["..."] = "<truncated>"
+            break
+        out[str(k)] = value(v, depth)
+    return out
+
+
+def _json_items(walk, obj, depth):
+    out = []
+    value, depth = walk.value, depth + 1
+    for v in obj:
+        if walk.budget <= 0:
+            out.append("<truncated>")
+            break
+        out.append(value(v, depth))
+    return out
+
+
+def _json_object(walk, obj, depth):
+    # Compact tag with the node's value ("<ListNode 4>"), not an opaque
+    # "<ListNode object>" -- heaps of (key, node) tuples stay readable.
+    return _compact_obj(obj)
+
+
+def _json_str(walk, obj, depth):
+    return str(obj)
+
+
+def _json_resolve(obj):
+    """The ordered chain, for types without a registered handler."""
+    if isinstance(obj, (int, float, str, bool)):
+        return _same
     if isinstance(obj, dict):
-        return {str(k): deep_json_safe(v, _depth + 1) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple, set, frozenset)):
-        return [deep_json_safe(v, _depth + 1) for v in obj]
-    if type(obj).__name__ == "deque":
-        return [deep_json_safe(v, _depth + 1) for v in obj]
+        return _json_mapping
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return _json_items
     if hasattr(obj, "__dict__"):
-        # Compact tag with the node's value ("<ListNode 4>"), not an opaque
-        # "<ListNode object>" -- heaps of (key, node) tuples stay readable.
-        return _compact_obj(obj)
-    return str(obj)
+        return _json_object
+    return _json_str
+
+
+_JSON_SAFE = TypeDispatch(_json_resolve)
+_JSON_SAFE.register(int, float, str, bool, type(None))(_same)
+_JSON_SAFE.register(dict)(_json_mapping)
+_JSON_SAFE.register(list, tuple, set, frozenset, deque)(_json_items)
+_json_exact = _JSON_SAFE.exact.get
+_json_lookup = _JSON_SAFE.lookup
+
+
+class _JsonWalk:
+    """State of one :func:`deep_json_safe` call (see above)."""
+
+    __slots__ = ("budget", "path", "done")
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.path: set = set()             # ids of the containers being converted
+        self.done: dict = {}               # id(container) -> (output, nodes it cost)
+
+    def value(self, obj: Any, depth: int) -> Any:
+        handler = _json_exact(type(obj)) or _json_lookup(obj)
+        self.budget -= 1
+        if handler is _same:
+            return obj
+        if depth > MAX_DEPTH:
+            return "<max-depth>"
+        if handler is _json_items:
+            if len(obj) <= self.budget and frozenset(map(type, obj)) <= _SCALARS:
+                self.budget -= len(obj)     # flat row of scalars: copy in C
+                return list(obj)
+        elif handler is not _json_mapping:
+            return handler(self, obj, depth)
+        key = id(obj)
+        if key in self.path:
+            return "<cycle>"
+        seen = self.done.get(key)
+        if seen is not None:
+            if seen[1] <= self.budget:
+                self.budget -= seen[1]
+                return seen[0]
+            return "<shared>"
+        start = self.budget
+        self.path.add(key)
+        out = handler(self, obj, depth)
+        self.path.discard(key)
+        self.done[key] = (out, start - self.budget)
+        return out
+
+
+def deep_json_safe(obj: Any, budget: int = JSON_BUDGET) -> Any:
+    """Coerce any object into something ``json.dumps`` accepts -- cycle- and
+    DAG-safe, at most ``budget`` nodes."""
+    if _json_exact(type(obj)) is _same:
+        return obj
+    return _JsonWalk(budget).value(obj, 0)
 
 
 def json_safe(val: Any) -> Any:
@@ -61,10 +167,14 @@ def get_attrs(obj: Any) -> dict[str, Any]:
     return out
 
 
+_MISSING = object()
+
+
 def _first_attr(node: Any, names: tuple[str, ...]) -> Any:
     for name in names:
-        if hasattr(node, name):
-            return getattr(node, name)
+        value = getattr(node, name, _MISSING)
+        if value is not _MISSING:
+            return value
     return None
 
 
@@ -132,12 +242,37 @@ PREV_ATTRS = ("prev", "previous", "prev_node")
 # --------------------------------------------------------------------------- #
 # Linked list serialization (singly / doubly / circular)
 # --------------------------------------------------------------------------- #
-def serialize_linked_list(head: Any) -> dict:
+def list_node(obj: Any, ids: NodeIds) -> tuple[dict, Any]:
+    """``({id, value, next, prev}, next object)`` for one list node.
+
+    ``next`` / ``prev`` name the ids of the objects the node points at, so a
+    node's dict depends on that node alone -- whichever variable it is
+    reached from (see :mod:`engine.heap`).
+    """
+    nxt = _first_attr(obj, NEXT_ATTRS)
+    prev = _first_attr(obj, PREV_ATTRS)
+    node_id = ids.of
+    return ({"id": node_id(obj), "value": json_safe(_first_attr(obj, VAL_ATTRS)),
+             "next": None if nxt is None else node_id(nxt),
+             "prev": None if prev is None else node_id(prev)}, nxt)
+
+
+def serialize_linked_list(head: Any, ids: NodeIds | None = None, node=None) -> dict:
     """Walk a node chain into ``{type, nodes, head}``.
 
     A node is anything exposing a value attr and a ``next``-style attr. Handles
     a wrapper object (``LinkedList`` with ``.head``) by unwrapping first.
+
+    ``nodes`` are in walk order; each node's ``id`` comes from ``ids`` (see
+    :mod:`engine.nodeids` -- walk positions without one) and ``next`` / ``prev``
+    name node ids. ``head`` is the head's position in ``nodes``. ``node(obj)``
+    builds one node (default :func:`list_node`).
     """
+    if ids is None:
+        ids = NodeIds()
+    if node is None:
+        def node(obj):
+            return list_node(obj, ids)
     # Unwrap a container that holds the real head.
     if head is not None and not _looks_like_node(head):
         inner = _first_attr(head, ("head", "root", "front", "first"))
@@ -145,34 +280,20 @@ def serialize_linked_list(head: Any) -> dict:
             head = inner
 
     nodes: list[dict] = []
-    index_by_id: dict[int, int] = {}
+    seen: set = set()
     is_doubly = False
     is_circular = False
 
     current = head
     while current is not None and len(nodes) < MAX_NODES:
-        if id(current) in index_by_id:
+        if id(current) in seen:
             is_circular = True
             break
-        idx = len(nodes)
-        index_by_id[id(current)] = idx
-
-        value = _first_attr(current, VAL_ATTRS)
-        if _first_attr(current, PREV_ATTRS) is not None:
+        seen.add(id(current))
+        out, current = node(current)
+        if out["prev"] is not None:
             is_doubly = True
-
-        nodes.append({"id": idx, "value": json_safe(value), "next": None, "prev": None})
-        current = _first_attr(current, NEXT_ATTRS)
-
-    # Resolve next/prev indices.
-    for i, node in enumerate(nodes):
-        if i + 1 < len(nodes):
-            node["next"] = i + 1
-    if is_circular and nodes:
-        nodes[-1]["next"] = index_by_id.get(id(head), 0)
-    if is_doubly:
-        for i in range(1, len(nodes)):
-            nodes[i]["prev"] = i - 1
+        nodes.append(out)
 
     return {
         "type": "doubly_linked_list" if is_doubly else "linked_list",
@@ -191,93 +312,227 @@ def _looks_like_node(obj: Any) -> bool:
 
 
 # --------------------------------------------------------------------------- #
-# Tree serialization (binary / BST / AVL / red-black)
+# Tree serialization (binary / AVL / red-black / segment / n-ary / trie)
 # --------------------------------------------------------------------------- #
-def serialize_tree(node: Any, kind: str = "binary_tree", visited: set | None = None,
-                   depth: int = 0) -> Any:
-    if visited is None:
-        visited = set()
-    if node is None:
-        return None
-    if depth > MAX_DEPTH or len(visited) > MAX_NODES:
-        return {"val": "<truncated>"}
-    if id(node) in visited:
-        return {"val": "<cycle>"}
-    visited.add(id(node))
-
-    out = {
-        "val": json_safe(_first_attr(node, VAL_ATTRS)),
-        "left": serialize_tree(_first_attr(node, LEFT_ATTRS), kind, visited, depth + 1),
-        "right": serialize_tree(_first_attr(node, RIGHT_ATTRS), kind, visited, depth + 1),
-    }
-    if kind == "red_black_tree":
-        color = _first_attr(node, ("color", "is_red", "red"))
-        out["color"] = "red" if color in (True, "red", "r", "R", 1) else "black"
-    elif kind == "avl_tree":
-        out["height"] = _first_attr(node, ("height", "balance", "bf"))
-    return out
-
-
-def serialize_nary_tree(node: Any, visited: set | None = None, depth: int = 0) -> Any:
-    if visited is None:
-        visited = set()
-    if node is None:
-        return None
-    if depth > MAX_DEPTH or id(node) in visited or len(visited) > MAX_NODES:
-        return {"val": "<truncated>"}
-    visited.add(id(node))
-    children = _first_attr(node, ("children", "child", "kids", "neighbors")) or []
-    return {
-        "val": json_safe(_first_attr(node, VAL_ATTRS)),
-        "children": [serialize_nary_tree(c, visited, depth + 1) for c in children
-                     if c is not None][:MAX_NODES],
-    }
-
-
-def serialize_segment_tree(node: Any, visited: set | None = None, depth: int = 0) -> Any:
-    if visited is None:
-        visited = set()
-    if node is None:
-        return None
-    if depth > MAX_DEPTH or id(node) in visited:
-        return {"val": "<cycle>"}
-    visited.add(id(node))
-    return {
-        "start": json_safe(_first_attr(node, ("start", "lo", "left_range", "l"))),
-        "end": json_safe(_first_attr(node, ("end", "hi", "right_range", "r"))),
-        "val": json_safe(_first_attr(node, ("val", "sum", "min", "max", "value"))),
-        "left": serialize_segment_tree(_first_attr(node, LEFT_ATTRS), visited, depth + 1),
-        "right": serialize_segment_tree(_first_attr(node, RIGHT_ATTRS), visited, depth + 1),
-    }
+# The tree walkers share one loop, _walk: an explicit stack of (container, key,
+# node) slots filled in pre-order, so a 10k-node degenerate BST or a long trie
+# chain costs no Python recursion. Each walk stops building after ``budget``
+# nodes; every slot left over becomes a cut marker (the structure's
+# "<truncated>" node) carrying ``elided``, the size of the subtree it stands
+# for. Counting those subtrees only follows child links, and stops after
+# COUNT_LIMIT nodes per walk. Built nodes lead with their stable ``id``;
+# markers have none.
+#
+# Depth is bounded only by what the stack can take. The scene is still nested
+# -- one dict per tree level -- and json.dumps / == on it recurse in C, which
+# on 3.11 counts against the same recursion limit as the traced program's
+# frames. tree_scene therefore lets a scene nest as deep as the frames left
+# below the limit (less NEST_RESERVE), never less than MAX_DEPTH: a degenerate
+# 500-node BST at module level is shown whole, the same tree inside a deep
+# recursion is cut (and counted) sooner.
+
+COUNT_LIMIT = 10_000     # elided nodes counted per walk before giving up
+NEST_RESERVE = 150       # frames kept free for whatever handles the scene next
+
+
+def _nest_limit() -> int:
+    """Nesting levels a scene built here may use (see above)."""
+    depth, frame = 0, sys._getframe()
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return max(MAX_DEPTH, sys.getrecursionlimit() - depth - NEST_RESERVE)
+
+
+def _walk(root: Any, expand, children, cycle: dict, cut: dict, budget: int,
+          max_depth: int):
+    """``(root_out, elided, exact)`` -- ``expand(node) -> (out, [(container,
+    key, child), ...])`` builds one node; ``children(node)`` lists its children
+    for counting; ``cycle`` / ``cut`` are the marker nodes. Nodes past
+    ``budget`` or ``max_depth`` levels are cut."""
+    visited: set = set()
+    holder = [None]
+    stack = [(holder, 0, root, 0)]
+    elided, exact = 0, True
+    while stack:
+        container, key, node, depth = stack.pop()
+        if id(node) in visited:
+            container[key] = dict(cycle)
+            continue
+        if len(visited) >= budget or depth >= max_depth:
+            n, exact_n = _count(node, children, visited, COUNT_LIMIT - elided)
+            elided += n
+            exact = exact and exact_n
+            container[key] = dict(cut, elided=n)
+            continue
+        visited.add(id(node))
+        out, slots = expand(node)
+        container[key] = out
+        stack.extend((c, k, child, depth + 1) for c, k, child in reversed(slots))
+    return holder[0], elided, exact
+
+
+def _count(node: Any, children, visited: set, limit: int) -> tuple[int, bool]:
+    """Nodes reachable from ``node`` not yet in ``visited`` (marked as it
+    goes), and whether the count is exact (``limit`` not reached)."""
+    n, stack = 0, [node]
+    pop, extend, mark = stack.pop, stack.extend, visited.add
+    while stack:
+        node = pop()
+        if node is None or id(node) in visited:
+            continue
+        if n >= limit:
+            return n, False
+        mark(id(node))
+        n += 1
+        extend(children(node))
+    return n, True
+
+
+def _binary_children(node: Any) -> tuple:
+    return _first_attr(node, LEFT_ATTRS), _first_attr(node, RIGHT_ATTRS)
+
+
+def _walk_tree(node: Any, kind: str, budget: int, max_depth: int, ids: NodeIds):
+    node_id = ids.of
+
+    def expand(n):
+        out = {"id": node_id(n), "val": json_safe(_first_attr(n, VAL_ATTRS)),
+               "left": None, "right": None}
+        if kind == "red_black_tree":
+            color = _first_attr(n, ("color", "is_red", "red"))
+            out["color"] = "red" if color in (True, "red", "r", "R", 1) else "black"
+        elif kind == "avl_tree":
+            out["height"] = _first_attr(n, ("height", "balance", "bf"))
+        left, right = _binary_children(n)
+        return out, [(out, k, c) for k, c in (("left", left), ("right", right))
+                     if c is not None]
+    return _walk(node, expand, _binary_children,
+                 {"val": "<cycle>"}, {"val": "<truncated>"}, budget, max_depth)
+
+
+def _nary_children(node: Any) -> list:
+    kids = _first_attr(node, ("children", "child", "kids", "neighbors")) or []
+    return [c for c in kids if c is not None]
+
+
+def _walk_nary_tree(node: Any, budget: int, max_depth: int, ids: NodeIds):
+    node_id = ids.of
+
+    def expand(n):
+        kids = _nary_children(n)
+        out = {"id": node_id(n), "val": json_safe(_first_attr(n, VAL_ATTRS)),
+               "children": [None] * len(kids)}
+        return out, [(out["children"], i, c) for i, c in enumerate(kids)]
+    truncated = {"val": "<truncated>"}
+    return _walk(node, expand, _nary_children, truncated, truncated, budget, max_depth)
+
+
+def _walk_segment_tree(node: Any, budget: int, max_depth: int, ids: NodeIds):
+    node_id = ids.of
+
+    def expand(n):
+        out = {
+            "id": node_id(n),
+            "start": json_safe(_first_attr(n, ("start", "lo", "left_range", "l"))),
+            "end": json_safe(_first_attr(n, ("end", "hi", "right_range", "r"))),
+            "val": json_safe(_first_attr(n, ("val", "sum", "min", "max", "value"))),
+            "left": None,
+            "right": None,
+        }
+        left, right = _binary_children(n)
+        return out, [(out, k, c) for k, c in (("left", left), ("right", right))
+                     if c is not None]
+    return _walk(node, expand, _binary_children,
+                 {"val": "<cycle>"}, {"val": "<truncated>"}, budget, max_depth)
+
+
+_TRIE_LINKS = ("children", "next", "edges", "links")
+
+
+def _trie_children(node: Any) -> Any:
+    children_obj = _first_attr(node, _TRIE_LINKS)
+    if isinstance(children_obj, dict):
+        return children_obj.values()
+    if isinstance(children_obj, (list, tuple)):
+        return children_obj
+    return ()
 
 
-def serialize_trie(node: Any, visited: set | None = None, depth: int = 0) -> Any:
-    if visited is None:
-        visited = set()
-    if node is None:
-        return None
-    if depth > MAX_DEPTH or id(node) in visited:
-        return {"is_word": False, "children": {}}
-    visited.add(id(node))
-
-    children_obj = _first_attr(node, ("children", "next", "edges", "links"))
-    # Keep the STORED WORD if the node carries one (word-search tries store the
-    # matched string, e.g. "oath") -- don't collapse it to a bare boolean.
-    word_attr = _first_attr(node, ("word",))
-    end_attr = _first_attr(node, ("is_end_of_word", "is_word", "is_end", "end"))
-    is_word = bool(end_attr) or (isinstance(word_attr, str) and word_attr != "")
-
-    children: dict[str, Any] = {}
+def _trie_edges(node: Any) -> list:
+    """``[(label, child), ...]`` for a trie node's non-None children."""
+    children_obj = _first_attr(node, _TRIE_LINKS)
     if isinstance(children_obj, dict):
-        for k, v in children_obj.items():
-            if v is not None:
-                children[str(k)] = serialize_trie(v, visited, depth + 1)
-    elif isinstance(children_obj, (list, tuple)):
-        for i, v in enumerate(children_obj):
-            if v is not None:
-                children[chr(ord("a") + i) if i < 26 else str(i)] = \
-                    serialize_trie(v, visited, depth + 1)
-    out = {"is_word": is_word, "children": children}
-    if isinstance(word_attr, str) and word_attr:
-        out["word"] = word_attr
-    return out
+        return [(str(k), v) for k, v in children_obj.items() if v is not None]
+    if isinstance(children_obj, (list, tuple)):
+        return [(chr(ord("a") + i) if i < 26 else str(i), v)
+                for i, v in enumerate(children_obj) if v is not None]
+    return []
+
+
+def _walk_trie(node: Any, budget: int, max_depth: int, ids: NodeIds):
+    node_id = ids.of
+
+    def expand(n):
+        # Keep the STORED WORD if the node carries one (word-search tries store
+        # the matched string, e.g. "oath") -- don't collapse it to a bare boolean.
+        word_attr = _first_attr(n, ("word",))
+        end_attr = _first_attr(n, ("is_end_of_word", "is_word", "is_end", "end"))
+        is_word = bool(end_attr) or (isinstance(word_attr, str) and word_attr != "")
+        children: dict[str, Any] = {}
+        out = {"id": node_id(n), "is_word": is_word, "children": children}
+        if isinstance(word_attr, str) and word_attr:
+            out["word"] = word_attr
+        edges = _trie_edges(n)
+        for label, _ in edges:          # keep the children's key order
+            children[label] = None
+        return out, [(children, label, c) for label, c in edges]
+    empty = {"is_word": False, "children": {}}
+    return _walk(node, expand, _trie_children, empty, empty, budget, max_depth)
+
+
+# n-ary and trie nodes nest through a children list / dict: two levels each.
+_LEVELS_PER_NODE = {"nary_tree": 2, "trie": 2}
+
+
+def tree_scene(val: Any, vtype: str, budget: int = MAX_NODES,
+               ids: NodeIds | None = None) -> dict:
+    """``{type, root}`` for a tree-like tag, plus ``elided`` (nodes past the
+    budget or the nesting limit) when the walk was cut -- and
+    ``elided_capped`` when counting them stopped at :data:`COUNT_LIMIT`.
+    Every node carries its ``id`` from ``ids`` (walk order without one)."""
+    if val is None:
+        return {"type": vtype, "root": None}
+    if ids is None:
+        ids = NodeIds()
+    max_depth = _nest_limit() // _LEVELS_PER_NODE.get(vtype, 1)
+    if vtype == "segment_tree":
+        root, elided, exact = _walk_segment_tree(val, budget, max_depth, ids)
+    elif vtype == "nary_tree":
+        root, elided, exact = _walk_nary_tree(val, budget, max_depth, ids)
+    elif vtype == "trie":
+        root, elided, exact = _walk_trie(val, budget, max_depth, ids)
+    else:
+        root, elided, exact = _walk_tree(val, vtype, budget, max_depth, ids)
+    scene = {"type": vtype, "root": root}
+    if elided:
+        scene["elided"] = elided
+        if not exact:
+            scene["elided_capped"] = True
+    return scene
+
+
+def serialize_tree(node: Any, kind: str = "binary_tree", budget: int = MAX_NODES) -> Any:
+    return tree_scene(node, kind, budget)["root"]
+
+
+def serialize_nary_tree(node: Any, budget: int = MAX_NODES) -> Any:
+    return tree_scene(node, "nary_tree", budget)["root"]
+
+
+def serialize_segment_tree(node: Any, budget: int = MAX_NODES) -> Any:
+    return tree_scene(node, "segment_tree", budget)["root"]
+
+
+def serialize_trie(node: Any, budget: int = MAX_NODES) -> Any:
+    return tree_scene(node, "trie", budget)["root"]
@@ -0,0 +1,137 @@
+"""Bounded-memory step store for long traces.
+
+A recorded step is a tree of small dicts; held as Python objects a 50k-step
+trace costs several times its JSON size. :class:`StepStore` keeps each step
+**JSON-encoded** the moment it is recorded: up to ``memory_budget`` bytes stay
+in RAM, older ones are spilled to an anonymous temp file, and steps are only
+decoded again when they are read.
+
+It is an ordinary read-only sequence (``len``, indexing, iteration), so it can
+stand in for the ``steps`` list of an envelope. Access-pattern promotion is
+applied on read (:meth:`StepStore.set_roles`), and :func:`write_json` /
+:func:`encode_json` write an envelope whose steps need no relabeling by
+splicing the stored bytes straight into the output -- no decode / re-encode
+round trip.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import tempfile
+from array import array
+from collections.abc import Sequence
+
+from . import promote as promote_mod
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+class StepStore(Sequence):
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = max(0, int(memory_budget))
+        self._mem: list = []               # encoded steps not yet spilled
+        self._mem_bytes = 0
+        self._file = None                  # created on first spill
+        self._offsets = array("q", [0])    # spilled step i = [off[i], off[i+1])
+        self._roles: dict = {}
+        self.spilled = 0
+
+    # -- writing ----------------------------------------------------------- #
+    def append(self, step: dict) -> None:
+        raw = json.dumps(step).encode("utf-8")
+        self._mem.append(raw)
+        self._mem_bytes += len(raw)
+        if self._mem_bytes > self.memory_budget:
+            self._spill()
+
+    def _spill(self) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="trace-steps-")
+        self._file.seek(0, 2)
+        end = self._offsets[-1]
+        for raw in self._mem:
+            end += len(raw)
+            self._offsets.append(end)
+        self._file.write(b"".join(self._mem))
+        self.spilled += len(self._mem)
+        self._mem = []
+        self._mem_bytes = 0
+
+    def set_roles(self, roles: dict) -> None:
+        """Relabel table from :class:`engine.promote.UsageStats`, applied on read."""
+        self._roles = dict(roles)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # -- reading ----------------------------------------------------------- #
+    def __len__(self) -> int:
+        return self.spilled + len(self._mem)
+
+    def raw(self, i: int) -> bytes:
+        """Step ``i`` exactly as recorded (JSON bytes, before relabeling)."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("step index out of range")
+        if i >= self.spilled:
+            return self._mem[i - self.spilled]
+        start, end = self._offsets[i], self._offsets[i + 1]
+        self._file.seek(start)
+        return self._file.read(end - start)
+
+    def iter_raw(self):
+        """All steps as JSON bytes, in order (the file is read sequentially)."""
+        if self._file is not None:
+            self._file.seek(0)
+            for i in range(self.spilled):
+                yield self._file.read(self._offsets[i + 1] - self._offsets[i])
+        yield from self._mem
+
+    def _decode(self, raw: bytes) -> dict:
+        step = json.loads(raw)
+        if self._roles:
+            promote_mod.relabel([step], self._roles)
+        return step
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._decode(self.raw(i))
+
+    def __iter__(self):
+        for raw in self.iter_raw():
+            yield self._decode(raw)
+
+    def stats(self) -> dict:
+        return {"steps": len(self), "spilled": self.spilled,
+                "memory_bytes": self._mem_bytes, "memory_budget": self.memory_budget}
+
+
+def write_json(envelope: dict, fh) -> None:
+    """Write ``json.dumps(envelope)`` to binary file ``fh``, streaming a
+    :class:`StepStore`'s steps one at a time instead of materializing them."""
+    steps = envelope.get("steps")
+    if not isinstance(steps, StepStore):
+        fh.write(json.dumps(envelope).encode("utf-8"))
+        return
+    rest = {k: v for k, v in envelope.items() if k != "steps"}
+    fh.write(json.dumps(rest)[:-1].encode("utf-8"))
+    fh.write(b', "steps": [' if rest else b'"steps": [')
+    encoded = steps.iter_raw() if not steps._roles else \
+        (json.dumps(s).encode("utf-8") for s in steps)
+    for n, raw in enumerate(encoded):
+        if n:
+            fh.write(b", ")
+        fh.write(raw)
+    fh.write(b"]}")
+
+
+def encode_json(envelope: dict) -> bytes:
+    """:func:`write_json` into one ``bytes`` object (the HTTP response body)."""
+    buf = io.BytesIO()
+    write_json(envelope, buf)
+    return buf.getvalue()
@@ -0,0 +1,110 @@
+"""Stream a trace while it is being recorded.
+
+:func:`iter_trace` runs :func:`~engine.runner.run_code` on a background thread
+with an ``on_step`` sink and yields records as they arrive:
+
+    ("meta", {...})     first: language / step_format / backend -- enough to
+                        start rendering
+    ("step", {...})     one per recorded step, in order
+    ("end",  {...})     last: the full meta (output, error, truncated,
+                        analysis, num_steps, var_roles ...)
+
+The hand-off queue is bounded, so a slow client applies back-pressure to the
+tracer instead of letting steps pile up in memory; time spent blocked on the
+client is not charged to the program's ``max_seconds`` (see
+``Tracer._emit``). If the consumer stops iterating, the trace is cancelled at
+its next event.
+
+:func:`ndjson_lines` / :func:`sse_lines` frame the records for HTTP.
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import threading
+from typing import Iterator
+
+from . import backends as backends_mod
+from . import delta as delta_mod
+from .runner import DEFAULT_MAX_SECONDS, DEFAULT_MAX_STEPS, _Abort, run_code
+
+QUEUE_SIZE = 256
+_POLL = 0.1
+
+
+def stream_head(step_format: str, keyframe_every: int, backend: str) -> dict:
+    """The leading ``meta`` record: what a client needs before the first step."""
+    head = {"language": "python", "step_format": step_format,
+            "backend": backends_mod.resolve(backend)}
+    if step_format == delta_mod.FORMAT_DELTA:
+        head["keyframe_every"] = max(1, int(keyframe_every))
+    return head
+
+
+def iter_trace(code: str, max_steps: int = DEFAULT_MAX_STEPS,
+               max_seconds: float = DEFAULT_MAX_SECONDS, stdin: str = "",
+               step_format: str = delta_mod.FORMAT_FULL,
+               keyframe_every: int = delta_mod.DEFAULT_KEYFRAME_EVERY,
+               backend: str = backends_mod.SETTRACE,
+               fast_forward: bool = False,
+               viewport: bool = False) -> Iterator[tuple[str, dict]]:
+    """Yield ``(kind, payload)`` records for one traced run (see module doc)."""
+    if step_format not in delta_mod.STEP_FORMATS:
+        raise ValueError("unknown step_format: " + repr(step_format))
+    head = stream_head(step_format, keyframe_every, backend)
+    yield "meta", head
+
+    records: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    cancelled = threading.Event()
+
+    def on_step(step):
+        while True:
+            if cancelled.is_set():
+                raise _Abort
+            try:
+                records.put(("step", step), timeout=_POLL)
+                return
+            except queue.Full:
+                continue
+
+    def work():
+        try:
+            env = run_code(code, max_steps=max_steps, max_seconds=max_seconds,
+                           stdin=stdin, step_format=step_format,
+                           keyframe_every=keyframe_every, backend=backend,
+                           on_step=on_step, fast_forward=fast_forward,
+                           viewport=viewport)
+            final = ("end", env["meta"])
+        except Exception as exc:  # engine bug: still terminate the stream
+            final = ("end", {**head, "error": "Internal error: " + str(exc)[:200],
+                             "num_steps": 0, "truncated": False, "output": ""})
+        while not cancelled.is_set():
+            try:
+                records.put(final, timeout=_POLL)
+                return
+            except queue.Full:
+                continue
+
+    worker = threading.Thread(target=work, name="trace-stream", daemon=True)
+    worker.start()
+    try:
+        while True:
+            kind, payload = records.get()
+            yield kind, payload
+            if kind == "end":
+                return
+    finally:
+        cancelled.set()
+
+
+def ndjson_lines(records) -> Iterator[bytes]:
+    """One JSON object per line: ``{"kind": ..., "data": ...}``."""
+    for kind, payload in records:
+        yield (json.dumps({"kind": kind, "data": payload}) + "\n").encode("utf-8")
+
+
+def sse_lines(records) -> Iterator[bytes]:
+    """Server-Sent Events: ``event: <kind>`` + ``data: <json>``."""
+    for kind, payload in records:
+        yield ("event: " + kind + "\ndata: " + json.dumps(payload) + "\n\n").encode("utf-8")
@@ -0,0 +1,162 @@
+"""Viewport-capped scenes for large arrays, matrices, dicts and graphs.
+
+``MAX_NODES`` only bounds the linked-structure walkers; a 10^5-element list
+used to be copied and coerced element by element on every step. Past the caps
+below a scene shows a **window** of the value instead:
+
+* arrays (and stack / queue / heap / set / dsu values): the first and last
+  :data:`EDGE` cells plus :data:`RADIUS` cells around each *focus* index;
+* matrices / DP grids: the same per axis, so rows and columns both stay
+  bounded;
+* dicts / adjacency lists: the first :data:`MAX_ENTRIES` keys plus any focus
+  keys.
+
+Elided runs are replaced by an ``{"elided": n}`` marker in place (an elided
+dict run becomes the key ``"..."``), and the scene carries the true size
+(``length`` / ``shape`` / ``num_entries``) and the windows shown as
+``[start, end)`` index pairs, so cell ``k`` of the window can be mapped back
+to its real index.
+
+Focus is what the learner is looking at: the indices **written** by the line
+that just ran or is about to run (``a[j + 1] = key`` -> ``j + 1``, from the
+store targets in :class:`~engine.lines.LineInfo`, evaluated side-effect free),
+then integer locals that fall inside the value (``i``, ``j``, ``lo``, ``hi``
+... -- the same pointers the UI draws). Neither depends on the value's length,
+so a windowed step costs the same for 10^3 and 10^6 elements.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any
+
+from . import scope as scope_mod
+from .serialize import json_safe
+
+MAX_ITEMS = 512        # array cells shown before windowing kicks in
+EDGE = 32              # cells kept at each end of a windowed array
+RADIUS = 16            # cells kept on each side of a focus index
+MAX_FOCUS = 8          # focus indices honoured per value
+MAX_ROWS = 64          # matrix rows / columns shown before windowing
+MAX_ENTRIES = 512      # dict / adjacency-list keys shown
+
+ELIDED_KEY = "..."
+
+
+def windows(n: int, focus=(), edge: int = EDGE, radius: int = RADIUS) -> list:
+    """Merged, sorted ``[start, end)`` ranges covering head, tail and focus."""
+    spans = [(0, min(n, edge)), (max(0, n - edge), n)]
+    picked = [k + n if k < 0 else k for k in focus
+              if type(k) is int and -n <= k < n][:MAX_FOCUS]
+    spans += [(max(0, k - radius), min(n, k + radius + 1)) for k in picked]
+    spans.sort()
+    merged: list = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _take(seq, spans: list, conv) -> list:
+    out, pos = [], 0
+    for start, end in spans:
+        if start > pos:
+            out.append({"elided": start - pos})
+        out.extend(conv(v) for v in seq[start:end])
+        pos = end
+    if pos < len(seq):
+        out.append({"elided": len(seq) - pos})
+    return out
+
+
+def cap_sequence(seq, focus=()) -> dict | None:
+    """Windowed ``{"values", "length", "windows"}`` for a long sequence, or
+    ``None`` when it is short enough to ship whole."""
+    if len(seq) <= MAX_ITEMS:
+        return None
+    if not isinstance(seq, (list, tuple)):
+        seq = list(seq)
+    spans = windows(len(seq), focus)
+    return {"values": _take(seq, spans, json_safe), "length": len(seq), "windows": spans}
+
+
+def cap_matrix(rows, focus=()) -> dict | None:
+    """Windowed ``{"rows", "shape", "row_windows", "col_windows"}`` or ``None``."""
+    n_rows = len(rows)
+    n_cols = max((len(r) for r in rows), default=0)
+    if n_rows <= MAX_ROWS and n_cols <= MAX_ROWS:
+        return None
+    edge, radius = MAX_ROWS // 4, MAX_ROWS // 8
+    row_spans = windows(n_rows, focus, edge, radius)
+    col_spans = windows(n_cols, focus, edge, radius)
+
+    def row(r):
+        return _take(r, col_spans, json_safe) if isinstance(r, (list, tuple)) else json_safe(r)
+
+    return {"rows": _take(rows, row_spans, row), "shape": [n_rows, n_cols],
+            "row_windows": row_spans, "col_windows": col_spans}
+
+
+def cap_mapping(d: dict, focus=()) -> dict | None:
+    """The first :data:`MAX_ENTRIES` items plus focus keys (values made JSON-safe),
+    with the rest counted under :data:`ELIDED_KEY`; ``None`` if small enough."""
+    if len(d) <= MAX_ENTRIES:
+        return None
+    out = {}
+    for k in list(focus)[:MAX_FOCUS]:
+        try:
+            if k in d:
+                out[str(k)] = _entry(d[k])
+        except TypeError:                 # unhashable focus value
+            pass
+    for k, v in d.items():
+        if len(out) >= MAX_ENTRIES:
+            break
+        if str(k) not in out:
+            out[str(k)] = _entry(v)
+    out[ELIDED_KEY] = {"elided": len(d) - len(out)}
+    return out
+
+
+def _entry(v):
+    """A dict value; long neighbour lists are windowed like arrays."""
+    if isinstance(v, (list, tuple, set, frozenset)) and len(v) > MAX_ITEMS:
+        seq = list(v)
+        return _take(seq, windows(len(seq)), json_safe)
+    return json_safe(v)
+
+
+def write_focus(name: str, infos, frame_locals, frame_globals) -> list:
+    """Indices of ``name`` written by the lines in ``infos`` (the line about to
+    run and the one that just ran), evaluated in the current frame. Uses the
+    precomputed store targets (``LineInfo.writes``), so it costs O(1) however
+    long the value is."""
+    out: list = []
+    for info in infos:
+        for target, indices in info.writes:
+            if target != name:
+                continue
+            for src in indices:
+                try:
+                    out.append(scope_mod.eval_expr(src, frame_locals, frame_globals))
+                except Exception:
+                    pass
+    return out
+
+
+_CONTAINERS = frozenset({list, tuple, dict, set, frozenset, deque})
+
+
+def is_large(val: Any) -> bool:
+    """Would this value's scene be windowed? (Built-in containers only, so no
+    user ``__len__`` runs inside the trace hook.)"""
+    if type(val) not in _CONTAINERS:
+        return False
+    n = len(val)
+    if n > MAX_ITEMS or n > MAX_ENTRIES:
+        return True
+    if type(val) is list and n and type(val[0]) in (list, tuple):
+        return n > MAX_ROWS or len(val[0]) > MAX_ROWS
+    return False
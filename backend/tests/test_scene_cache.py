@@ -0,0 +1,39 @@
+"""The scene cache must never serve a stale scene.
+
+Each program changes a cached value through a builtin that calls a mutator
+(``map(a.__setitem__, ...)``, ``map(setattr, ...)``) -- a write with no trace
+event of its own -- and then runs one more line, so the last step's scene is
+only right if the cache noticed.
+"""
+
+from engine import run_code
+
+
+def _last_locals(code: str) -> dict:
+    env = run_code(code)
+    assert env["meta"]["error"] is None
+    return env["steps"][-1]["locals"]
+
+
+def test_map_bound_setitem_on_list():
+    code = ("a = list(range(100))\n"
+            "list(map(a.__setitem__, [37], [-1]))\n"
+            "x = 1\n")
+    assert _last_locals(code)["a"][37] == -1
+
+
+def test_map_bound_setitem_on_dict():
+    code = ("d = {k: k for k in range(40)}\n"
+            "list(map(d.__setitem__, [20], [-1]))\n"
+            "x = 1\n")
+    assert _last_locals(code)["d"]["fields"]["20"] == -1
+
+
+def test_map_setattr_on_instance():
+    code = ("class O:\n"
+            "    def __init__(self):\n"
+            + "".join(f"        self.f{i} = {i}\n" for i in range(20)) +
+            "o = O()\n"
+            "list(map(setattr, [o], ['f10'], [555]))\n"
+            "x = 1\n")
+    assert _last_locals(code)["o"]["fields"]["f10"] == 555
@@ -3,12 +3,53 @@
 Endpoints
 ---------
 GET  /health           -> liveness probe
-POST /trace            -> {code, max_steps?, stdin?} -> normalized Trace envelope
+POST /trace            -> {code, max_steps?, stdin?, format?, fast_forward?,
+                           viewport?}
+                          -> normalized Trace envelope
+                          (format "full" (default) or "delta": changed locals only,
+                          lists / trees as node-level patches, with a full
+                          keyframe every ``keyframe_every`` steps,
+                          or "shared": each distinct scene once, then refs,
+                          or "heap": list / tree locals as pointers into a
+                          per-step ``heap`` table of nodes;
+                          fast_forward: finish the program unrecorded after
+                          max_steps instead of stopping it;
+                          viewport: window large arrays / matrices / dicts,
+                          see ``engine/viewport.py``)
+                          encoding="compact" (or ``Accept:
+                          application/x-trace-compact``) returns the binary
+                          envelope of ``engine/compact.py`` instead of JSON
+POST /trace/stream     -> same request, streamed as NDJSON (default) or Server-Sent
+                          Events (``Accept: text/event-stream`` or transport="sse"):
+                          a meta record, one record per step, then a final meta
+                          with output / error / truncated / analysis
 POST /run-reference    -> run a reference solution for AI bug-diff (see ai layer)
+POST /cache/invalidate -> drop cached traces after the engine changed under a
+                          running worker, and recycle the engine pool so it
+                          runs the new code (no pool: restart instead)
+GET  /perf             -> per-phase timings aggregated across requests
+GET  /metrics          -> Prometheus text format: latency by outcome, steps and
+                          bytes per trace, in-flight / queued, cache, RSS
 
 Run (kept warm):
     uvicorn worker.app:app --host 127.0.0.1 --port 8000 --workers 1
 
+Each trace runs in a pre-warmed engine process (``worker/pool.py``), so
+concurrent requests never share the process-global trace hook / stdout and
+one box uses all its cores. ``TRACE_POOL_SIZE`` (default: CPU count) sizes the
+pool; ``TRACE_POOL_SIZE=0`` traces in-process, as before.
+
+Finished traces are cached by content (``worker/cache.py``): a repeated
+request is answered from memory (or the optional disk tier) without tracing.
+``TRACE_CACHE_MB`` sizes it (0 disables), ``TRACE_CACHE_DIR`` adds the disk tier.
+
+``"perf": true`` on a request adds per-phase timings under ``meta.perf``
+(``engine/perf.py``; such responses bypass the cache). ``TRACE_PERF=1`` times
+every request; ``GET /perf`` serves the timings aggregated across requests.
+
+Set ``TRACE_BACKEND=auto`` (or ``monitoring``) to trace with PEP 669
+``sys.monitoring`` on Python 3.12+; the default is ``settrace``.
+
 This service is INTERNAL. Only the Node gateway should call it; do not expose
 it publicly. All real isolation (container, no network, resource limits) is
 expected to wrap this process in production.
@@ -16,40 +57,268 @@ expected to wrap this process in production.
 
 from __future__ import annotations
 
+import os
 import sys
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Literal
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 # Allow "import engine" when launched from the backend/ directory.
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from engine import run_code  # noqa: E402
+from engine import compact  # noqa: E402
+from engine import perf as perf_mod  # noqa: E402
+from engine.delta import DEFAULT_KEYFRAME_EVERY  # noqa: E402
+from engine.stream import iter_trace, ndjson_lines, sse_lines  # noqa: E402
+from worker import cache as cache_mod  # noqa: E402
+from worker import metrics as metrics_mod  # noqa: E402
+from worker import pool as pool_mod  # noqa: E402
+
+TRACE_BACKEND = os.environ.get("TRACE_BACKEND", "settrace")
+# Recorded steps are kept JSON-encoded and spilled to disk past this budget
+# (engine/store.py); 0 keeps them as plain dicts in memory.
+TRACE_STEP_MEMORY_MB = float(os.environ.get("TRACE_STEP_MEMORY_MB", 64))
+# Time every request (aggregated for GET /perf), not only those asking for it.
+TRACE_PERF = os.environ.get("TRACE_PERF", "") not in ("", "0")
+
+_pool: pool_mod.TracePool | None = None
+_cache: cache_mod.TraceCache | None = None
+
+# -- metrics (GET /metrics) -------------------------------------------------- #
+METRICS = metrics_mod.Registry()
+REQUEST_SECONDS = METRICS.histogram(
+    "trace_request_duration_seconds",
+    "Trace request latency by endpoint and outcome (ok, user_error, unsafe, "
+    "truncated, timeout, rejected, internal, cached)", ("endpoint", "outcome"))
+STEPS = METRICS.histogram("trace_steps", "Recorded steps per traced request",
+                          ("endpoint",), metrics_mod.STEP_BUCKETS)
+RESPONSE_BYTES = METRICS.histogram("trace_response_bytes", "Response body size",
+                                   ("endpoint",), metrics_mod.BYTE_BUCKETS)
+IN_FLIGHT = METRICS.gauge("trace_in_flight_requests", "Trace requests being served")
+STREAMS = METRICS.counter("trace_stream_requests_total", "Streamed trace requests",
+                          ("transport",))
+METRICS.gauge("trace_queued_requests", "Requests waiting for a free engine process",
+              fn=lambda: _pool.queued if _pool is not None else 0)
+METRICS.gauge("trace_pool_busy", "Engine processes running a job",
+              fn=lambda: _pool.in_flight if _pool is not None else None)
+METRICS.counter("trace_pool_replaced_total", "Engine processes replaced, by reason",
+                ("reason",), fn=lambda: None if _pool is None else {
+                    "recycled": _pool.recycled, "crashed": _pool.crashed,
+                    "timed_out": _pool.timed_out})
+METRICS.counter("trace_cache_lookups_total", "Trace cache lookups by result",
+                ("result",), fn=lambda: None if _cache is None else {
+                    "hit": _cache.hits - _cache.disk_hits,
+                    "disk_hit": _cache.disk_hits, "miss": _cache.misses})
+METRICS.gauge("trace_cache_hit_ratio", "Trace cache hits / lookups",
+              fn=lambda: None if _cache is None else _cache.stats()["hit_rate"])
+METRICS.gauge("trace_cache_bytes", "Bytes held by the in-memory trace cache",
+              fn=lambda: None if _cache is None else _cache.stats()["bytes"])
+METRICS.gauge("process_resident_memory_bytes", "RSS of the worker process",
+              fn=metrics_mod.process_rss_bytes)
+METRICS.gauge("trace_pool_children_rss_bytes",
+              "Sum of the engine processes' peak RSS (as of their last job)",
+              fn=lambda: None if _pool is None else _pool.stats()["children_rss_kb"] * 1024)
+
 
-app = FastAPI(title="DSA Visualizer Trace Worker", version="0.1")
+@asynccontextmanager
+async def lifespan(_app):
+    global _pool, _cache
+    _cache = cache_mod.from_env()
+    _pool = pool_mod.from_env()
+    if _pool is not None:
+        _pool.start()
+    try:
+        yield
+    finally:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+app = FastAPI(title="DSA Visualizer Trace Worker", version="0.1", lifespan=lifespan)
 
 
 class TraceRequest(BaseModel):
     code: str = Field(..., description="Python source to trace")
     max_steps: int = Field(5000, ge=1, le=50000)
     stdin: str = Field("", description="Input fed to input()/sys.stdin")
+    format: Literal["full", "delta", "shared", "heap"] = Field(
+        "full", description="Step format: full locals per step, deltas + keyframes, "
+                            "scene references (each distinct scene sent once), "
+                            "or list / tree locals as {\"ref\": node id} into a "
+                            "per-step node table (each node sent once per step)")
+    keyframe_every: int = Field(DEFAULT_KEYFRAME_EVERY, ge=1, le=10000)
+    fast_forward: bool = Field(
+        False, description="At max_steps stop recording but run the program to the "
+                           "end (output, error and final variables cover the whole run)")
+    viewport: bool = Field(
+        False, description="Window the scenes of large arrays, matrices and dicts: "
+                           "elided runs become {\"elided\": n} markers and the scene "
+                           "carries its true size and the [start, end) windows shown")
+    encoding: Literal["json", "compact"] | None = Field(
+        None, description="Response body: JSON envelope or the compact binary one "
+                          "(always full steps); defaults from the Accept header. "
+                          "Ignored by /trace/stream")
+    perf: bool = Field(
+        False, description="Add per-phase timings under meta.perf (bypasses the cache). "
+                           "Ignored by /trace/stream")
 
 
 @app.get("/health")
 def health() -> dict:
-    return {"ok": True, "service": "trace-worker"}
+    out = {"ok": True, "service": "trace-worker", "backend": TRACE_BACKEND}
+    if _pool is not None:
+        out["pool"] = _pool.stats()
+    if _cache is not None:
+        out["cache"] = _cache.stats()
+    return out
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    return Response(content=METRICS.render(), media_type=metrics_mod.CONTENT_TYPE)
+
+
+@app.get("/perf")
+def perf() -> dict:
+    return {"enabled": TRACE_PERF, **perf_mod.AGGREGATE.stats()}
+
+
+@app.post("/cache/invalidate")
+def cache_invalidate() -> dict:
+    """Pick up engine code changed on disk: retire the pool's children (they
+    still run the engine they imported) and re-key the cache. Without a pool
+    the engine runs in this process and only a restart reloads it."""
+    out: dict = {"ok": True}
+    if _pool is not None:
+        out["recycled"] = _pool.recycle()
+    if _cache is None:
+        out["cache"] = None
+    else:
+        out["version"] = _cache.invalidate()
+    return out
+
+
+def _job(req: TraceRequest) -> dict:
+    return {"code": req.code, "max_steps": req.max_steps, "stdin": req.stdin,
+            "step_format": req.format, "keyframe_every": req.keyframe_every,
+            "backend": TRACE_BACKEND, "fast_forward": req.fast_forward,
+            "viewport": req.viewport}
+
+
+def _encoding(req: TraceRequest, request: Request) -> str:
+    if req.encoding is not None:
+        return req.encoding
+    return "compact" if compact.MEDIA_TYPE in request.headers.get("accept", "") else "json"
+
+
+def _outcome(meta: dict) -> str:
+    failure = meta.get("failure")
+    if failure:
+        return {"timeout": "timeout", "busy": "rejected"}.get(failure, "internal")
+    if meta.get("unsafe"):
+        return "unsafe"
+    if cache_mod.timed_out(meta):
+        return "timeout"
+    if meta.get("error"):
+        return "user_error"
+    return "truncated" if meta.get("truncated") else "ok"
+
+
+def _run(req: TraceRequest, request: Request, endpoint: str) -> Response:
+    """Serve one trace request and record its metrics."""
+    t0 = time.perf_counter()
+    IN_FLIGHT.inc()
+    outcome = "internal"
+    try:
+        response, meta = _serve(req, request)
+        outcome = "cached" if meta is None else _outcome(meta)
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - t0,
+                                endpoint=endpoint, outcome=outcome)
+    if meta is not None:
+        STEPS.observe(meta.get("num_steps") or 0, endpoint=endpoint)
+    RESPONSE_BYTES.observe(len(response.body), endpoint=endpoint)
+    return response
+
+
+def _serve(req: TraceRequest, request: Request) -> tuple[Response, dict | None]:
+    """The response, plus the run's meta summary (``None`` for a cache hit)."""
+    job = _job(req)
+    if TRACE_STEP_MEMORY_MB > 0:
+        job["memory_budget"] = int(TRACE_STEP_MEMORY_MB * 1024 * 1024)
+    encoding = _encoding(req, request)
+    media_type = "application/json"
+    if encoding == "compact":
+        job["step_format"] = "full"      # compact shares unchanged scenes itself
+        job["encoding"] = encoding
+        media_type = compact.MEDIA_TYPE
+    key = version = None
+    if _cache is not None and not req.perf:     # fresh timings are never cached
+        version = _cache.version
+        key = _cache.key(job)
+        body = _cache.get(key)
+        if body is not None:
+            return Response(content=body, media_type=media_type,
+                            headers={"X-Trace-Cache": "hit"}), None
+    run = dict(job)
+    if req.perf or TRACE_PERF:
+        run["perf"] = True
+        run["perf_body"] = req.perf
+    if _pool is None:
+        env = run_code(**{k: v for k, v in run.items()
+                          if k not in ("encoding", "perf_body")})
+        body, meta = pool_mod.encode(env, encoding, req.perf)
+    else:
+        # The child already JSON-encoded the envelope; pass the bytes straight on.
+        body, meta = _pool.run(**run)
+    perf_mod.AGGREGATE.merge(meta.get("perf"))
+    # A run that straddled /cache/invalidate may come from the old engine.
+    if key is not None and _cache.version == version and cache_mod.cacheable(meta, job):
+        _cache.put(key, body)
+    return Response(content=body, media_type=media_type), meta
 
 
 @app.post("/trace")
-def trace(req: TraceRequest) -> dict:
+def trace(req: TraceRequest, request: Request):
     if not req.code.strip():
         return {"meta": {"error": "No code provided.", "num_steps": 0}, "steps": []}
-    return run_code(req.code, max_steps=req.max_steps, stdin=req.stdin)
+    return _run(req, request, "trace")
+
+
+class StreamRequest(TraceRequest):
+    transport: Literal["ndjson", "sse"] | None = Field(
+        None, description="Framing; defaults from the Accept header, else ndjson")
+
+
+@app.post("/trace/stream")
+def trace_stream(req: StreamRequest, request: Request) -> StreamingResponse:
+    transport = req.transport
+    if transport is None:
+        accept = request.headers.get("accept", "")
+        transport = "sse" if "text/event-stream" in accept else "ndjson"
+    STREAMS.inc(transport=transport)
+    if not req.code.strip():
+        records = iter([("end", {"error": "No code provided.", "num_steps": 0})])
+    elif _pool is not None:
+        records = _pool.stream(**_job(req))
+    else:
+        records = iter_trace(**_job(req))
+    if transport == "sse":
+        return StreamingResponse(sse_lines(records), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+    return StreamingResponse(ndjson_lines(records), media_type="application/x-ndjson")
 
 
 @app.post("/run-reference")
-def run_reference(req: TraceRequest) -> dict:
+def run_reference(req: TraceRequest, request: Request):
     """Trace a reference solution. Used by the AI bug-diff feature to compare
     the user's execution path against a known-correct one."""
-    return run_code(req.code, max_steps=req.max_steps, stdin=req.stdin)
+    return _run(req, request, "run_reference")
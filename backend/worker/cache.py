@@ -0,0 +1,216 @@
+"""Content-addressed cache of finished traces.
+
+Most traffic is the same canonical programs (docs examples, demos, popular
+problems with their default stdin), and a trace is a pure function of its
+request plus the engine that produced it. So ``/trace`` keys each job by
+
+    sha256(engine fingerprint, code, stdin, max_steps, format, backend, ...)
+
+and keeps the **already JSON-encoded** envelope: a hit is a dict lookup that
+returns bytes, with no tracing and no re-serialization.
+
+Tiers:
+  * memory -- LRU under a byte budget (``TRACE_CACHE_MB``);
+  * disk   -- optional (``TRACE_CACHE_DIR``), one file per entry under a
+    directory per engine fingerprint, so it survives restarts and is shared by
+    every worker process on the box. A disk hit is promoted into memory.
+
+Invalidation: the engine fingerprint is a hash of every ``engine/*.py`` source
+file, so a deploy that changes the engine never serves stale traces. Call
+``POST /cache/invalidate`` after changing the engine under a running worker:
+it recycles the engine pool (its children still hold the old modules) and
+then :meth:`TraceCache.invalidate` recomputes the fingerprint, empties memory
+and drops disk entries written by other engine versions. Without a pool the
+engine is loaded in the worker process itself, so only a restart picks the
+new code up.
+
+Only reproducible results are stored (see :func:`cacheable`): a run that hit the
+wall-clock limit, a pool error, or a program that imports ``random`` / ``time``
+is always traced afresh.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parent.parent / "engine"
+
+DEFAULT_MAX_MB = 64
+# Programs importing these can print something different on every run.
+NONDETERMINISTIC_MODULES = frozenset({"random", "time", "datetime", "secrets", "uuid"})
+
+
+def engine_fingerprint(root: Path = ENGINE_DIR) -> str:
+    """Short hash of the engine's source (plus the interpreter version)."""
+    h = hashlib.sha256(sys.version.encode())
+    for path in sorted(root.rglob("*.py")):
+        h.update(str(path.relative_to(root)).encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def _imports_nondeterministic(code: str) -> bool:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+        else:
+            continue
+        if any(n.split(".")[0] in NONDETERMINISTIC_MODULES for n in names):
+            return True
+    return False
+
+
+def timed_out(meta: dict) -> bool:
+    """Was this run stopped by the wall clock (not the step cap)? ``run_code``
+    records it as ``meta.timed_out``."""
+    return bool(meta.get("timed_out"))
+
+
+def cacheable(meta: dict, job: dict) -> bool:
+    """Would re-running ``job`` produce this exact envelope again?"""
+    if meta.get("failure"):
+        return False                    # the pool failed (busy / crash / kill)
+    if timed_out(meta):
+        return False
+    return not _imports_nondeterministic(job.get("code", ""))
+
+
+class TraceCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 disk_dir: str | os.PathLike | None = None,
+                 version: str | None = None):
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entry = self.max_bytes // 4     # one trace never evicts everything
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.version = version or engine_fingerprint()
+        self._mem: OrderedDict = OrderedDict()   # key -> bytes, oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    # -- keys -------------------------------------------------------------- #
+    def key(self, job: dict) -> str:
+        """Content address of a job (every field that can change the trace)."""
+        blob = json.dumps([self.version, job], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / self.version / key[:2] / (key + ".json")
+
+    # -- lookup / store ---------------------------------------------------- #
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            body = self._mem.get(key)
+            if body is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return body
+        if self.disk_dir is not None:
+            try:
+                body = self._disk_path(key).read_bytes()
+            except OSError:
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._remember(key, body)
+                return body
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, body: bytes) -> None:
+        with self._lock:
+            self.stores += 1
+        self._remember(key, body)
+        if self.disk_dir is not None:
+            self._write_disk(key, body)
+
+    def _remember(self, key: str, body: bytes) -> None:
+        if len(body) > self.max_entry:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._mem[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, dropped = self._mem.popitem(last=False)
+                self._size -= len(dropped)
+                self.evictions += 1
+
+    def _write_disk(self, key: str, body: bytes) -> None:
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename: concurrent readers never see a partial file.
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(body)
+            os.replace(tmp, path)
+        except OSError:
+            pass                        # the disk tier is best-effort
+
+    # -- invalidation / stats ---------------------------------------------- #
+    def invalidate(self, version: str | None = None) -> str:
+        """Drop everything cached by any other engine version; returns the
+        (re)computed fingerprint now in use."""
+        with self._lock:
+            self.version = version or engine_fingerprint()
+            self._mem.clear()
+            self._size = 0
+        if self.disk_dir is not None and self.disk_dir.is_dir():
+            for child in self.disk_dir.iterdir():
+                if child.is_dir() and child.name != self.version:
+                    shutil.rmtree(child, ignore_errors=True)
+        return self.version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self._mem),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "disk": str(self.disk_dir) if self.disk_dir else None,
+        }
+
+
+def from_env() -> TraceCache | None:
+    """Cache configured from ``TRACE_CACHE_*`` env vars; ``None`` if disabled.
+
+    TRACE_CACHE_MB   in-memory budget in MiB (default 64; 0 = no cache)
+    TRACE_CACHE_DIR  enable the on-disk tier in this directory
+    """
+    mb = float(os.environ.get("TRACE_CACHE_MB", DEFAULT_MAX_MB))
+    if mb <= 0:
+        return None
+    return TraceCache(int(mb * 1024 * 1024),
+                      disk_dir=os.environ.get("TRACE_CACHE_DIR") or None)
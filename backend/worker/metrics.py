@@ -0,0 +1,186 @@
+"""Prometheus text-format metrics for the trace workers (no client library).
+
+Both workers (``worker/app.py`` and ``cpp-worker/app.py``) serve
+``GET /metrics`` from a :class:`Registry`. Three metric kinds cover what
+they need:
+
+* :class:`Counter`   -- monotonically increasing totals;
+* :class:`Gauge`     -- a value that goes up and down;
+* :class:`Histogram` -- cumulative ``le`` buckets plus ``_sum`` / ``_count``.
+
+Counters and gauges can instead be given ``fn``, read at scrape time, for
+values some other object already keeps (pool queue length, cache hit counts,
+RSS ...); it returns a number, or ``{label value(s): number}``.
+
+Every metric takes label names up front; values are recorded with keyword
+labels (``LATENCY.observe(0.12, outcome="ok")``). Recording is a dict update
+under one lock, so it is safe from FastAPI's threadpool.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STEP_BUCKETS = (10, 50, 100, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+BYTE_BUCKETS = tuple(1024 * 4 ** k for k in range(10))      # 1 KiB .. 256 MiB
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self._lock = registry._lock
+        self._values: dict = {}
+        registry._metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name}: expected labels {self.label_names}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def _samples(self):
+        if self.fn is None:
+            for key, value in self._values.items():
+                yield self.name, tuple(zip(self.label_names, key)), value
+            return
+        value = self.fn()
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            value = {(): value}
+        for key, v in value.items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, tuple(zip(self.label_names, key)), v
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{_labels(pairs)} {_fmt(value)}"
+                  for name, pairs, value in self._samples()]
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for k, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[k] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        for key, (counts, total, count) in self._values.items():
+            pairs = tuple(zip(self.label_names, key))
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                yield self.name + "_bucket", pairs + (("le", _fmt(bound)),), running
+            yield self.name + "_sum", pairs, total
+            yield self.name + "_count", pairs, count
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: list = []
+
+    def counter(self, name, help, labels=(), fn=None) -> Counter:
+        return Counter(self, name, help, labels, fn)
+
+    def gauge(self, name, help, labels=(), fn=None) -> Gauge:
+        return Gauge(self, name, help, labels, fn)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return Histogram(self, name, help, labels, buckets)
+
+    def render(self) -> str:
+        """The text exposition of every metric (``fn`` metrics are read now)."""
+        lines = []
+        for metric in self._metrics:
+            if metric.fn is not None:
+                lines += metric.render()         # fn may take its own locks
+                continue
+            with self._lock:
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> int | None:
+    """Current resident set size of this process (Linux ``/proc``; else the
+    peak from ``getrusage``; ``None`` where neither is available)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
@@ -0,0 +1,391 @@
+"""Pre-warmed pool of engine processes behind the trace worker.
+
+``run_code`` mutates process-global state (the trace hook, ``sys.stdout``,
+``sys.stdin``), so two traces must never share a process at the same time.
+Each pool slot is a long-lived child process that has already imported the
+engine; a request borrows one idle child, sends it the job over a pipe and gets
+back the finished envelope **already encoded** -- JSON, or the compact binary
+form for ``encoding="compact"`` jobs (encoding runs on the child's core too).
+
+Lifecycle rules:
+  * a job that outlives ``max_seconds + job_grace`` gets its child killed and
+    replaced -- the request gets a ``truncated`` error envelope, the server
+    keeps going;
+  * a child that dies mid-job (segfault, OOM kill) is replaced the same way;
+  * a child is recycled after ``max_jobs`` jobs, or once its peak RSS passes
+    ``max_rss_mb`` (where the platform can report it);
+  * :meth:`TracePool.recycle` retires every child at once (idle ones now,
+    busy ones when their job ends), so engine code changed on disk is
+    re-imported -- ``POST /cache/invalidate`` calls it;
+  * replacements are spawned in the background so recycling adds no latency
+    to the request that triggered it.
+
+Configured from the environment by :func:`from_env` (``TRACE_POOL_*``).
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+from engine import perf as perf_mod
+from engine.stream import stream_head
+
+try:
+    import resource
+except ImportError:          # Windows: no RSS-based recycling
+    resource = None
+
+DEFAULT_MAX_JOBS = 200
+DEFAULT_MAX_RSS_MB = 512
+DEFAULT_JOB_GRACE = 5.0       # seconds on top of the engine's own max_seconds
+DEFAULT_QUEUE_TIMEOUT = 30.0  # max wait for a free child
+
+
+class PoolBusy(Exception):
+    """No child became free within the queue timeout."""
+
+
+def _peak_rss_kb() -> int:
+    if resource is None:
+        return 0
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if os.uname().sysname == "Darwin" else peak
+
+
+def _summary(meta: dict) -> dict:
+    """The few meta fields the parent needs without decoding the body."""
+    out = {k: meta.get(k) for k in ("truncated", "timed_out", "num_steps", "error")}
+    if meta.get("unsafe"):
+        out["unsafe"] = True
+    if "fast_forward" in meta:
+        out["fast_forward"] = meta["fast_forward"]
+    return out
+
+
+def encode(env: dict, encoding: str = "json", perf_body: bool = True) -> tuple[bytes, dict]:
+    """Encode a finished envelope for the response; returns ``(body, summary)``.
+
+    With ``perf`` timing on, the response encoding is timed as phase
+    ``respond`` and the report travels in ``summary["perf"]`` -- and stays in
+    the body only if ``perf_body`` (the client asked for it).
+    """
+    from engine.compact import encode_envelope
+    from engine.store import encode_json
+
+    meta = env["meta"]
+    report = meta.get("perf") if perf_body else meta.pop("perf", None)
+    t0 = time.perf_counter_ns()
+    body = encode_envelope(env) if encoding == "compact" else encode_json(env)
+    summary = _summary(meta)
+    if report is not None:
+        perf_mod.add_phase(report, "respond", time.perf_counter_ns() - t0)
+        summary["perf"] = report
+    return body, summary
+
+
+def _child_main(conn) -> None:
+    """Child loop: import the engine once, then serve jobs until told to stop."""
+    from engine import run_code
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        kind, kwargs = job
+        encoding = kwargs.pop("encoding", "json")
+        perf_body = kwargs.pop("perf_body", True)
+        try:
+            if kind == "stream":
+                def on_step(step):
+                    conn.send(("step", step))
+                env = run_code(**kwargs, on_step=on_step)
+                conn.send(("end", env["meta"], _peak_rss_kb()))
+            else:
+                env = run_code(**kwargs)
+                conn.send(("done", encode(env, encoding, perf_body), _peak_rss_kb()))
+        except Exception as exc:  # engine bug: report it, keep the child
+            conn.send(("failed", type(exc).__name__ + ": " + str(exc)[:200],
+                       _peak_rss_kb()))
+
+
+class _Child:
+    def __init__(self, ctx, generation: int = 0):
+        self.generation = generation      # TracePool.generation at spawn
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=_child_main, args=(child_conn,),
+                                name="trace-engine", daemon=True)
+        self.proc.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss_kb = 0
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.join(1.0)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def close(self) -> None:
+        try:
+            self.conn.send(None)
+            self.proc.join(1.0)
+        except Exception:
+            pass
+        if self.proc.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+def _error_envelope(error: str, truncated: bool = False) -> dict:
+    # The pool only ever truncates a job by killing it at its time limit.
+    return {"meta": {"language": "python", "error": error, "truncated": truncated,
+                     "timed_out": truncated, "num_steps": 0, "output": ""},
+            "steps": []}
+
+
+def _failed(error: str, failure: str, truncated: bool = False) -> tuple[bytes, dict]:
+    env = _error_envelope(error, truncated)
+    summary = _summary(env["meta"])
+    summary["failure"] = failure
+    return json.dumps(env).encode("utf-8"), summary
+
+
+class TracePool:
+    def __init__(self, size: int, max_jobs: int = DEFAULT_MAX_JOBS,
+                 max_rss_mb: int = DEFAULT_MAX_RSS_MB,
+                 job_grace: float = DEFAULT_JOB_GRACE,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+                 start_method: str = "spawn"):
+        self.size = max(1, int(size))
+        self.max_jobs = max_jobs
+        self.max_rss_kb = max_rss_mb * 1024 if max_rss_mb else 0
+        self.job_grace = job_grace
+        self.queue_timeout = queue_timeout
+        self._ctx = mp.get_context(start_method)
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.in_flight = 0
+        self.queued = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.timed_out = 0
+        self.generation = 0                   # bumped by recycle()
+        self._rss_kb: dict = {}               # child pid -> last reported peak RSS
+
+    # -- lifecycle --------------------------------------------------------- #
+    def start(self) -> "TracePool":
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        return self
+
+    def _spawn(self) -> _Child:
+        return _Child(self._ctx, self.generation)
+
+    def recycle(self) -> int:
+        """Retire every child: idle ones are replaced now, busy ones once their
+        job ends. Returns how many were replaced right away."""
+        with self._lock:
+            self.generation += 1
+        replaced = 0
+        while True:
+            try:
+                child = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.recycled += 1
+            self._replace(child, kill=False)
+            replaced += 1
+        return replaced
+
+    def _stale(self, child: _Child) -> bool:
+        return child.generation != self.generation
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _replace(self, child: _Child, kill: bool) -> None:
+        self._rss_kb.pop(child.proc.pid, None)
+
+        def work():
+            child.kill() if kill else child.close()
+            if not self._closed:
+                self._idle.put(self._spawn())
+        threading.Thread(target=work, name="trace-pool-respawn", daemon=True).start()
+
+    def _acquire(self) -> _Child:
+        with self._lock:
+            self.queued += 1
+        try:
+            child = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.queued -= 1
+            raise PoolBusy("all trace workers are busy") from None
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        if not child.proc.is_alive():        # died while idle
+            self.crashed += 1
+            child.kill()
+            child = self._spawn()
+        elif self._stale(child):             # spawned just before a recycle()
+            self.recycled += 1
+            child.close()
+            child = self._spawn()
+        return child
+
+    def _release(self, child: _Child, rss_kb: int = 0) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        child.jobs += 1
+        child.rss_kb = rss_kb or child.rss_kb
+        self._rss_kb[child.proc.pid] = child.rss_kb
+        if child.jobs >= self.max_jobs or self._stale(child) or \
+                (self.max_rss_kb and child.rss_kb > self.max_rss_kb):
+            self.recycled += 1
+            self._replace(child, kill=False)
+        else:
+            self._idle.put(child)
+
+    def _abandon(self, child: _Child, timed_out: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        if timed_out:
+            self.timed_out += 1
+        else:
+            self.crashed += 1
+        self._replace(child, kill=True)
+
+    def _recv(self, child: _Child, deadline: float):
+        """Next message from ``child``; ``None`` on timeout, EOFError on crash."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not child.conn.poll(remaining):
+            return None
+        return child.conn.recv()
+
+    # -- jobs -------------------------------------------------------------- #
+    def run(self, **kwargs) -> tuple[bytes, dict]:
+        """Run one trace in a child.
+
+        Returns the encoded envelope plus a summary of its meta
+        (``truncated`` / ``num_steps`` / ``error`` ...). When the pool itself
+        failed the body is an error envelope and the summary names the
+        ``failure``: ``"busy"``, ``"crashed"``, ``"timeout"`` or ``"internal"``.
+        """
+        try:
+            child = self._acquire()
+        except PoolBusy as exc:
+            return _failed(str(exc), "busy")
+        timeout = kwargs.get("max_seconds", 8.0) + self.job_grace
+        try:
+            child.conn.send(("run", kwargs))
+            msg = self._recv(child, time.monotonic() + timeout)
+        except (EOFError, OSError):
+            self._abandon(child, timed_out=False)
+            return _failed("Trace worker crashed.", "crashed")
+        if msg is None:
+            self._abandon(child, timed_out=True)
+            return _failed("Execution timed out.", "timeout", truncated=True)
+        kind, payload, rss_kb = msg
+        self._release(child, rss_kb)
+        if kind == "failed":
+            return _failed("Internal error: " + payload, "internal")
+        return payload
+
+    def stream(self, **kwargs):
+        """Run one trace in a child, yielding the same ``(kind, payload)``
+        records as :func:`engine.stream.iter_trace`."""
+        yield "meta", stream_head(kwargs.get("step_format", "full"),
+                                  kwargs.get("keyframe_every", 1),
+                                  kwargs.get("backend", "settrace"))
+        try:
+            child = self._acquire()
+        except PoolBusy as exc:
+            yield "end", _error_envelope(str(exc))["meta"]
+            return
+        # Only time spent waiting on the child counts towards the timeout,
+        # never time spent blocked on a slow HTTP client.
+        budget = kwargs.get("max_seconds", 8.0) + self.job_grace
+        done = False
+        try:
+            child.conn.send(("stream", kwargs))
+            while True:
+                t0 = time.monotonic()
+                msg = self._recv(child, t0 + budget)
+                budget -= time.monotonic() - t0
+                if msg is None:
+                    self._abandon(child, timed_out=True)
+                    done = True
+                    yield "end", _error_envelope("Execution timed out.", truncated=True)["meta"]
+                    return
+                if msg[0] == "step":
+                    yield "step", msg[1]
+                    continue
+                kind, payload, rss_kb = msg
+                self._release(child, rss_kb)
+                done = True
+                if kind == "failed":
+                    yield "end", _error_envelope("Internal error: " + payload)["meta"]
+                else:
+                    yield "end", payload
+                return
+        except (EOFError, OSError):
+            self._abandon(child, timed_out=False)
+            done = True
+            yield "end", _error_envelope("Trace worker crashed.")["meta"]
+        finally:
+            if not done:
+                # Client went away mid-stream: the child is still tracing.
+                self._abandon(child, timed_out=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "recycled": self.recycled,
+            "crashed": self.crashed,
+            "timed_out": self.timed_out,
+            "children_rss_kb": sum(self._rss_kb.values()),
+        }
+
+
+def from_env() -> TracePool | None:
+    """Pool configured from ``TRACE_POOL_*`` env vars; ``None`` if size is 0.
+
+    TRACE_POOL_SIZE        children (default: CPU count; 0 = trace in-process)
+    TRACE_POOL_MAX_JOBS    recycle a child after this many jobs
+    TRACE_POOL_MAX_RSS_MB  recycle a child once its peak RSS exceeds this
+    TRACE_POOL_JOB_GRACE   seconds allowed beyond max_seconds before a kill
+    TRACE_POOL_QUEUE_TIMEOUT  max seconds a request waits for a free child
+    """
+    size = int(os.environ.get("TRACE_POOL_SIZE", os.cpu_count() or 1))
+    if size <= 0:
+        return None
+    return TracePool(
+        size,
+        max_jobs=int(os.environ.get("TRACE_POOL_MAX_JOBS", DEFAULT_MAX_JOBS)),
+        max_rss_mb=int(os.environ.get("TRACE_POOL_MAX_RSS_MB", DEFAULT_MAX_RSS_MB)),
+        job_grace=float(os.environ.get("TRACE_POOL_JOB_GRACE", DEFAULT_JOB_GRACE)),
+        queue_timeout=float(os.environ.get("TRACE_POOL_QUEUE_TIMEOUT",
+                                           DEFAULT_QUEUE_TIMEOUT)),
+    )
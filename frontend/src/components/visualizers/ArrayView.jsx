@@ -4,6 +4,9 @@
 // (i, j, left, right, lo, hi, slow, fast ...), and — when the current step is
 // a SWAP — draws an animated double-headed arc between the two swapped cells
 // so the exchange reads as motion, not just a color change.
+// Windowed scenes (viewport on, engine/viewport.py) replace elided runs with
+// {elided: n} markers; those render as a gap and every shown cell keeps its
+// real index, so pointers, write highlights and swaps still line up.
 
 import { useRef, useState, useLayoutEffect } from "react";
 import { motion } from "framer-motion";
@@ -21,8 +24,29 @@ function cellsFrom(value) {
   return [];
 }
 
-export default function ArrayView({ name, value, step, highlightIndices = [] }) {
+const isElided = (c) =>
+  c !== null && typeof c === "object" && !Array.isArray(c) &&
+  typeof c.elided === "number" && Object.keys(c).length === 1;
+
+// -> { slots: [{ index, cell } | { gap, at }], length } with real indices.
+function slotsFrom(value) {
   const cells = cellsFrom(value);
+  const windowed = !Array.isArray(value) && Array.isArray(value?.windows);
+  const slots = [];
+  let index = 0;
+  for (const cell of cells) {
+    if (windowed && isElided(cell)) {
+      slots.push({ gap: cell.elided, at: index });
+      index += cell.elided;
+    } else {
+      slots.push({ index: index++, cell });
+    }
+  }
+  return { slots, length: windowed && value.length != null ? value.length : index };
+}
+
+export default function ArrayView({ name, value, step, highlightIndices = [] }) {
+  const { slots, length } = slotsFrom(value);
   const hi = new Set(highlightIndices);
 
   // The swap event (if any) on THIS array at THIS step -> animated arc.
@@ -43,15 +67,15 @@ export default function ArrayView({ name, value, step, highlightIndices = [] })
     const y = Math.min(a.offsetTop, b.offsetTop) + 2;
     const lift = Math.min(30, 16 + Math.abs(x2 - x1) * 0.12);
     setArc({ x1, x2, y, lift });
-  }, [swap, step?.i, cells.length]);
+  }, [swap, step?.i, length]);
 
   // Pointer overlay: integer locals that fall within this array's index range.
   const pointers = {};
   const locals = step?.locals || {};
   for (const [k, v] of Object.entries(locals)) {
     if (k === name) continue;
-    if (typeof v === "number" && Number.isInteger(v) && v >= 0 && v < cells.length) {
-      if (POINTER_NAMES.has(k) || cells.length <= 64) (pointers[v] = pointers[v] || []).push(k);
+    if (typeof v === "number" && Number.isInteger(v) && v >= 0 && v < length) {
+      if (POINTER_NAMES.has(k) || length <= 64) (pointers[v] = pointers[v] || []).push(k);
     }
   }
 
@@ -84,7 +108,19 @@ export default function ArrayView({ name, value, step, highlightIndices = [] })
           </svg>
         )}
 
-        {cells.map((c, i) => {
+        {slots.map((slot) => {
+          if (slot.gap != null) {
+            return (
+              <div key={`gap-${slot.at}`} className="flex flex-col items-center gap-1" title={`${slot.gap} cells not shown`}>
+                <div className="min-w-10 h-10 px-2 grid place-items-center rounded-lg border border-dashed border-border text-fg-faint text-2xs font-mono">
+                  … {slot.gap}
+                </div>
+                <span className="text-3xs font-mono text-fg-faint leading-none">{slot.at}–{slot.at + slot.gap - 1}</span>
+                <div className="h-4" />
+              </div>
+            );
+          }
+          const { index: i, cell: c } = slot;
           const swapped = swap && (i === swap.i || i === swap.j);
           return (
             <div key={i} ref={(el) => { cellRefs.current[i] = el; }} className="flex flex-col items-center gap-1">
@@ -121,7 +157,7 @@ export default function ArrayView({ name, value, step, highlightIndices = [] })
             </div>
           );
         })}
-        {cells.length === 0 && <span className="text-fg-faint text-sm italic">empty</span>}
+        {length === 0 && <span className="text-fg-faint text-sm italic">empty</span>}
       </div>
     </div>
   );
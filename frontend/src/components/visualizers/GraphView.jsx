@@ -1,14 +1,21 @@
 // graph_adjacency_list / graph_weighted -> nodes on a circle with edges.
 // Highlights nodes present in a "visited" set local if one exists in the step,
 // so BFS/DFS frontier expansion is visible. Weighted edges show their weight.
+// Windowed graphs (viewport on, engine/viewport.py) keep only some nodes and
+// count the rest under the "..." key; long neighbour lists carry {elided: n}
+// markers. Only the shown nodes are drawn, with an "n more" note, and edges
+// to hidden nodes are left out.
 
 import { motion } from "framer-motion";
 import { cx } from "../ui";
 
+const ELIDED_KEY = "...";
+
 export default function GraphView({ value, step }) {
   const adj = value?.adjacency || {};
   const weighted = value?.type === "graph_weighted";
-  const nodes = Object.keys(adj);
+  const hidden = typeof adj[ELIDED_KEY]?.elided === "number" ? adj[ELIDED_KEY].elided : 0;
+  const nodes = Object.keys(adj).filter((n) => !(hidden && n === ELIDED_KEY));
   if (!nodes.length) return <div className="px-4 py-3 text-fg-faint italic text-sm">empty graph</div>;
 
   const R = Math.min(120, 44 + nodes.length * 9);
@@ -26,7 +33,8 @@ export default function GraphView({ value, step }) {
   }
 
   const edges = [];
-  for (const [u, nbrs] of Object.entries(adj)) {
+  for (const u of nodes) {
+    const nbrs = adj[u];
     if (Array.isArray(nbrs)) nbrs.forEach((w) => pos[String(w)] && edges.push([u, String(w), null]));
     else Object.entries(nbrs || {}).forEach(([w, wt]) => pos[String(w)] && edges.push([u, String(w), wt]));
   }
@@ -55,6 +63,12 @@ export default function GraphView({ value, step }) {
           );
         })}
       </svg>
+      {hidden > 0 && (
+        <div className="mt-1 text-2xs font-mono text-fg-faint" title={`${hidden} nodes not shown`}>
+          … {hidden} more node{hidden === 1 ? "" : "s"}
+          {value?.num_nodes != null && ` (${value.num_nodes} total)`}
+        </div>
+      )}
     </div>
   );
 }
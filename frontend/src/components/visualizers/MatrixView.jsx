@@ -5,6 +5,9 @@
 // (>= 1e9, e.g. INT_MAX / 1e9) render as ∞ so they never overflow the cell.
 // (No fabricated dependency arrows here -- the engine doesn't report which cells
 // a step READ, and we never guess. The premade DP visualizers show those.)
+// Windowed grids (viewport on, engine/viewport.py) carry row_windows /
+// col_windows and {elided: n} markers in place of the hidden runs; both axes
+// are laid out from the windows so cells keep their real (row, col) labels.
 
 import { motion } from "framer-motion";
 import { T } from "../../lib/motion";
@@ -16,6 +19,21 @@ function rowsFrom(value) {
   return [];
 }
 
+// Slots of one axis: { index } per shown row / column, { gap, at } per elided run.
+function axisSlots(windows, n) {
+  const slots = [];
+  let pos = 0;
+  for (const [start, end] of windows) {
+    if (start > pos) slots.push({ gap: start - pos, at: pos });
+    for (let k = start; k < end; k++) slots.push({ index: k });
+    pos = end;
+  }
+  if (pos < n) slots.push({ gap: n - pos, at: pos });
+  return slots;
+}
+
+const plainSlots = (n) => Array.from({ length: n }, (_, k) => ({ index: k }));
+
 function fmtCell(c) {
   if (c === null || c === undefined || c === "") return "";
   if (typeof c === "boolean") return c ? "1" : "0";
@@ -26,11 +44,21 @@ function fmtCell(c) {
 export default function MatrixView({ value, lastWrite }) {
   const rows = rowsFrom(value);
   const isDP = value && (value.type === "dp_grid" || value.type === "matrix");
-  const cols = rows.reduce((m, r) => Math.max(m, (r || []).length), 0);
+  const windowed = value && !Array.isArray(value) && Array.isArray(value.row_windows);
+  const rowSlots = windowed ? axisSlots(value.row_windows, value.shape[0]) : plainSlots(rows.length);
+  const colSlots = windowed
+    ? axisSlots(value.col_windows, value.shape[1])
+    : plainSlots(rows.reduce((m, r) => Math.max(m, (r || []).length), 0));
+  const cols = colSlots.length;
 
   // Size cells to the widest rendered value so nothing clips.
   let maxLen = 1;
-  for (const r of rows) for (const c of r || []) maxLen = Math.max(maxLen, fmtCell(c).length);
+  rows.forEach((r, k) => {
+    if (rowSlots[k]?.gap != null || !Array.isArray(r)) return;
+    r.forEach((c, p) => {
+      if (colSlots[p]?.gap == null) maxLen = Math.max(maxLen, fmtCell(c).length);
+    });
+  });
   const cellPx = Math.max(28, Math.min(64, maxLen * 8.5 + 14));
   const fontClass = maxLen <= 2 ? "text-2xs" : maxLen <= 4 ? "text-[10px]" : "text-[9px]";
 
@@ -38,23 +66,50 @@ export default function MatrixView({ value, lastWrite }) {
     <div className="px-4 py-3 overflow-x-auto scrollbar-thin">
       <div className="inline-grid gap-px" style={{ gridTemplateColumns: `1.4rem repeat(${cols}, ${cellPx}px)` }}>
         <span />
-        {Array.from({ length: cols }).map((_, j) => (
-          <span key={`c${j}`} className="h-5 grid place-items-center text-3xs font-mono text-fg-faint">{j}</span>
-        ))}
-        {rows.map((row, i) => (
-          <Row key={i} row={row || []} i={i} cols={cols} isDP={isDP} lastWrite={lastWrite} cellPx={cellPx} fontClass={fontClass} />
+        {colSlots.map((slot) => (
+          <span key={`c${slot.index ?? `gap${slot.at}`}`} className="h-5 grid place-items-center text-3xs font-mono text-fg-faint"
+            title={slot.gap != null ? `${slot.gap} columns not shown` : undefined}>
+            {slot.gap != null ? "…" : slot.index}
+          </span>
         ))}
+        {rowSlots.map((slot, k) =>
+          slot.gap != null ? (
+            <GapRow key={`gap${slot.at}`} gap={slot.gap} cols={cols} cellPx={cellPx} />
+          ) : (
+            <Row key={slot.index} row={Array.isArray(rows[k]) ? rows[k] : []} i={slot.index} colSlots={colSlots}
+              isDP={isDP} lastWrite={lastWrite} cellPx={cellPx} fontClass={fontClass} />
+          )
+        )}
       </div>
     </div>
   );
 }
 
-function Row({ row, i, cols, isDP, lastWrite, cellPx, fontClass }) {
+function GapRow({ gap, cols, cellPx }) {
+  return (
+    <>
+      <span className="grid place-items-center text-3xs font-mono text-fg-faint" style={{ width: "1.4rem" }}>⋮</span>
+      <div title={`${gap} rows not shown`} style={{ gridColumn: `span ${cols}`, height: cellPx / 2 }}
+        className="grid place-items-center rounded-md border border-dashed border-border text-3xs font-mono text-fg-faint">
+        {gap} rows
+      </div>
+    </>
+  );
+}
+
+function Row({ row, i, colSlots, isDP, lastWrite, cellPx, fontClass }) {
   return (
     <>
       <span className="grid place-items-center text-3xs font-mono text-fg-faint" style={{ width: "1.4rem" }}>{i}</span>
-      {Array.from({ length: cols }).map((_, j) => {
-        const cell = row[j];
+      {colSlots.map((slot, p) => {
+        if (slot.gap != null) {
+          return (
+            <div key={`gap${slot.at}`} style={{ width: cellPx, height: cellPx }}
+              className="grid place-items-center text-fg-faint font-mono text-3xs">…</div>
+          );
+        }
+        const j = slot.index;
+        const cell = row[p];
         const text = fmtCell(cell);
         const filled = isDP && text !== "" && cell !== 0 && !(typeof cell === "number" && Math.abs(cell) >= 1e9);
         const isHot = lastWrite && lastWrite[0] === i && lastWrite[1] === j;
@@ -1,11 +1,22 @@
 // object / class instance -> a labelled field table (Node: val, next ...),
 // instead of an opaque "<Node object>". Handles the Python engine shape
 // ({type:'object', cls, fields}) and a plain field dict (C++ structs / maps).
+// Windowed dicts (viewport on, engine/viewport.py) count the entries not shown
+// under the "..." key; that renders as an "n more" row, not as a field, and
+// windowed list values ({elided: n} markers inside) show their real length.
 
 import { motion } from "framer-motion";
 import { T } from "../../lib/motion";
 import { cx } from "../ui";
 
+const ELIDED_KEY = "...";
+
+const isElided = (v) =>
+  v !== null && typeof v === "object" && !Array.isArray(v) &&
+  typeof v.elided === "number" && Object.keys(v).length === 1;
+
+const listLength = (v) => v.reduce((n, x) => n + (isElided(x) ? x.elided : 1), 0);
+
 function fieldsOf(value) {
   if (value && typeof value === "object" && !Array.isArray(value)) {
     if (value.fields && typeof value.fields === "object") return { cls: value.cls, fields: value.fields };
@@ -17,7 +28,7 @@ function fieldsOf(value) {
 
 function fmt(v) {
   if (v === null || v === undefined) return "None";
-  if (Array.isArray(v)) return `[${v.length}]`;
+  if (Array.isArray(v)) return `[${listLength(v)}]`;
   if (typeof v === "boolean") return v ? "True" : "False";
   if (v && typeof v === "object") return v.cls ? `<${v.cls}>` : v.type ? `<${v.type}>` : "{…}";
   return String(v);
@@ -38,7 +49,9 @@ export default function ObjectView({ value, changed }) {
   }
 
   const { cls, fields } = parsed;
-  const entries = Object.entries(fields || {});
+  const all = fields || {};
+  const hidden = isElided(all[ELIDED_KEY]) ? all[ELIDED_KEY].elided : 0;
+  const entries = Object.entries(all).filter(([k]) => !(hidden && k === ELIDED_KEY));
 
   return (
     <div className="px-4 py-3">
@@ -58,6 +71,11 @@ export default function ObjectView({ value, changed }) {
                 </motion.span>
               </motion.div>
             ))}
+            {hidden > 0 && (
+              <div className="px-3 py-1.5 text-2xs font-mono text-fg-faint italic" title={`${hidden} entries not shown`}>
+                … {hidden} more entr{hidden === 1 ? "y" : "ies"}
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -2,6 +2,9 @@
 // Stack grows vertically with a "top" marker; queue/deque are horizontal with
 // front/back markers. Heap is shown as its array form (level order). Items
 // animate in and out.
+// Windowed scenes (viewport on, engine/viewport.py) replace elided runs with
+// {elided: n} markers; those render as an "… n" gap and the shown items keep
+// their real positions, so "top" / "back" still mark the real ends.
 
 import { motion, AnimatePresence } from "framer-motion";
 import { T } from "../../lib/motion";
@@ -17,17 +20,51 @@ function itemsFrom(value) {
   return [];
 }
 
-export default function StackQueueView({ value, vtype }) {
+const isElided = (it) =>
+  it !== null && typeof it === "object" && !Array.isArray(it) &&
+  typeof it.elided === "number" && Object.keys(it).length === 1;
+
+// -> { slots: [{ index, item } | { gap, at }], length } with real indices.
+function slotsFrom(value) {
   const items = itemsFrom(value);
+  const windowed = !Array.isArray(value) && Array.isArray(value?.windows);
+  const slots = [];
+  let index = 0;
+  for (const item of items) {
+    if (windowed && isElided(item)) {
+      slots.push({ gap: item.elided, at: index });
+      index += item.elided;
+    } else {
+      slots.push({ index: index++, item });
+    }
+  }
+  return { slots, length: windowed && value.length != null ? value.length : index };
+}
+
+const slotKey = (s) => (s.gap != null ? `gap-${s.at}` : s.index);
+
+function Gap({ slot }) {
+  return (
+    <div
+      className="min-w-11 h-9 px-2 grid place-items-center rounded-lg border border-dashed border-border text-fg-faint text-2xs font-mono"
+      title={`${slot.gap} items not shown`}
+    >
+      … {slot.gap}
+    </div>
+  );
+}
+
+export default function StackQueueView({ value, vtype }) {
+  const { slots, length } = slotsFrom(value);
 
   if (vtype === "stack") {
     return (
       <div className="px-4 py-3">
         <div className="inline-flex flex-col-reverse gap-1">
           <AnimatePresence initial={false}>
-            {items.map((it, i) => (
+            {slots.map((slot) => (
               <motion.div
-                key={i}
+                key={slotKey(slot)}
                 layout
                 initial={{ opacity: 0, y: -14, scale: 0.9 }}
                 animate={{ opacity: 1, y: 0, scale: 1 }}
@@ -35,17 +72,19 @@ export default function StackQueueView({ value, vtype }) {
                 transition={T.spring}
                 className="flex items-center gap-2"
               >
-                <div className={cx(
-                  "min-w-12 h-9 px-3 grid place-items-center rounded-lg border font-mono text-sm tabular-nums",
-                  i === items.length - 1 ? "border-cat-stack/60 bg-warning-soft/60 text-fg" : "border-border bg-surface-2 text-fg"
-                )}>
-                  {String(it)}
-                </div>
-                {i === items.length - 1 && <span className="text-3xs font-semibold uppercase text-cat-stack">top</span>}
+                {slot.gap != null ? <Gap slot={slot} /> : (
+                  <div className={cx(
+                    "min-w-12 h-9 px-3 grid place-items-center rounded-lg border font-mono text-sm tabular-nums",
+                    slot.index === length - 1 ? "border-cat-stack/60 bg-warning-soft/60 text-fg" : "border-border bg-surface-2 text-fg"
+                  )}>
+                    {String(slot.item)}
+                  </div>
+                )}
+                {slot.index === length - 1 && <span className="text-3xs font-semibold uppercase text-cat-stack">top</span>}
               </motion.div>
             ))}
           </AnimatePresence>
-          {!items.length && <span className="text-fg-faint italic text-sm">empty</span>}
+          {!slots.length && <span className="text-fg-faint italic text-sm">empty</span>}
         </div>
       </div>
     );
@@ -57,9 +96,9 @@ export default function StackQueueView({ value, vtype }) {
     <div className="px-4 py-3 overflow-auto scrollbar-thin">
       <div className="flex items-start gap-1.5 flex-wrap">
         <AnimatePresence initial={false}>
-          {items.map((it, i) => (
+          {slots.map((slot) => (
             <motion.div
-              key={i}
+              key={slotKey(slot)}
               layout
               initial={{ opacity: 0, scale: 0.8 }}
               animate={{ opacity: 1, scale: 1 }}
@@ -67,16 +106,19 @@ export default function StackQueueView({ value, vtype }) {
               transition={T.spring}
               className="flex flex-col items-center gap-1"
             >
-              <div className="min-w-11 h-9 px-2 grid place-items-center rounded-lg border border-border bg-surface-2 font-mono text-sm tabular-nums text-fg">
-                {String(it)}
-              </div>
+              {slot.gap != null ? <Gap slot={slot} /> : (
+                <div className="min-w-11 h-9 px-2 grid place-items-center rounded-lg border border-border bg-surface-2 font-mono text-sm tabular-nums text-fg">
+                  {String(slot.item)}
+                </div>
+              )}
               <span className="text-3xs text-fg-faint leading-none">
-                {i === 0 ? frontLabel : i === items.length - 1 ? "back" : i}
+                {slot.gap != null ? `${slot.at}–${slot.at + slot.gap - 1}`
+                  : slot.index === 0 ? frontLabel : slot.index === length - 1 ? "back" : slot.index}
               </span>
             </motion.div>
           ))}
         </AnimatePresence>
-        {!items.length && <span className="text-fg-faint italic text-sm">empty</span>}
+        {!slots.length && <span className="text-fg-faint italic text-sm">empty</span>}
       </div>
     </div>
   );